@@ -1,69 +1,158 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import altair as alt
 import os
 import json
+import hashlib
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
 from PIL import Image
 
+from mago.analysis import (
+    DEFAULT_THRESHOLDS, HS_STREAM_CHUNKSIZE, META_CATEGORICAL_COLUMNS, HS_CATEGORICAL_COLUMNS,
+    detect_columns, categorical_dtypes, meta_required_columns, hs_required_columns,
+    normalize_frames, period_bounds, score_banners,
+)
+from mago import analysis
+from mago.loader import (
+    ARROW_AVAILABLE, EXCEL_ENGINE, SNAPSHOT_DIR, SOURCE_COLUMN, read_header, read_frames,
+    snapshot_path, snapshot_columns, read_snapshot, write_snapshot,
+)
+from mago.dates import DateParser
+from mago.profiling import NULL_PROFILER, PROFILE_LOG_PATH, StageProfiler
+from mago.display import (
+    JUDGMENT_COLORS, DIAGNOSIS_COLORS, display_frame, evaluation_table, progress_table, creative_table,
+    EVALUATION_FORMATS, PROGRESS_FORMATS, CREATIVE_FORMATS, format_table, row_styles, label_badges,
+)
+from mago.sheets import EXPORT_OUTBOX_DIR, ExportQueue, summary_row, banner_rows
+from mago.store import STORE_DIR, BannerStore
+from mago.rangeindex import BannerRangeIndex
+from mago.cache import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_ENTRIES, ResultCache
+from mago.sensitivity import (
+    JUDGMENT_SWEEP_AXES, DIAGNOSIS_SWEEP_AXES, SENSITIVITY_STEPS, SENSITIVITY_MAX_STEPS,
+    default_range, threshold_grid, max_sweep_steps, judgment_sweep, diagnosis_sweep,
+)
+
 # =========================================================================
 # 【１】設定とスプレッドシート書き込み関数
 # =========================================================================
 
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1dJwYYK-koOgU0V9z83hfz-Wjjjl_UNbl_N6eHQk5OmI/edit"
 KPI_SHEET_INDEX = 0
+BANNER_SHEET_INDEX = 1
 
-def write_analysis_to_sheet(analysis_data, spreadsheet_url, sheet_index):
-    import numpy as np
-    from datetime import datetime
-    import streamlit as st
-    import gspread
-
-    status_container = st.sidebar.empty()
-    status_container.info("スプレッドシートへ書き込み中...")
+# 書き込み中のジョブがあるときにサイドバーの状態表示を更新する間隔（秒）
+EXPORT_STATUS_POLL_SECONDS = 2
 
+# サーバープロセスで1つのキューを共有する（初回呼び出し時に未送信ジョブを再送）
+@st.cache_resource(show_spinner=False)
+def get_export_queue():
     try:
-        client = gspread.service_account_from_dict(
-            st.secrets["google_sheets"]
-        )
-
-        workbook = client.open_by_url(spreadsheet_url)
-        sheet = workbook.get_worksheet(sheet_index)
+        credentials = dict(st.secrets["google_sheets"])
+    except Exception:
+        credentials = None
 
-        if sheet is None:
-            raise ValueError(f"sheet_index {sheet_index} が存在しません")
+    def client_factory():
+        if credentials is None:
+            raise ValueError("st.secrets に google_sheets の認証情報が設定されていません")
+        return gspread.service_account_from_dict(credentials)
 
-        def normalize(v):
-            if isinstance(v, (np.integer,)):
-                return int(v)
-            if isinstance(v, (np.floating,)):
-                return float(v)
-            return v
+    return ExportQueue(client_factory)
 
+# 書き込むデータを確定してキューに登録するだけで、Googleとの通信は待たずに戻る
+def write_analysis_to_sheet(analysis_data, spreadsheet_url, sheet_index, banner_data=None,
+                            banner_sheet_index=BANNER_SHEET_INDEX):
+    try:
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        file_label = analysis_data.get("ファイル名", "")
 
-        data_to_write = [
-            now,
-            analysis_data.get("ファイル名", ""),
-            normalize(analysis_data.get("総リード数", 0)),
-            normalize(analysis_data.get("平均CPA", 0)),
-            normalize(analysis_data.get("総消化金額", 0)),
-            normalize(round(float(analysis_data.get("商談化率", 0)), 2)),
-        ]
-
-        data_to_write = [str(v) if not isinstance(v, (int, float)) else v for v in data_to_write]
+        batches = [(sheet_index, [summary_row(analysis_data, now)])]
+        if banner_data is not None:
+            result, spend_col = banner_data
+            batches.append((banner_sheet_index, banner_rows(result, spend_col, file_label, now)))
 
-        sheet.append_row(data_to_write)
-        status_container.success("✅ KPIをスプレッドシートに反映しました")
+        job_id = get_export_queue().enqueue(spreadsheet_url, batches, file_label)
+        st.session_state.setdefault('export_jobs', []).append(job_id)
 
     except Exception as e:
-        status_container.error(f"❌ 書き込み失敗: {e}")
+        st.sidebar.error(f"❌ 書き込み登録失敗: {e}")
+
+# このセッションで最後に登録した書き込みジョブの状態
+def export_status_panel():
+    queue = get_export_queue()
+    job = queue.status(st.session_state['export_jobs'][-1])
+    status_container = st.empty()
+
+    if job.get('state') == 'queued':
+        status_container.info("⏳ スプレッドシートへの書き込み待ち...")
+    elif job.get('state') == 'running':
+        status_container.info("スプレッドシートへ書き込み中...")
+    elif job.get('state') == 'done':
+        status_container.success(f"✅ KPIをスプレッドシートに反映しました（{job['rows']}行）")
+    elif job.get('state') == 'failed':
+        status_container.error(f"❌ 書き込み失敗: {job['error']}（アプリ再起動時に再送されます）")
+    elif job.get('state') == 'dead':
+        status_container.error(f"❌ 書き込み失敗: {job['error']}（再送しません）")
+
+    pending = queue.pending_count()
+    if pending:
+        st.caption(f"未送信のジョブ: {pending}件")
+
+    # 書き込みが終わったら画面全体を更新して定期更新を止める
+    if st.session_state.get('export_polling') and job.get('state') in ('done', 'failed', 'dead'):
+        st.session_state['export_polling'] = False
+        st.rerun()
+
+def show_export_status():
+    if not st.session_state.get('export_jobs'):
+        return
+    job = get_export_queue().status(st.session_state['export_jobs'][-1])
+    polling = job.get('state') in ('queued', 'running')
+    st.session_state['export_polling'] = polling
+
+    with st.sidebar:
+        st.fragment(run_every=EXPORT_STATUS_POLL_SECONDS if polling else None)(export_status_panel)()
 
+# =========================================================================
+# 【２】集計・判定ロジック（本体は mago.analysis。ここではキャッシュのみ）
+# =========================================================================
+
+# 集計結果はサーバープロセスで1つのキャッシュを共有する（同じファイル・期間を開いた別のセッションは再集計しない）
+# キーはファイル内容のハッシュ・期間・列の対応のみ（判定基準の変更では再集計しない）
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    return ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_ENTRIES)
+
+def cols_key(cols):
+    return tuple(sorted(cols.items()))
+
+# バナー別集計（ストリーミング集計用）。キャッシュ利用時は内訳を計測しない
+def aggregate_banners(meta_hash, hs_hash, start_datetime, end_datetime, cols, df_meta, hs_source, profiler=NULL_PROFILER):
+    return get_result_cache().get_or_create(
+        ('aggregate', meta_hash, hs_hash, start_datetime, end_datetime, cols_key(cols)),
+        lambda: analysis.aggregate_banners(df_meta, hs_source, cols, start_datetime, end_datetime, profiler)
+    )
+
+# 日×バナーの累積和（アップロードごとに1回だけ作り、期間を変えたときは2行の差から集計する）
+def banner_range_index(meta_hash, hs_hash, cols, df_meta, df_hs, profiler=NULL_PROFILER):
+    return get_result_cache().get_or_create(
+        ('range_index', meta_hash, hs_hash, cols_key(cols)),
+        lambda: BannerRangeIndex(df_meta, df_hs, cols, profiler)
+    )
+
+# 累積和からの期間集計。結果は共有されるため呼び出し側で変更しない
+def aggregate_range(meta_hash, hs_hash, start_datetime, end_datetime, cols, df_meta, df_hs, profiler=NULL_PROFILER):
+    return get_result_cache().get_or_create(
+        ('range', meta_hash, hs_hash, start_datetime, end_datetime, cols_key(cols)),
+        lambda: banner_range_index(meta_hash, hs_hash, cols, df_meta, df_hs, profiler).aggregate(
+            start_datetime, end_datetime, profiler
+        )
+    )
 
 # =========================================================================
-# 【２】アプリのメイン処理
+# 【３】アプリのメイン処理
 # =========================================================================
 
 st.set_page_config(page_title="Meta広告×セールスダッシュボード", layout="wide")
@@ -81,89 +170,655 @@ except:
 
 st.markdown("---")
 
-def load_data(file):
+# 解析済みアップロードのキャッシュ件数上限（Meta/HubSpot数世代分）
+PARSE_CACHE_MAX_ENTRIES = 8
+
+def file_content_hash(file):
+    return hashlib.sha256(file.getvalue()).hexdigest()
+
+# 複数ファイルをまとめたハッシュ（1ファイルならそのファイルのハッシュ。スナップショット・ストアのキーに使う）
+def combined_content_hash(hashes):
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()
+
+# 1段階目：ヘッダー（列名）のみを読む。CSVは判定した形式（エンコーディング・区切り文字・ヘッダー行）も返す
+@st.cache_data(max_entries=PARSE_CACHE_MAX_ENTRIES, show_spinner=False)
+def parse_upload_header(content_hash, file_name, _data):
+    return read_header(_data, file_name)
+
+# 2段階目：必要な列だけを型を指定して読む（複数ファイルは並行して解析し、ファイル名の列を付けて結合）
+# ファイル内容のハッシュと読み込み条件をキーに解析結果をキャッシュ（サイドバー操作による再実行で再読込しない）
+# _datas は引数名の先頭が "_" のためハッシュ対象外
+@st.cache_data(max_entries=PARSE_CACHE_MAX_ENTRIES, show_spinner=False)
+def parse_uploads(content_hash, file_names, csv_formats, usecols, dtypes, _datas):
+    return read_frames(list(zip(_datas, file_names, csv_formats)), usecols, dtypes)
+
+# ファイルごとの列名とCSVの形式を返す。スナップショットがあればファイルを解析せずその列名を使う
+def load_headers(files, file_hashes, content_hash, use_snapshot=False):
     try:
-        if file.name.endswith('.csv'):
-            try:
-                return pd.read_csv(file)
-            except:
-                return pd.read_csv(file, encoding='shift-jis')
-        else:
-            return pd.read_excel(file)
+        if use_snapshot:
+            columns = snapshot_columns(content_hash)
+            if columns is not None:
+                return [columns] * len(files), [None] * len(files)
+        parsed = [parse_upload_header(h, f.name, f.getvalue()) for f, h in zip(files, file_hashes)]
+        return [header for header, _ in parsed], [csv_format for _, csv_format in parsed]
+    except Exception as e:
+        st.error(f"ファイル読み込みエラー: {e}")
+        return None, None
+
+def load_data(files, content_hash, csv_formats, usecols, dtypes, use_snapshot=False):
+    try:
+        if use_snapshot:
+            df = read_snapshot(content_hash)
+            if df is not None:
+                return df
+        return parse_uploads(
+            content_hash, [f.name for f in files], csv_formats, usecols, dtypes, [f.getvalue() for f in files]
+        )
     except Exception as e:
         st.error(f"ファイル読み込みエラー: {e}")
         return None
 
-st.sidebar.header("判定基準の設定")
-cpa_limit = st.sidebar.number_input("許容CPA（円）", value=10000, step=1000)
-connect_target = st.sidebar.slider("目標接続率（%）", 0, 100, 50)
-meeting_target = st.sidebar.slider("目標商談化率（%）", 0, 50, 18)
+# 1つ目のファイルで特定した列が、ほかのファイルにもあるか（ファイル名と足りない列のリスト）
+def files_missing_columns(files, headers, required):
+    missing = []
+    for file, header in zip(files, headers):
+        lacking = [c for c in required if c and c not in header]
+        if lacking:
+            missing.append((file.name, lacking))
+    return missing
+
+# 行の背景色で判定を塗り分ける表の行数上限（超える場合はStylerを使わずラベルをバッジで表示）
+STYLED_TABLE_MAX_ROWS = 500
+
+# ラベル列（判定・診断結果）で色分けした表。色は辞書引きで一括計算し、行ごとの関数呼び出しはしない
+def show_labeled_table(df, label_col, colors):
+    if len(df) <= STYLED_TABLE_MAX_ROWS:
+        styles = row_styles(df, label_col, colors)
+        st.dataframe(
+            df.style.apply(lambda _: styles, axis=None),
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        # 大きな表はHTMLのセルスタイルを作らず、ラベル列だけを色付きのバッジにする
+        st.dataframe(
+            df.assign(**{label_col: label_badges(df[label_col])}),
+            column_config={
+                label_col: st.column_config.MultiselectColumn(
+                    label_col, options=list(colors), color=list(colors.values())
+                ),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+# === 結果の表示（タブ1つ分ずつ。遅延描画では選択中のタブの関数だけを呼ぶ） ===
+# 8. バナー別評価表 + 10. 推奨アクション
+def render_evaluation_section(display_df, result):
+    st.subheader("バナー別 評価表")
+
+    show_df = format_table(evaluation_table(display_df), EVALUATION_FORMATS)
+
+    show_labeled_table(show_df, '判定', JUDGMENT_COLORS)
+
+    # === 10. 推奨アクション（既存） ===
+    st.markdown("---")
+    st.subheader("推奨アクション")
+
+    best = result[result['判定'] == "最優秀"]['key'].tolist()
+    good = result[result['判定'].str.contains("優秀", na=False)]['key'].tolist()
+    improve = result[result['判定'].str.contains("要改善", na=False)]['key'].tolist()
+    stop = result[result['判定'] == "停止推奨"]['key'].tolist()
+
+    if best:
+        st.success(f"【予算集中】 {', '.join(best)} → CPA・接続率・商談化率すべて基準クリア")
+    if good:
+        good_filtered = [b for b in good if b not in best]
+        if good_filtered:
+            st.info(f"【有望株】 {', '.join(good_filtered)} → 商談化率は目標達成。CPA or 接続率を改善すれば最優秀に")
+    if improve:
+        st.warning(f"【要分析】 {', '.join(improve)} → LP改善や接続体制の見直しを検討")
+    if stop:
+        st.error(f"【停止検討】 {', '.join(stop)} → 予算を優秀バナーに振り替え")
+
+# 9. バナー別進捗状況テーブル
+def render_progress_section(display_df):
+    st.subheader("バナー別 進捗状況")
+
+    progress_df_display = format_table(progress_table(display_df), PROGRESS_FORMATS)
+
+    st.dataframe(
+        progress_df_display,
+        use_container_width=True,
+        hide_index=True
+    )
+
+# 11. クリエイティブ診断表 + 12. クリエイティブ診断の推奨アクション
+def render_creative_section(display_df, result, impressions_col, clicks_col,
+                            ctr_target, cvr_target, corp_target, imp_threshold):
+    col_title, col_help = st.columns([3, 1])
+    with col_title:
+        st.subheader("クリエイティブ診断表")
+
+    with st.expander("評価指標を見る"):
+        st.markdown(f"""
+**診断ロジック**
+
+| CV数 | 判定軸 | 備考 |
+|------|--------|------|
+| ≥ 3 & 法人0 | - | ターゲット外（即停止検討） |
+| ≥ 1 | CTR + LP遷移率 + 法人率 | 3軸で総合判定 |
+| 0 | IMP + CTR | 継続/停止の判断のみ |
+
+**CV1以上の診断結果**
+
+| CTR | LP遷移率 | 法人率 | 診断結果 |
+|:---:|:-------:|:-----:|---------|
+| ✓ | ✓ | ✓ | 優秀 |
+| ✓ | ✓ | ✗ | ターゲット要見直し |
+| ✓ | ✗ | ✓ | LP要改善 |
+| ✗ | ✓ | ✓ | クリエイティブ要改善 |
+| ✓ | ✗ | ✗ | LP+ターゲット要見直し |
+| ✗ | ✓ | ✗ | クリエイティブ+ターゲット要見直し |
+| ✗ | ✗ | ✓ | クリエイティブ+LP要改善 |
+| ✗ | ✗ | ✗ | 全面見直し |
+
+**CV0の診断結果**
+
+| IMP | CTR | 診断結果 |
+|:---:|:---:|---------|
+| < {imp_threshold:,} | - | データ不足 |
+| ≥ {imp_threshold:,} | ✓ | 継続監視 |
+| ≥ {imp_threshold:,} | ✗ | 停止検討 |
+
+**基準値（上の「⚙️ 判定基準の設定」で変更可能）**
+- 目標CTR: {ctr_target}%
+- 目標LP遷移率: {cvr_target}%
+- 目標法人率: {corp_target}%
+- IMP閾値: {imp_threshold:,}
+        """)
+
+    st.caption("改善ポイントを特定するための診断表")
+
+    creative_show_df = format_table(creative_table(display_df, impressions_col, clicks_col), CREATIVE_FORMATS)
+
+    show_labeled_table(creative_show_df, '診断結果', DIAGNOSIS_COLORS)
+
+    # === 12. クリエイティブ診断の推奨アクション ===
+    st.markdown("---")
+    st.subheader("クリエイティブ改善アクション")
+
+    # 診断結果ごとにバナーを分類
+    excellent_creative = result[result['クリエイティブ診断'] == "優秀"]['key'].tolist()
+    target_improve = result[result['クリエイティブ診断'] == "ターゲット要見直し"]['key'].tolist()
+    lp_improve = result[result['クリエイティブ診断'] == "LP要改善"]['key'].tolist()
+    creative_improve = result[result['クリエイティブ診断'] == "クリエイティブ要改善"]['key'].tolist()
+    lp_target_improve = result[result['クリエイティブ診断'] == "LP+ターゲット要見直し"]['key'].tolist()
+    creative_target_improve = result[result['クリエイティブ診断'] == "クリエイティブ+ターゲット要見直し"]['key'].tolist()
+    creative_lp_improve = result[result['クリエイティブ診断'] == "クリエイティブ+LP要改善"]['key'].tolist()
+    full_review = result[result['クリエイティブ診断'] == "全面見直し"]['key'].tolist()
+    target_miss = result[result['クリエイティブ診断'] == "ターゲット外"]['key'].tolist()
+    monitoring = result[result['クリエイティブ診断'] == "継続監視"]['key'].tolist()
+    stop_consider = result[result['クリエイティブ診断'] == "停止検討"]['key'].tolist()
+    data_shortage = result[result['クリエイティブ診断'] == "データ不足"]['key'].tolist()
+
+    if excellent_creative:
+        st.success(f"**優秀クリエイティブ** {', '.join(excellent_creative)}\n→ CTR・LP遷移率・法人率すべて基準クリア。このクリエイティブを横展開")
+
+    if creative_improve:
+        st.warning(f"**デザイン/コピー改善** {', '.join(creative_improve)}\n→ CTRが低い。サムネイル・キャッチコピー・訴求軸を変更してテスト")
+
+    if lp_improve:
+        st.warning(f"**LP改善** {', '.join(lp_improve)}\n→ クリックは取れているがCVしない。LP構成・フォーム・訴求の整合性を見直し")
+
+    if target_improve:
+        st.info(f"**ターゲット見直し** {', '.join(target_improve)}\n→ CVするが法人が少ない。ターゲティング・訴求を法人向けに調整")
+
+    if creative_lp_improve:
+        st.warning(f"**クリエイティブ+LP改善** {', '.join(creative_lp_improve)}\n→ CTRもLP遷移率も低い。訴求軸の再設計が必要")
+
+    if lp_target_improve:
+        st.warning(f"**LP+ターゲット見直し** {', '.join(lp_target_improve)}\n→ LP遷移率が低く法人率も低い。LPとターゲティングの両方を見直し")
+
+    if creative_target_improve:
+        st.warning(f"**クリエイティブ+ターゲット見直し** {', '.join(creative_target_improve)}\n→ CTRが低く法人率も低い。クリエイティブ刷新とターゲティング調整を並行")
+
+    if full_review:
+        st.error(f"**全面見直し** {', '.join(full_review)}\n→ 主要指標が基準未達。このクリエイティブは停止し、新規制作を推奨")
+
+    if target_miss:
+        st.error(f"**ターゲット外** {', '.join(target_miss)}\n→ CV3件以上あるが法人ゼロ。個人しか来ていない。停止推奨")
+
+    if monitoring:
+        st.info(f"**継続監視（CV0）** {', '.join(monitoring)}\n→ CTRは基準クリア。CV獲得まで配信継続")
+
+    if stop_consider:
+        st.error(f"**停止検討（CV0）** {', '.join(stop_consider)}\n→ CTRも基準未達。予算を他バナーに振り替え")
+
+    if data_shortage:
+        st.info(f"**データ不足** {', '.join(data_shortage)}\n→ IMP不足で判断不能。配信継続してデータ蓄積")
+
+# 13. 分布図 + 14. クリエイティブ分布図
+def render_distribution_section(result):
+    st.subheader("バナー別 パフォーマンス分布")
+
+    chart_data = result[result['リード数'] > 0]
+    if len(chart_data) > 0:
+        chart = alt.Chart(chart_data).mark_circle(size=200).encode(
+            x=alt.X('CPA:Q', title='CPA (円)', scale=alt.Scale(zero=False)),
+            y=alt.Y('商談化率:Q', title='商談化率 (%)'),
+            color=alt.Color('判定:N', legend=alt.Legend(title="判定"), scale=alt.Scale(
+                domain=['最優秀', '優秀', '要改善', '停止推奨'],
+                range=['#28a745', '#17a2b8', '#ffc107', '#dc3545']
+            )),
+            size=alt.Size('リード数:Q', legend=None),
+            tooltip=['key', 'CPA', '接続率', '商談化率', '法人率', 'リード数', '判定']
+        ).properties(height=450).interactive()
+        st.altair_chart(chart, use_container_width=True)
+
+    # === 14. クリエイティブ分布図 ===
+    st.markdown("---")
+    st.subheader("クリエイティブ パフォーマンス分布")
+
+    creative_chart_data = result[(result['リード数'] > 0) & (result['CTR_calc'] > 0)]
+    if len(creative_chart_data) > 0:
+        creative_chart = alt.Chart(creative_chart_data).mark_circle(size=200).encode(
+            x=alt.X('CTR_calc:Q', title='CTR (%)', scale=alt.Scale(zero=False)),
+            y=alt.Y('LP遷移率:Q', title='LP遷移率 (%)'),
+            color=alt.Color('クリエイティブ診断:N', legend=alt.Legend(title="診断結果"), scale=alt.Scale(
+                domain=['優秀', 'ターゲット要見直し', 'LP要改善', 'クリエイティブ要改善', 'LP+ターゲット要見直し', 'クリエイティブ+ターゲット要見直し', 'クリエイティブ+LP要改善', '全面見直し', 'ターゲット外'],
+                range=['#28a745', '#17a2b8', '#ffc107', '#fd7e14', '#e83e8c', '#6f42c1', '#20c997', '#dc3545', '#343a40']
+            )),
+            size=alt.Size('リード数:Q', legend=None),
+            tooltip=['key', 'CTR_calc', 'LP遷移率', '法人率', 'リード数', 'クリエイティブ診断']
+        ).properties(height=450).interactive()
+        st.altair_chart(creative_chart, use_container_width=True)
+
+# 15. 判定基準の感度分析
+# 集計済み（判定前）の result を使い、判定基準を格子状に動かしたときの判定ごとのバナー数・消化金額をヒートマップで表示する
+def render_sensitivity_section(result, spend_col, impressions_col, thresholds):
+    st.subheader("判定基準の感度分析")
+    st.caption("判定基準を範囲内で等間隔に動かしたときに、各判定になるバナー数・消化金額をまとめて計算します。★は現在の判定基準に最も近い点です。")
+
+    target = st.radio("対象", ["判定", "クリエイティブ診断"], horizontal=True, key="sensitivity_target")
+    axes = JUDGMENT_SWEEP_AXES if target == "判定" else DIAGNOSIS_SWEEP_AXES
+    # バナーが多いときは格子点×バナーの数が上限に収まるよう、1軸あたりの点の数を減らす
+    max_steps = max_sweep_steps(len(result))
+    if max_steps > 3:
+        steps = st.slider("1軸あたりの点の数", 3, max_steps, min(SENSITIVITY_STEPS, max_steps), step=2, key="sensitivity_steps")
+    else:
+        steps = 3
+    if max_steps < SENSITIVITY_MAX_STEPS:
+        st.caption(f"バナー数（{len(result):,}件）が多いため、1軸あたりの点の数は最大{max_steps}点です。")
+
+    grids = []
+    for column, (key, label, lower, upper) in zip(st.columns(len(axes)), axes):
+        with column:
+            lo, hi = st.slider(label, lower, upper, default_range(thresholds[key], lower, upper), key=f"sensitivity_{key}")
+        grids.append(threshold_grid(lo, hi, steps))
+
+    try:
+        if target == "判定":
+            table = judgment_sweep(result, spend_col, grids)
+        else:
+            table = diagnosis_sweep(result, spend_col, grids, thresholds['imp_threshold'], impressions_col)
+    except ValueError as e:
+        st.warning(f"⚠️ 感度分析を計算できません: {e}")
+        return
+
+    # 1・2番目の軸をヒートマップの横・縦にし、3番目の軸は値を選んで固定する
+    (x_key, x_label, _, _), (y_key, y_label, _, _), (z_key, z_label, _, _) = axes
+    nearest = {key: grid[np.abs(grid - thresholds[key]).argmin()] for (key, _, _, _), grid in zip(axes, grids)}
+    label_col, metric_col, z_col = st.columns(3)
+    with label_col:
+        judgment = st.selectbox("判定", list(table['判定'].cat.categories), key=f"sensitivity_label_{target}")
+    with metric_col:
+        metric = st.radio("表示する値", ["バナー数", "消化金額"], horizontal=True, key="sensitivity_metric")
+    with z_col:
+        z_value = st.select_slider(z_label, options=list(grids[2]), value=nearest[z_key],
+                                   format_func=lambda v: f"{v:,.2f}".rstrip('0').rstrip('.'), key=f"sensitivity_{z_key}_value")
+
+    view = table[(table['判定'] == judgment) & (table[z_key] == z_value)]
+    base = alt.Chart(view).encode(
+        x=alt.X(f'{x_key}:O', title=x_label, axis=alt.Axis(format=',.2~f')),
+        y=alt.Y(f'{y_key}:O', title=y_label, sort='descending', axis=alt.Axis(format=',.2~f')),
+    )
+    heatmap = base.mark_rect().encode(
+        color=alt.Color(f'{metric}:Q', title=metric, scale=alt.Scale(scheme='greens')),
+        tooltip=[
+            alt.Tooltip(f'{x_key}:Q', title=x_label, format=',.2~f'),
+            alt.Tooltip(f'{y_key}:Q', title=y_label, format=',.2~f'),
+            alt.Tooltip('バナー数:Q', format=','),
+            alt.Tooltip('消化金額:Q', format=',.0f'),
+        ],
+    )
+    current = view[(view[x_key] == nearest[x_key]) & (view[y_key] == nearest[y_key])]
+    marker = alt.Chart(current).mark_text(text="★", size=16, color='#dc3545').encode(
+        x=alt.X(f'{x_key}:O'), y=alt.Y(f'{y_key}:O', sort='descending'),
+    )
+    st.altair_chart((heatmap + marker).properties(height=420), use_container_width=True)
+
+# 判定基準の入力欄。フォームで複数の値をまとめて適用する（サイドバーではなく、判定結果の表示と同じフラグメント内に置く）
+def threshold_form():
+    with st.expander("⚙️ 判定基準の設定", expanded=False):
+        with st.form("thresholds", border=False):
+            judge_col, creative_col = st.columns(2)
+            with judge_col:
+                st.markdown("**判定基準**")
+                thresholds = {
+                    'cpa_limit': st.number_input("許容CPA（円）", value=DEFAULT_THRESHOLDS['cpa_limit'], step=1000),
+                    'connect_target': st.slider("目標接続率（%）", 0, 100, DEFAULT_THRESHOLDS['connect_target']),
+                    'meeting_target': st.slider("目標商談化率（%）", 0, 50, DEFAULT_THRESHOLDS['meeting_target']),
+                }
+            with creative_col:
+                st.markdown("**クリエイティブ診断基準**")
+                thresholds.update({
+                    'ctr_target': st.number_input("目標CTR（%）", value=DEFAULT_THRESHOLDS['ctr_target'], step=0.1, format="%.1f"),
+                    'cvr_target': st.number_input("目標LP遷移率（%）", value=DEFAULT_THRESHOLDS['cvr_target'], step=1.0, format="%.1f"),
+                    'corp_target': st.number_input("目標法人率（%）", value=DEFAULT_THRESHOLDS['corp_target'], step=5.0, format="%.1f"),
+                    'imp_threshold': st.number_input("IMP閾値（CV0判定用）", value=DEFAULT_THRESHOLDS['imp_threshold'], step=100),
+                })
+            st.form_submit_button("判定基準を適用")
+    return thresholds
+
+# 判定以降（KPI・スプレッドシート書き込み・バナー別の表とグラフ）はフラグメントにし、
+# 判定基準の適用・タブの切り替え・書き込みボタンではファイルの読み込みや集計を含むスクリプト全体を再実行しない
+# 集計済みの result は共有キャッシュの値のため変更しない（score_banners は新しい表を返す）
+# フラグメントだけの再実行の処理時間は計測結果に表示しない（スクリプト全体の実行で終了済みのプロファイラには記録しない）
+@st.fragment
+def render_scored_dashboard(result, spend_col, impressions_col, clicks_col, file_label, lazy_sections, profiler=NULL_PROFILER):
+    if not profiler.active:
+        profiler = NULL_PROFILER
+
+    # === 6. 判定（判定基準のみに依存する軽量ステージ） ===
+    thresholds = threshold_form()
+    ctr_target, cvr_target, corp_target, imp_threshold = (
+        thresholds[k] for k in ['ctr_target', 'cvr_target', 'corp_target', 'imp_threshold']
+    )
+    aggregated = result
+    result = score_banners(aggregated, impressions_col, **thresholds)
+    profiler.lap("判定")
+
+    total_spend = result[spend_col].sum()
+    total_leads = result['リード数'].sum()
+    total_connect = result['接続数'].sum()
+    total_deal = result['商談実施数'].sum()
+    total_plan = result['商談予約数'].sum()
+    total_corp = result['法人数'].sum()
+
+    # 新規追加：全体のインプレッション・クリック数
+    total_impressions = result[impressions_col].sum() if impressions_col else 0
+    total_clicks = result[clicks_col].sum() if clicks_col else 0
+
+    # === 7. 全体サマリー KPI計算 ===
+    avg_cpa = int(total_spend / total_leads) if total_leads > 0 else 0
+    avg_connect = (total_connect / total_leads * 100) if total_leads > 0 else 0
+    avg_meeting = ((total_deal + total_plan) / total_leads * 100) if total_leads > 0 else 0
+    avg_corp = (total_corp / total_leads * 100) if total_leads > 0 else 0
+
+    # 新規追加：全体CTR、CPM、LP遷移率
+    avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
+    avg_cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
+    avg_cvr = (total_leads / total_clicks * 100) if total_clicks > 0 else 0
+
+    st.subheader("全体実績サマリー")
+
+    cols_row1 = st.columns([1, 1, 1, 1])
+
+    with cols_row1[0]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>総消化金額</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>¥{int(total_spend):,}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_row1[1]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>総リード数</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>{int(total_leads)}件</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_row1[2]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>接続数</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_connect)}件</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>接続率 {avg_connect:.1f}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_row1[3]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>平均CPA</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>¥{avg_cpa:,}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    cols_row2 = st.columns([1, 1, 1, 1])
+
+    with cols_row2[0]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>商談実施数</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>{int(total_deal)}件</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_row2[1]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>商談予約数</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_plan)}件</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>商談化率 {avg_meeting:.1f}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_row2[2]:
+        st.markdown(f"""
+        <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>法人数</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_corp)}件</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>法人率 {avg_corp:.1f}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_row2[3]:
+        st.markdown("""
+        <div style='height: 140px;'></div>
+        """, unsafe_allow_html=True)
+
+    # === 新規追加：クリエイティブ指標サマリー ===
+    st.markdown("---")
+    st.subheader("クリエイティブ指標サマリー")
+
+    cols_creative = st.columns([1, 1, 1, 1])
+
+    with cols_creative[0]:
+        ctr_color = "rgb(40, 167, 69)" if avg_ctr >= ctr_target else "rgb(220, 53, 69)"
+        st.markdown(f"""
+        <div style='background-color: {ctr_color}; border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>平均CTR</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{avg_ctr:.2f}%</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>目標: {ctr_target}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_creative[1]:
+        cvr_color = "rgb(40, 167, 69)" if avg_cvr >= cvr_target else "rgb(220, 53, 69)"
+        st.markdown(f"""
+        <div style='background-color: {cvr_color}; border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>LP遷移率</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{avg_cvr:.1f}%</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>目標: {cvr_target}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_creative[2]:
+        corp_color = "rgb(40, 167, 69)" if avg_corp >= corp_target else "rgb(220, 53, 69)"
+        st.markdown(f"""
+        <div style='background-color: {corp_color}; border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>法人率</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{avg_corp:.1f}%</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>目標: {corp_target}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with cols_creative[3]:
+        st.markdown(f"""
+        <div style='background-color: rgb(108, 117, 125); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
+            <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>総クリック数</div>
+            <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_clicks):,}</div>
+            <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>IMP: {int(total_impressions):,}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown("---")
+    profiler.lap("表示: KPI")
+
+    summary_data = {
+        'ファイル名': file_label,
+        '総リード数': total_leads,
+        '平均CPA': avg_cpa,
+        '総消化金額': int(total_spend),
+        '商談化率': avg_meeting
+    }
+
+    include_banners = st.checkbox("バナー別評価表も書き込む", value=True, help=f"シート{BANNER_SHEET_INDEX + 1}枚目にバナーごとの判定・指標をまとめて追記します。")
+
+    if st.button("✅ KPI分析結果をスプレッドシートに反映！", help="このボタンで分析結果が全員共有のスプレッドシートに記録されます。"):
+        write_analysis_to_sheet(
+            summary_data, SPREADSHEET_URL, KPI_SHEET_INDEX,
+            banner_data=(result, spend_col) if include_banners else None
+        )
+    show_export_status()
+    profiler.lap("表示: スプレッドシート書き込み")
+
+    st.markdown("---")
+
+    # === 8〜14. バナー別の表・推奨アクション・分布図 ===
+    # 遅延描画ではタブで選択中のセクションだけを組み立てる（他のタブの表・グラフは作らない）
+    display_df = display_frame(result, spend_col)
+    result_sections = [
+        ("バナー別 評価表", render_evaluation_section, (display_df, result)),
+        ("バナー別 進捗状況", render_progress_section, (display_df,)),
+        ("クリエイティブ診断", render_creative_section, (
+            display_df, result, impressions_col, clicks_col,
+            ctr_target, cvr_target, corp_target, imp_threshold
+        )),
+        ("パフォーマンス分布", render_distribution_section, (result,)),
+        ("判定基準の感度分析", render_sensitivity_section, (aggregated, spend_col, impressions_col, thresholds)),
+    ]
+    if lazy_sections:
+        section_containers = st.tabs([label for label, _, _ in result_sections], on_change="rerun", key="result_section")
+    else:
+        section_containers = [st.container() for _ in result_sections]
+
+    for i, (container, (label, render_section, args)) in enumerate(zip(section_containers, result_sections)):
+        if lazy_sections and not container.open:
+            continue
+        with container:
+            if not lazy_sections and i > 0:
+                st.markdown("---")
+            render_section(*args)
+        profiler.lap(f"表示: {label}")
 
 st.sidebar.markdown("---")
-st.sidebar.subheader("クリエイティブ診断基準")
-ctr_target = st.sidebar.number_input("目標CTR（%）", value=1.0, step=0.1, format="%.1f")
-cvr_target = st.sidebar.number_input("目標LP遷移率（%）", value=10.0, step=1.0, format="%.1f")
-corp_target = st.sidebar.number_input("目標法人率（%）", value=50.0, step=5.0, format="%.1f")
-imp_threshold = st.sidebar.number_input("IMP閾値（CV0判定用）", value=1000, step=100)
+st.sidebar.subheader("データ読み込み設定")
+use_snapshot = st.sidebar.checkbox(
+    "スナップショットを保存・再利用",
+    value=False,
+    help=f"型変換済みのデータを {SNAPSHOT_DIR} に保存し、同じファイルの次回以降の読み込みを高速化します",
+    disabled=not ARROW_AVAILABLE
+)
+stream_hs_csv = st.sidebar.checkbox(
+    "HubSpot CSVをストリーミング集計（大容量向け）",
+    value=False,
+    help=f"HubSpotのCSVを{HS_STREAM_CHUNKSIZE:,}行ずつ読み込んでバナー別に集計し、メモリ使用量を抑えます"
+)
+use_store = st.sidebar.checkbox(
+    "日次ストアに差分を取り込んで集計",
+    value=False,
+    help=f"累積エクスポートのうち未取り込みの日付・HubSpotレコードだけを {STORE_DIR} に追加し、集計はストアから行います"
+         "（取り込み済みレコードの取引ステージ等の変更は反映されません）"
+)
+store_name = st.sidebar.text_input("ストア名", value="default", disabled=not use_store, help="アカウントごとに別の名前を付けてください")
+profile_stages = st.sidebar.checkbox(
+    "処理時間・メモリを計測",
+    value=False,
+    help="読み込み〜集計〜表示の各ステージの経過時間とピークメモリを計測し、ページ下部に表示します（計測中は処理が遅くなります）"
+)
+dump_profile = st.sidebar.checkbox(
+    "計測結果をJSON Linesで保存",
+    value=False,
+    help=f"計測結果を {PROFILE_LOG_PATH} に追記します",
+    disabled=not profile_stages
+)
+
+st.sidebar.markdown("---")
+st.sidebar.subheader("表示設定")
+lazy_sections = st.sidebar.toggle(
+    "表・グラフをタブで遅延描画",
+    value=True,
+    help="バナー別の表・グラフをタブに分け、選択中のタブだけを描画します。オフにすると全セクションを縦に並べて描画します"
+)
+show_debug = st.sidebar.toggle("デバッグ情報を表示", value=False, help="検出された列・バナー別の中間集計などをサイドバーに表示します")
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("分析期間の設定")
 
 col1, col2 = st.columns(2)
 with col1:
-    meta_file = st.file_uploader("Meta広告実績", type=['xlsx', 'csv'])
+    meta_files = st.file_uploader(
+        "Meta広告実績", type=['xlsx', 'csv'], accept_multiple_files=True,
+        help="アカウント別・月別などに分かれたエクスポートは複数まとめて選択できます（列名は同じである必要があります）"
+    )
 with col2:
-    hs_file = st.file_uploader("HubSpotデータ", type=['xlsx', 'csv'])
+    hs_files = st.file_uploader("HubSpotデータ", type=['xlsx', 'csv'], accept_multiple_files=True)
 
 st.markdown("---")
 
-if meta_file and hs_file:
-    df_meta = load_data(meta_file)
-    df_hs = load_data(hs_file)
-
-    if df_meta is not None and df_hs is not None:
+# 前回の起動で送信できなかった書き込みジョブがあれば再送を開始
+if os.path.isdir(EXPORT_OUTBOX_DIR) and os.listdir(EXPORT_OUTBOX_DIR):
+    get_export_queue()
+
+if meta_files and hs_files:
+    meta_file_hashes = [file_content_hash(f) for f in meta_files]
+    hs_file_hashes = [file_content_hash(f) for f in hs_files]
+    meta_hash = combined_content_hash(meta_file_hashes)
+    hs_hash = combined_content_hash(hs_file_hashes)
+    # ストリーミング集計ではHubSpotはヘッダーのみ使い、集計時にチャンク単位で読む
+    # 日次ストアに取り込むときはHubSpotも全行を読む
+    hs_streaming = stream_hs_csv and all(f.name.endswith('.csv') for f in hs_files) and not use_store
+    profiler = StageProfiler().start() if profile_stages else NULL_PROFILER
+
+    # === ヘッダーから必要な列を特定し、その列だけを読み込む ===
+    meta_headers, meta_csv_formats = load_headers(meta_files, meta_file_hashes, meta_hash, use_snapshot)
+    hs_headers, hs_csv_formats = load_headers(hs_files, hs_file_hashes, hs_hash, use_snapshot and not hs_streaming)
+    profiler.lap("ヘッダー読み込み")
+
+    if meta_headers is not None and hs_headers is not None:
         try:
-            meta_cols = list(df_meta.columns)
-            hs_cols = list(df_hs.columns)
-            
-            # === Meta側：列の特定（優先順位：広告の名前 > 広告名 > 広告セット名 > キャンペーン名）===
-            name_col = None
-            for pattern in ['広告の名前', '広告名', '広告セット名', 'キャンペーン名', 'Ad name', 'Ad set name', 'Campaign name', '名前', 'Name']:
-                name_col = next((c for c in meta_cols if pattern in str(c)), None)
-                if name_col:
-                    break
-            
-            spend_col = next((c for c in meta_cols if '消化金額' in str(c)), None)
-            if spend_col is None:
-                spend_col = next((c for c in meta_cols if 'Amount' in str(c) or '費用' in str(c) or 'Spent' in str(c)), None)
-            
-            date_col_meta = next((c for c in meta_cols if 'レポート開始日' in str(c) or '開始日' in str(c)), None)
+            # 列の特定は1つ目のファイルの列名で行う
+            meta_cols = meta_headers[0]
+            hs_cols = hs_headers[0]
+
+            cols = detect_columns(meta_cols, hs_cols)
+            name_col = cols['name_col']
+            spend_col = cols['spend_col']
+            date_col_meta = cols['date_col_meta']
+            impressions_col = cols['impressions_col']
+            cpm_col = cols['cpm_col']
+            clicks_col = cols['clicks_col']
+            ctr_col = cols['ctr_col']
+            utm_col = cols['utm_col']
+            date_col_hs = cols['date_col_hs']
 
-            # === 新規追加：CPM、CTR、クリック数、インプレッション数の列特定 ===
-            impressions_col = next((c for c in meta_cols if c == 'インプレッション'), None)
-            if impressions_col is None:
-                impressions_col = next((c for c in meta_cols if 'インプレッション' in str(c) and 'CPM' not in str(c) and '単価' not in str(c)), None)
-            
-            cpm_col = next((c for c in meta_cols if 'CPM' in str(c) and 'インプレッション単価' in str(c)), None)
-            if cpm_col is None:
-                cpm_col = next((c for c in meta_cols if 'CPM' in str(c)), None)
-            
-            clicks_col = next((c for c in meta_cols if 'リンクのクリック' in str(c)), None)
-            if clicks_col is None:
-                clicks_col = next((c for c in meta_cols if 'Link clicks' in str(c) or 'リンククリック' in str(c)), None)
-            
-            ctr_col = next((c for c in meta_cols if 'CTR(リンククリックスルー率)' in str(c)), None)
-            if ctr_col is None:
-                ctr_col = next((c for c in meta_cols if 'CTR' in str(c) and 'リンク' in str(c)), None)
-
-            # === HubSpot側：列の特定 ===
-            utm_col = next((c for c in hs_cols if 'UTM Content' in str(c)), None)
-            if utm_col is None:
-                utm_col = next((c for c in hs_cols if 'UTM' in str(c) or 'Content' in str(c)), None)
-            
-            attr_col = next((c for c in hs_cols if '属性' in str(c)), None)
-            date_col_hs = next((c for c in hs_cols if '作成日' in str(c)), None)
-            
             # 列が見つからない場合のエラー表示
             if not all([name_col, spend_col, utm_col]):
                 st.error(f"必要な列が見つかりません。")
@@ -176,14 +831,82 @@ if meta_file and hs_file:
                     st.write(hs_cols)
                 st.stop()
 
-            # === 日付列の変換 ===
-            if date_col_meta:
-                df_meta[date_col_meta] = pd.to_datetime(df_meta[date_col_meta], errors='coerce')
-            if date_col_hs:
-                df_hs[date_col_hs] = pd.to_datetime(df_hs[date_col_hs], errors='coerce')
+            missing_by_file = (
+                files_missing_columns(meta_files, meta_headers, meta_required_columns(cols))
+                + files_missing_columns(hs_files, hs_headers, hs_required_columns(cols))
+            )
+            if missing_by_file:
+                st.error("1つ目のファイルと列名が異なるファイルがあります。")
+                for file_name, lacking in missing_by_file:
+                    st.write(f"{file_name}: {', '.join(lacking)} がありません")
+                st.stop()
+            profiler.lap("列の特定")
+
+            # === 特定した列だけを読み込み ===
+            df_meta = load_data(
+                meta_files, meta_hash, meta_csv_formats,
+                meta_required_columns(cols), categorical_dtypes(cols, META_CATEGORICAL_COLUMNS), use_snapshot
+            )
+
+            if hs_streaming:
+                df_hs = pd.DataFrame(columns=hs_cols)
+            else:
+                # レコードID列はストアを使わない場合も読み込む（スナップショットに含め、ストアの重複除外の方式をそろえる）
+                hs_usecols = hs_required_columns(cols)
+                if cols['record_id_col']:
+                    hs_usecols = hs_usecols + [cols['record_id_col']]
+                df_hs = load_data(
+                    hs_files, hs_hash, hs_csv_formats,
+                    hs_usecols, categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS), use_snapshot
+                )
+
+            if df_meta is None or df_hs is None:
+                st.stop()
+            profiler.lap("データ読み込み")
+
+            # === 日付列・数値列の変換 ===
+            date_parser = DateParser()
+            df_meta, df_hs = normalize_frames(df_meta, df_hs, cols, date_parser)
+            profiler.lap("型変換")
+
+            # === スナップショット保存（未保存のファイルのみ） ===
+            if use_snapshot:
+                snapshot_targets = [("Meta", df_meta, meta_hash)]
+                if not hs_streaming:
+                    snapshot_targets.append(("HubSpot", df_hs, hs_hash))
+                for label, df, content_hash in snapshot_targets:
+                    if os.path.exists(snapshot_path(content_hash)):
+                        st.sidebar.caption(f"⚡ {label}: スナップショットから読み込み")
+                        continue
+                    try:
+                        write_snapshot(df, content_hash)
+                        st.sidebar.caption(f"💾 {label}: スナップショットを保存しました")
+                    except Exception as e:
+                        st.sidebar.warning(f"⚠️ {label}のスナップショット保存に失敗: {e}")
+                profiler.lap("スナップショット保存")
+
+            # === 日次ストアへの差分取り込み（取り込み済みのファイルは何もしない） ===
+            if use_store:
+                try:
+                    store = BannerStore(store_name)
+                    meta_added = store.ingest_meta(df_meta, cols, meta_hash)
+                    hs_added = store.ingest_hs(df_hs, cols, hs_hash)
+                except ValueError as e:
+                    st.error(f"日次ストアに取り込めません: {e}")
+                    st.stop()
+                for label, added in [("Meta", meta_added), ("HubSpot", hs_added)]:
+                    if added is None:
+                        st.sidebar.caption(f"🗄️ {label}: 取り込み済みのファイルです")
+                    else:
+                        st.sidebar.caption(f"🗄️ {label}: {added['dates']}日分・{added['rows']:,}行を追加しました")
+                first_day, last_day = store.coverage()
+                st.sidebar.caption(f"🗄️ ストアの期間: {first_day} ~ {last_day}")
+                profiler.lap("ストア取り込み")
 
             # === 期間フィルター ===
             filter_enabled = st.sidebar.checkbox("期間で絞り込む", value=False)
+            start_datetime = None
+            end_datetime = None
 
             if filter_enabled:
                 period_preset = st.sidebar.radio(
@@ -218,756 +941,154 @@ if meta_file and hs_file:
                         end_date = st.sidebar.date_input("終了日", value=datetime.now())
                     st.sidebar.info(f"📅 カスタム: {start_date} ~ {end_date}")
 
-                start_datetime = pd.to_datetime(start_date)
-                end_datetime = pd.to_datetime(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-
-                if date_col_meta:
-                    before_count = len(df_meta)
-                    df_meta = df_meta[(df_meta[date_col_meta] >= start_datetime) & (df_meta[date_col_meta] <= end_datetime)]
-                    st.sidebar.write(f"Meta: {before_count}行 → {len(df_meta)}行")
-                if date_col_hs:
-                    before_count = len(df_hs)
-                    df_hs = df_hs[(df_hs[date_col_hs] >= start_datetime) & (df_hs[date_col_hs] <= end_datetime)]
-                    st.sidebar.write(f"HubSpot: {before_count}行 → {len(df_hs)}行")
+                start_datetime, end_datetime = period_bounds(start_date, end_date)
+            profiler.lap("期間設定")
+
+            # === 1〜5. バナー別集計 ===
+            if use_store:
+                # ストアの日次集計を期間内で合計する（これまでに取り込んだ全期間が対象）
+                result, debug = store.aggregate(cols, start_datetime, end_datetime, profiler)
+            elif hs_streaming:
+                result, debug = aggregate_banners(
+                    meta_hash, hs_hash,
+                    start_datetime, end_datetime, cols, df_meta,
+                    [(f.getvalue(), csv_format) for f, csv_format in zip(hs_files, hs_csv_formats)], profiler
+                )
+                profiler.lap("集計（キャッシュ参照）")
+            else:
+                # 期間の変更は累積和の差だけで集計する（元の行の絞り込み・再集計をしない）
+                result, debug = aggregate_range(meta_hash, hs_hash, start_datetime, end_datetime, cols, df_meta, df_hs, profiler)
+            meta_agg = debug['meta_agg']
 
-            # === デバッグ情報（期間フィルターの後） ===
-            st.sidebar.markdown("---")
-            st.sidebar.subheader("🔍 検出された列")
-            st.sidebar.write(f"広告名: `{name_col}`")
-            st.sidebar.write(f"消化金額: `{spend_col}`")
-            st.sidebar.write(f"Meta日付: `{date_col_meta}`")
-            st.sidebar.write(f"UTM: `{utm_col}`")
-            st.sidebar.write(f"インプレッション: `{impressions_col}`")
-            st.sidebar.write(f"CPM: `{cpm_col}`")
-            st.sidebar.write(f"クリック: `{clicks_col}`")
-            st.sidebar.write(f"CTR: `{ctr_col}`")
-
-            st.sidebar.markdown("---")
-            st.sidebar.subheader("デバッグ情報")
-            st.sidebar.write(f"Meta広告データ: {len(df_meta)}行")
-            st.sidebar.write(f"HubSpotデータ: {len(df_hs)}行")
-
-            # === 1. データ結合キーの作成 ===
-            df_meta['key'] = df_meta[name_col].astype(str).str.extract(r'(bn\d+)', expand=False)
-            df_hs['key'] = df_hs[utm_col].astype(str).str.strip()
-
-            st.sidebar.write(f"Meta（キー抽出前）: {len(df_meta)}行")
-            st.sidebar.write(f"HubSpot（キー抽出前）: {len(df_hs)}行")
-            
-            df_meta = df_meta[df_meta['key'].notna()]
-            df_hs = df_hs[df_hs['key'].notna()]
-            
-            st.sidebar.write(f"Meta（キー抽出後）: {len(df_meta)}行")
-            st.sidebar.write(f"HubSpot（キー抽出後）: {len(df_hs)}行")
-            
-            st.sidebar.write("抽出されたバナーID:")
-            st.sidebar.write(sorted(df_meta['key'].unique()))
+            if 'meta_rows_before_filter' in debug:
+                st.sidebar.write(f"Meta: {debug['meta_rows_before_filter']}行 → {debug['meta_rows']}行")
+            if 'hs_rows_before_filter' in debug:
+                st.sidebar.write(f"HubSpot: {debug['hs_rows_before_filter']}行 → {debug['hs_rows']}行")
 
-            # === 2. Meta側の集計（消化金額 + 新規追加指標） ===
-            agg_dict = {spend_col: 'sum'}
-            
-            # 新規追加指標の集計設定
-            if impressions_col:
-                df_meta[impressions_col] = pd.to_numeric(df_meta[impressions_col], errors='coerce').fillna(0)
-                agg_dict[impressions_col] = 'sum'
-            if clicks_col:
-                df_meta[clicks_col] = pd.to_numeric(df_meta[clicks_col], errors='coerce').fillna(0)
-                agg_dict[clicks_col] = 'sum'
-            
-            meta_agg = df_meta.groupby('key').agg(agg_dict).reset_index()
-            meta_agg[spend_col] = pd.to_numeric(meta_agg[spend_col], errors='coerce').fillna(0)
+            # 日付として読めず空欄として扱った値（ストリーミング集計ではHubSpotの日付列は集計時に解析する）
+            for col, coerced in {**date_parser.coerced, **debug.get('date_coerced', {})}.items():
+                if coerced:
+                    st.sidebar.warning(f"⚠️ {col}: 日付として読めない値 {coerced:,}件を空欄として扱いました")
 
-            # CTRとCPMはバナー別に再計算（加重平均）
-            if impressions_col and clicks_col:
-                meta_agg['CTR_calc'] = meta_agg.apply(
-                    lambda x: (x[clicks_col] / x[impressions_col] * 100) if x[impressions_col] > 0 else 0, axis=1
+            # === デバッグ情報（期間フィルターの後） ===
+            if show_debug:
+                st.sidebar.markdown("---")
+                st.sidebar.subheader("🔍 検出された列")
+                st.sidebar.write(f"広告名: `{name_col}`")
+                st.sidebar.write(f"消化金額: `{spend_col}`")
+                st.sidebar.write(f"Meta日付: `{date_col_meta}`")
+                st.sidebar.write(f"UTM: `{utm_col}`")
+                st.sidebar.write(f"インプレッション: `{impressions_col}`")
+                st.sidebar.write(f"CPM: `{cpm_col}`")
+                st.sidebar.write(f"クリック: `{clicks_col}`")
+                st.sidebar.write(f"CTR: `{ctr_col}`")
+
+                st.sidebar.markdown("---")
+                st.sidebar.subheader("デバッグ情報")
+                st.sidebar.write(f"Meta広告データ: {debug['meta_rows']}行")
+                st.sidebar.write(f"HubSpotデータ: {debug['hs_rows']}行")
+
+                st.sidebar.write(f"Meta（キー抽出前）: {debug['meta_rows']}行")
+                st.sidebar.write(f"HubSpot（キー抽出前）: {debug['hs_rows']}行")
+                st.sidebar.write(f"Meta（キー抽出後）: {debug['meta_rows_keyed']}行")
+                st.sidebar.write(f"HubSpot（キー抽出後）: {debug['hs_rows_keyed']}行")
+                if any(not f.name.endswith('.csv') for f in meta_files + hs_files):
+                    st.sidebar.write(f"Excelの解析エンジン: `{EXCEL_ENGINE}`")
+
+                # 集計結果キャッシュ（プロセス全体で共有）のヒット率と使用量
+                cache_stats = get_result_cache().stats()
+                st.sidebar.write(
+                    f"集計キャッシュ: ヒット {cache_stats['hits']}回 / ミス {cache_stats['misses']}回"
+                    f"（ヒット率 {cache_stats['hit_rate']:.0%}）"
                 )
-            else:
-                meta_agg['CTR_calc'] = 0
-                
-            if impressions_col:
-                meta_agg['CPM_calc'] = meta_agg.apply(
-                    lambda x: (x[spend_col] / x[impressions_col] * 1000) if x[impressions_col] > 0 else 0, axis=1
+                st.sidebar.write(
+                    f"集計キャッシュ: {cache_stats['entries']}件・{cache_stats['bytes'] / 1024 ** 2:.1f}MB"
+                    f" / 上限 {cache_stats['max_bytes'] / 1024 ** 2:.0f}MB（破棄 {cache_stats['evictions']}件）"
                 )
-            else:
-                meta_agg['CPM_calc'] = 0
 
-            st.sidebar.markdown("---")
-            st.sidebar.write("📊 Meta消化金額（バナー別）:")
-            st.sidebar.dataframe(meta_agg.rename(columns={'key': 'バナー', spend_col: '消化金額'}), use_container_width=True)
+                # 複数ファイルを結合した場合はファイルごとの行数（期間で絞り込む前）
+                for label, df in [("Meta", df_meta), ("HubSpot", df_hs)]:
+                    if SOURCE_COLUMN in df.columns and df[SOURCE_COLUMN].nunique() > 1:
+                        st.sidebar.write(f"{label}（ファイル別の行数）:")
+                        st.sidebar.dataframe(df[SOURCE_COLUMN].value_counts(sort=False).rename('行数'), use_container_width=True)
             
-            total_meta_spend = meta_agg[spend_col].sum()
-            st.sidebar.write(f"Meta消化金額合計: ¥{int(total_meta_spend):,}")
+                st.sidebar.write("抽出されたバナーID:")
+                st.sidebar.write(debug['banner_ids'])
 
-            # === 3. HubSpot側でリード数・接続・商談・法人をカウント ===
-            hs_summary = df_hs.groupby('key').agg(
-                リード数=('key', 'size')
-            ).reset_index()
+                st.sidebar.markdown("---")
+                st.sidebar.write("📊 Meta消化金額（バナー別）:")
+                st.sidebar.dataframe(meta_agg.rename(columns={'key': 'バナー', spend_col: '消化金額'}), use_container_width=True)
             
-            st.sidebar.markdown("---")
-            st.sidebar.write("📊 HubSpotリード数（バナー別）:")
-            st.sidebar.dataframe(hs_summary, use_container_width=True)
-            st.sidebar.write(f"HubSpotリード数合計: {hs_summary['リード数'].sum()}件")
-
-            # 接続数
-            call_result_col = next((c for c in hs_cols if 'コールの成果' in str(c)), None)
-            if call_result_col:
-                connect_df = df_hs[df_hs[call_result_col].fillna('').astype(str).str.contains('あり', case=False, na=False)]
-                connect_count = connect_df.groupby('key').size().reset_index(name='接続数')
-                hs_summary = pd.merge(hs_summary, connect_count, on='key', how='left')
-                st.sidebar.write(f"接続列: `{call_result_col}` → {len(connect_df)}件")
-            else:
-                hs_summary['接続数'] = 0
-                st.sidebar.warning("⚠️ 「コールの成果」列が見つかりません")
-
-            # 商談実施数
-            first_meeting_col = next((c for c in hs_cols if '初回商談日' in str(c)), None)
-            second_meeting_col = next((c for c in hs_cols if '再商談日' in str(c)), None)
-
-            deal_done_df = pd.DataFrame()
-
-            if first_meeting_col:
-                df_hs[first_meeting_col] = pd.to_datetime(df_hs[first_meeting_col], errors='coerce')
-                first_deal = df_hs[df_hs[first_meeting_col].notna()][['key']].copy()
-                deal_done_df = pd.concat([deal_done_df, first_deal])
-                st.sidebar.write(f"初回商談日あり: {df_hs[first_meeting_col].notna().sum()}件")
-
-            if second_meeting_col:
-                df_hs[second_meeting_col] = pd.to_datetime(df_hs[second_meeting_col], errors='coerce')
-                second_deal = df_hs[df_hs[second_meeting_col].notna()][['key']].copy()
-                deal_done_df = pd.concat([deal_done_df, second_deal])
-                st.sidebar.write(f"再商談日あり: {df_hs[second_meeting_col].notna().sum()}件")
-
-            if len(deal_done_df) > 0:
-                deal_done_count = deal_done_df.groupby('key').size().reset_index(name='商談実施数')
-                hs_summary = pd.merge(hs_summary, deal_done_count, on='key', how='left')
-                st.sidebar.write(f"✅ 商談実施数: {len(deal_done_df.drop_duplicates())}件")
-            else:
-                hs_summary['商談実施数'] = 0
-                st.sidebar.warning("⚠️ 商談日付列が見つかりません")
-
-            # 商談予約数
-            stage_col = next((c for c in hs_cols if '取引ステージ' in str(c)), None)
-            if stage_col:
-                deal_plan_df = df_hs[df_hs[stage_col].fillna('').astype(str).str.contains('商談予定', case=False, na=False)]
-                deal_plan_count = deal_plan_df.groupby('key').size().reset_index(name='商談予約数')
-                hs_summary = pd.merge(hs_summary, deal_plan_count, on='key', how='left')
-                st.sidebar.write(f"商談予約: {len(deal_plan_df)}件")
-            else:
-                hs_summary['商談予約数'] = 0
-                st.sidebar.warning("⚠️ 「取引ステージ」列が見つかりません")
-
-            # 進捗ステータス別カウント
-            if stage_col:
-                status_mapping = {
-                    '新規リード': ['新規リード'],
-                    '進捗中': ['FS対応中：社内検討', 'FS対応中：検討', 'FS対応中：見込み', 'FS対応中：申込'],
-                    '商談予定': ['商談予定'],
-                    'ナーチャリング': ['ナーチャリング'],
-                    '保留・NG': ['低温リスト', '完全NG', 'NG対象'],
-                    '契約': ['規約完了']
-                }
-                
-                for status_name, keywords in status_mapping.items():
-                    pattern = '|'.join(keywords)
-                    status_df = df_hs[df_hs[stage_col].fillna('').astype(str).str.contains(pattern, case=False, na=False)]
-                    status_count = status_df.groupby('key').size().reset_index(name=status_name)
-                    hs_summary = pd.merge(hs_summary, status_count, on='key', how='left')
-            else:
-                for status_name in ['新規リード', '進捗中', '商談予定', 'ナーチャリング', '保留・NG', '契約']:
-                    hs_summary[status_name] = 0
-
-            # 法人数
-            if attr_col:
-                corp_df = df_hs[
-                    (df_hs[attr_col].fillna('').astype(str).str.contains('法人', case=False, na=False)) &
-                    (~df_hs[attr_col].fillna('').astype(str).str.contains('社員', case=False, na=False))
-                ]
-                corp_count = corp_df.groupby('key').size().reset_index(name='法人数')
-                hs_summary = pd.merge(hs_summary, corp_count, on='key', how='left')
-                st.sidebar.write(f"法人数: {len(corp_df)}件")
-            else:
-                hs_summary['法人数'] = 0
+                total_meta_spend = meta_agg[spend_col].sum()
+                st.sidebar.write(f"Meta消化金額合計: ¥{int(total_meta_spend):,}")
 
-            hs_summary = hs_summary.fillna(0)
-            hs_summary['接続数'] = hs_summary['接続数'].astype(int)
-            hs_summary['商談実施数'] = hs_summary['商談実施数'].astype(int)
-            hs_summary['商談予約数'] = hs_summary['商談予約数'].astype(int)
-            hs_summary['法人数'] = hs_summary['法人数'].astype(int)
-            
-            for status_name in ['新規リード', '進捗中', '商談予定', 'ナーチャリング', '保留・NG', '契約']:
-                hs_summary[status_name] = hs_summary[status_name].astype(int)
+                st.sidebar.markdown("---")
+                st.sidebar.write("📊 HubSpotリード数（バナー別）:")
+                st.sidebar.dataframe(debug['hs_leads'], use_container_width=True)
+                st.sidebar.write(f"HubSpotリード数合計: {debug['hs_leads']['リード数'].sum()}件")
 
-            # === 4. Meta集計データと結合 ===
-            result = pd.merge(hs_summary, meta_agg, on='key', how='outer')
-            result[spend_col] = result[spend_col].fillna(0)
-            result['リード数'] = result['リード数'].fillna(0).astype(int)
-            
-            # 新規追加指標のNaN処理
-            if impressions_col:
-                result[impressions_col] = result[impressions_col].fillna(0).astype(int)
-            if clicks_col:
-                result[clicks_col] = result[clicks_col].fillna(0).astype(int)
-            result['CTR_calc'] = result['CTR_calc'].fillna(0)
-            result['CPM_calc'] = result['CPM_calc'].fillna(0)
-            
-            # 進捗ステータス列もNaNを0で埋める
-            for col in ['接続数', '商談実施数', '商談予約数', '法人数', '新規リード', '進捗中', '商談予定', 'ナーチャリング', '保留・NG', '契約']:
-                if col in result.columns:
-                    result[col] = result[col].fillna(0).astype(int)
-
-            # === 5. 指標計算 ===
-            total_spend = result[spend_col].sum()
-            total_leads = result['リード数'].sum()
-            total_connect = result['接続数'].sum()
-            total_deal = result['商談実施数'].sum()
-            total_plan = result['商談予約数'].sum()
-            total_corp = result['法人数'].sum()
-            
-            # 新規追加：全体のインプレッション・クリック数
-            total_impressions = result[impressions_col].sum() if impressions_col else 0
-            total_clicks = result[clicks_col].sum() if clicks_col else 0
-
-            result['CPA'] = result.apply(
-                lambda x: int(x[spend_col] / x['リード数']) if x['リード数'] > 0 else 0, axis=1
-            )
-            result['接続率'] = result.apply(
-                lambda x: (x['接続数'] / x['リード数'] * 100) if x['リード数'] > 0 else 0, axis=1
-            )
-            result['商談化率'] = result.apply(
-                lambda x: ((x['商談実施数'] + x['商談予約数']) / x['リード数'] * 100) if x['リード数'] > 0 else 0, axis=1
-            )
-            result['法人率'] = result.apply(
-                lambda x: (x['法人数'] / x['リード数'] * 100) if x['リード数'] > 0 else 0, axis=1
-            )
-            
-            # 新規追加：LP遷移率（CVR） = リード数 / クリック数
-            if clicks_col:
-                result['LP遷移率'] = result.apply(
-                    lambda x: (x['リード数'] / x[clicks_col] * 100) if x[clicks_col] > 0 else 0, axis=1
-                )
-            else:
-                result['LP遷移率'] = 0
-
-            # === 6. 判定ロジック ===
-            def judge(row):
-                cpa_ok = row['CPA'] > 0 and row['CPA'] <= cpa_limit
-                connect_ok = row['接続率'] >= connect_target
-                meeting_ok = row['商談化率'] >= meeting_target
-
-                conditions_met = sum([cpa_ok, connect_ok, meeting_ok])
-
-                if conditions_met == 3:
-                    return "最優秀"
-                elif conditions_met == 2 and meeting_ok:
-                    return "優秀"
-                elif conditions_met == 2:
-                    return "要改善"
-                elif conditions_met == 1 and meeting_ok:
-                    return "要改善"
+                if cols['call_result_col']:
+                    st.sidebar.write(f"接続列: `{cols['call_result_col']}` → {debug['connect_rows']}件")
                 else:
-                    return "停止推奨"
-
-            result['判定'] = result.apply(judge, axis=1)
-            
-            # === 新規追加：クリエイティブ診断ロジック ===
-            def creative_diagnosis(row):
-                ctr_ok = row['CTR_calc'] >= ctr_target
-                cvr_ok = row['LP遷移率'] >= cvr_target
-                
-                # CV0の場合：IMP + CTRで継続/停止判断
-                if row['リード数'] == 0:
-                    if impressions_col and row[impressions_col] < imp_threshold:
-                        return "データ不足"
-                    elif ctr_ok:
-                        return "継続監視"
-                    else:
-                        return "停止検討"
-                
-                # CV3以上で法人0の場合：ターゲット外
-                if row['リード数'] >= 3 and row['法人数'] == 0:
-                    return "ターゲット外"
-                
-                # CV1以上の場合：CTR + LP遷移率 + 法人率の3軸で診断
-                corp_ok = row['法人率'] >= corp_target
-                
-                if ctr_ok and cvr_ok and corp_ok:
-                    return "優秀"
-                elif ctr_ok and cvr_ok and not corp_ok:
-                    return "ターゲット要見直し"
-                elif ctr_ok and not cvr_ok and corp_ok:
-                    return "LP要改善"
-                elif ctr_ok and not cvr_ok and not corp_ok:
-                    return "LP+ターゲット要見直し"
-                elif not ctr_ok and cvr_ok and corp_ok:
-                    return "クリエイティブ要改善"
-                elif not ctr_ok and cvr_ok and not corp_ok:
-                    return "クリエイティブ+ターゲット要見直し"
-                elif not ctr_ok and not cvr_ok and corp_ok:
-                    return "クリエイティブ+LP要改善"
+                    st.sidebar.warning("⚠️ 「コールの成果」列が見つかりません")
+
+                if cols['first_meeting_col']:
+                    st.sidebar.write(f"初回商談日あり: {debug['first_meeting_rows']}件")
+                if cols['second_meeting_col']:
+                    st.sidebar.write(f"再商談日あり: {debug['second_meeting_rows']}件")
+                if 'deal_done_rows' in debug:
+                    st.sidebar.write(f"✅ 商談実施数: {debug['deal_done_rows']}件")
                 else:
-                    return "全面見直し"
-            
-            result['クリエイティブ診断'] = result.apply(creative_diagnosis, axis=1)
+                    st.sidebar.warning("⚠️ 商談日付列が見つかりません")
 
-            # === 7. 全体サマリー KPI計算 ===
-            avg_cpa = int(total_spend / total_leads) if total_leads > 0 else 0
-            avg_connect = (total_connect / total_leads * 100) if total_leads > 0 else 0
-            avg_meeting = ((total_deal + total_plan) / total_leads * 100) if total_leads > 0 else 0
-            avg_corp = (total_corp / total_leads * 100) if total_leads > 0 else 0
-            
-            # 新規追加：全体CTR、CPM、LP遷移率
-            avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-            avg_cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
-            avg_cvr = (total_leads / total_clicks * 100) if total_clicks > 0 else 0
-
-            st.subheader("全体実績サマリー")
-
-            cols_row1 = st.columns([1, 1, 1, 1])
-
-            with cols_row1[0]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>総消化金額</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>¥{int(total_spend):,}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with cols_row1[1]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>総リード数</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>{int(total_leads)}件</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with cols_row1[2]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>接続数</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_connect)}件</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>接続率 {avg_connect:.1f}%</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with cols_row1[3]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center; margin-bottom: 16px;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>平均CPA</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>¥{avg_cpa:,}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            cols_row2 = st.columns([1, 1, 1, 1])
-
-            with cols_row2[0]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 12px;'>商談実施数</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2;'>{int(total_deal)}件</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with cols_row2[1]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>商談予約数</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_plan)}件</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>商談化率 {avg_meeting:.1f}%</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with cols_row2[2]:
-                st.markdown(f"""
-                <div style='background-color: rgb(64, 180, 200); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>法人数</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_corp)}件</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>法人率 {avg_corp:.1f}%</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with cols_row2[3]:
-                st.markdown("""
-                <div style='height: 140px;'></div>
-                """, unsafe_allow_html=True)
-
-            # === 新規追加：クリエイティブ指標サマリー ===
-            st.markdown("---")
-            st.subheader("クリエイティブ指標サマリー")
-            
-            cols_creative = st.columns([1, 1, 1, 1])
-            
-            with cols_creative[0]:
-                ctr_color = "rgb(40, 167, 69)" if avg_ctr >= ctr_target else "rgb(220, 53, 69)"
-                st.markdown(f"""
-                <div style='background-color: {ctr_color}; border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>平均CTR</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{avg_ctr:.2f}%</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>目標: {ctr_target}%</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with cols_creative[1]:
-                cvr_color = "rgb(40, 167, 69)" if avg_cvr >= cvr_target else "rgb(220, 53, 69)"
-                st.markdown(f"""
-                <div style='background-color: {cvr_color}; border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>LP遷移率</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{avg_cvr:.1f}%</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>目標: {cvr_target}%</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with cols_creative[2]:
-                corp_color = "rgb(40, 167, 69)" if avg_corp >= corp_target else "rgb(220, 53, 69)"
-                st.markdown(f"""
-                <div style='background-color: {corp_color}; border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>法人率</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{avg_corp:.1f}%</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>目標: {corp_target}%</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with cols_creative[3]:
-                st.markdown(f"""
-                <div style='background-color: rgb(108, 117, 125); border-radius: 12px; padding: 24px; color: white; height: 140px; display: flex; flex-direction: column; justify-content: center; align-items: center; text-align: center;'>
-                    <div style='font-size: 0.85rem; font-weight: 400; opacity: 0.95; margin-bottom: 8px;'>総クリック数</div>
-                    <div style='font-size: 1.6rem; font-weight: 700; line-height: 1.2; margin-bottom: 4px;'>{int(total_clicks):,}</div>
-                    <div style='font-size: 0.75rem; font-weight: 400; opacity: 0.9;'>IMP: {int(total_impressions):,}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            st.markdown("---")
-
-            summary_data = {
-                'ファイル名': meta_file.name + ' & ' + hs_file.name,
-                '総リード数': total_leads,
-                '平均CPA': avg_cpa,
-                '総消化金額': int(total_spend),
-                '商談化率': avg_meeting
-            }
-
-            if st.button("✅ KPI分析結果をスプレッドシートに反映！", help="このボタンで分析結果が全員共有のスプレッドシートに記録されます。"):
-                write_analysis_to_sheet(summary_data, SPREADSHEET_URL, KPI_SHEET_INDEX)
-
-            st.markdown("---")
-
-            # === 8. バナー別評価表 ===
-            st.subheader("バナー別 評価表")
-
-            display_df = result.copy()
-            display_df = display_df.rename(columns={
-                'key': 'バナーID',
-                spend_col: '消化金額'
-            })
-
-            display_df['消化金額_表示'] = display_df['消化金額'].apply(lambda x: f"{int(x):,}")
-            display_df['CPA_表示'] = display_df['CPA'].apply(lambda x: f"{int(x):,}")
-            display_df['接続率_表示'] = display_df['接続率'].apply(lambda x: f"{x:.1f}%")
-            display_df['商談化率_表示'] = display_df['商談化率'].apply(lambda x: f"{x:.1f}%")
-            display_df['法人率_表示'] = display_df['法人率'].apply(lambda x: f"{x:.1f}%")
-
-            show_df = display_df[['判定', 'バナーID', '消化金額_表示', 'リード数', 'CPA_表示', '接続率_表示', '商談化率_表示', '法人率_表示', '接続数', '商談実施数', '商談予約数', '法人数', '消化金額']].copy()
-            
-            # 消化金額0のバナーを除外
-            show_df = show_df[show_df['消化金額'] > 0]
-            show_df = show_df.drop(columns=['消化金額'])
-            
-            show_df.columns = ['判定', 'バナーID', '消化金額', 'リード数', 'CPA', '接続率', '商談化率', '法人率', '接続数', '商談実施数', '商談予約数', '法人数']
-
-            judgment_order = {"最優秀": 0, "優秀": 1, "要改善": 2, "停止推奨": 3}
-
-            show_df['判定_rank'] = show_df['判定'].map(judgment_order)
-            show_df['バナーID_num'] = show_df['バナーID'].str.extract(r'(\d+)').astype(float).fillna(0).astype(int)
-
-            show_df = show_df.sort_values(by=['判定_rank', 'バナーID_num'], ascending=[True, False])
-            show_df = show_df.drop(columns=['判定_rank', 'バナーID_num'])
-
-            def highlight_row(row):
-                判定 = row['判定']
-                if 判定 == "最優秀":
-                    color = 'background-color: #d4edda'
-                elif "優秀" in 判定:
-                    color = 'background-color: #d1ecf1'
-                elif "要改善" in 判定:
-                    color = 'background-color: #fff3cd'
-                elif "停止" in 判定:
-                    color = 'background-color: #f8d7da'
+                if cols['stage_col']:
+                    st.sidebar.write(f"商談予約: {debug['deal_plan_rows']}件")
                 else:
-                    color = ''
-                return [color] * len(row)
-
-            st.dataframe(
-                show_df.style.apply(highlight_row, axis=1),
-                use_container_width=True,
-                hide_index=True
-            )
-
-            # === 9. バナー別進捗状況テーブル ===
-            st.markdown("---")
-            st.subheader("バナー別 進捗状況")
-
-            progress_df = display_df[['バナーID', 'リード数', '新規リード', '進捗中', '商談予定', 'ナーチャリング', '保留・NG', '契約']].copy()
-            
-            # リード数が0のバナーを除外
-            progress_df = progress_df[progress_df['リード数'] > 0].drop(columns=['リード数'])
-            
-            progress_df['バナーID_num'] = progress_df['バナーID'].str.extract(r'(\d+)').astype(float).fillna(0).astype(int)
-            progress_df = progress_df.sort_values(by=['バナーID_num'], ascending=[False])
-            progress_df = progress_df.drop(columns=['バナーID_num'])
+                    st.sidebar.warning("⚠️ 「取引ステージ」列が見つかりません")
 
-            # 0を空白に置換
-            progress_df_display = progress_df.fillna(0).replace(0, '').replace(0.0, '')
+                if cols['attr_col']:
+                    st.sidebar.write(f"法人数: {debug['corp_rows']}件")
+            profiler.lap("表示: サイドバー")
 
-            st.dataframe(
-                progress_df_display, 
-                use_container_width=True,
-                hide_index=True
+            # === 6〜14. 判定とその結果の表示（判定基準の変更時はここだけ再実行） ===
+            render_scored_dashboard(
+                result, spend_col, impressions_col, clicks_col,
+                ', '.join(f.name for f in meta_files) + ' & ' + ', '.join(f.name for f in hs_files),
+                lazy_sections, profiler
             )
 
-            # === 10. 推奨アクション（既存） ===
-            st.markdown("---")
-            st.subheader("推奨アクション")
-
-            best = result[result['判定'] == "最優秀"]['key'].tolist()
-            good = result[result['判定'].str.contains("優秀", na=False)]['key'].tolist()
-            improve = result[result['判定'].str.contains("要改善", na=False)]['key'].tolist()
-            stop = result[result['判定'] == "停止推奨"]['key'].tolist()
-
-            if best:
-                st.success(f"【予算集中】 {', '.join(best)} → CPA・接続率・商談化率すべて基準クリア")
-            if good:
-                good_filtered = [b for b in good if b not in best]
-                if good_filtered:
-                    st.info(f"【有望株】 {', '.join(good_filtered)} → 商談化率は目標達成。CPA or 接続率を改善すれば最優秀に")
-            if improve:
-                st.warning(f"【要分析】 {', '.join(improve)} → LP改善や接続体制の見直しを検討")
-            if stop:
-                st.error(f"【停止検討】 {', '.join(stop)} → 予算を優秀バナーに振り替え")
-
-            # === 11. 新規追加：クリエイティブ診断表 ===
-            st.markdown("---")
-            
-            col_title, col_help = st.columns([3, 1])
-            with col_title:
-                st.subheader("クリエイティブ診断表")
-            
-            with st.expander("評価指標を見る"):
-                st.markdown(f"""
-**診断ロジック**
-
-| CV数 | 判定軸 | 備考 |
-|------|--------|------|
-| ≥ 3 & 法人0 | - | ターゲット外（即停止検討） |
-| ≥ 1 | CTR + LP遷移率 + 法人率 | 3軸で総合判定 |
-| 0 | IMP + CTR | 継続/停止の判断のみ |
-
-**CV1以上の診断結果**
-
-| CTR | LP遷移率 | 法人率 | 診断結果 |
-|:---:|:-------:|:-----:|---------|
-| ✓ | ✓ | ✓ | 優秀 |
-| ✓ | ✓ | ✗ | ターゲット要見直し |
-| ✓ | ✗ | ✓ | LP要改善 |
-| ✗ | ✓ | ✓ | クリエイティブ要改善 |
-| ✓ | ✗ | ✗ | LP+ターゲット要見直し |
-| ✗ | ✓ | ✗ | クリエイティブ+ターゲット要見直し |
-| ✗ | ✗ | ✓ | クリエイティブ+LP要改善 |
-| ✗ | ✗ | ✗ | 全面見直し |
-
-**CV0の診断結果**
-
-| IMP | CTR | 診断結果 |
-|:---:|:---:|---------|
-| < {imp_threshold:,} | - | データ不足 |
-| ≥ {imp_threshold:,} | ✓ | 継続監視 |
-| ≥ {imp_threshold:,} | ✗ | 停止検討 |
-
-**基準値（サイドバーで変更可能）**
-- 目標CTR: {ctr_target}%
-- 目標LP遷移率: {cvr_target}%
-- 目標法人率: {corp_target}%
-- IMP閾値: {imp_threshold:,}
-                """)
-            
-            st.caption("改善ポイントを特定するための診断表")
-            
-            # クリエイティブ診断用のDataFrame作成
-            creative_df = display_df.copy()
-            
-            # 表示用の列を作成
-            creative_df['CTR_表示'] = creative_df['CTR_calc'].apply(lambda x: f"{x:.2f}%")
-            creative_df['LP遷移率_表示'] = creative_df.apply(
-                lambda x: "-" if x['リード数'] == 0 else f"{x['LP遷移率']:.1f}%", axis=1
-            )
-            creative_df['法人率_表示'] = creative_df.apply(
-                lambda x: "-" if x['リード数'] == 0 else f"{x['法人率']:.1f}%", axis=1
-            )
-            creative_df['法人数_表示'] = creative_df.apply(
-                lambda x: "-" if x['リード数'] == 0 else int(x['法人数']), axis=1
-            )
-            
-            # インプレッション・クリック列名の取得
-            imp_col_name = impressions_col if impressions_col else 'インプレッション'
-            click_col_name = clicks_col if clicks_col else 'クリック数'
-            
-            if impressions_col and impressions_col in creative_df.columns:
-                creative_df['IMP_表示'] = creative_df[impressions_col].apply(lambda x: f"{int(x):,}")
-            else:
-                creative_df['IMP_表示'] = '-'
-            
-            if clicks_col and clicks_col in creative_df.columns:
-                creative_df['クリック_表示'] = creative_df[clicks_col].apply(lambda x: f"{int(x):,}")
-            else:
-                creative_df['クリック_表示'] = '-'
-            
-            # クリエイティブ診断表の表示列を選択
-            creative_show_df = creative_df[['クリエイティブ診断', 'バナーID', 'IMP_表示', 'クリック_表示', 'CTR_表示', 'リード数', 'LP遷移率_表示', '法人数_表示', '法人率_表示']].copy()
-            creative_show_df.columns = ['診断結果', 'バナーID', 'IMP', 'クリック', 'CTR', 'リード数', 'LP遷移率', '法人数', '法人率']
-            
-            # IMP0のみ除外（配信されていないので診断不能）、CV0は含める
-            if impressions_col and impressions_col in creative_df.columns:
-                creative_show_df = creative_show_df[creative_df[impressions_col] > 0]
-            
-            # 診断結果でソート
-            diagnosis_order = {
-                "優秀": 0, 
-                "ターゲット要見直し": 1,
-                "LP要改善": 2, 
-                "クリエイティブ要改善": 3,
-                "LP+ターゲット要見直し": 4,
-                "クリエイティブ+ターゲット要見直し": 5,
-                "クリエイティブ+LP要改善": 6,
-                "全面見直し": 7,
-                "ターゲット外": 8,
-                "継続監視": 9,
-                "停止検討": 10,
-                "データ不足": 11
-            }
-            creative_show_df['診断_rank'] = creative_show_df['診断結果'].map(diagnosis_order)
-            creative_show_df['バナーID_num'] = creative_show_df['バナーID'].str.extract(r'(\d+)').astype(float).fillna(0).astype(int)
-            creative_show_df = creative_show_df.sort_values(by=['診断_rank', 'バナーID_num'], ascending=[True, False])
-            creative_show_df = creative_show_df.drop(columns=['診断_rank', 'バナーID_num'])
-            
-            def highlight_creative_row(row):
-                診断 = row['診断結果']
-                if 診断 == "優秀":
-                    color = 'background-color: #d4edda'
-                elif 診断 == "継続監視":
-                    color = 'background-color: #e2e3e5'
-                elif "LP要改善" == 診断:
-                    color = 'background-color: #fff3cd'
-                elif "クリエイティブ要改善" == 診断:
-                    color = 'background-color: #ffe0b2'
-                elif "ターゲット要見直し" == 診断:
-                    color = 'background-color: #d1ecf1'
-                elif "データ不足" == 診断:
-                    color = 'background-color: #f5f5f5'
-                elif "ターゲット外" in 診断 or "停止検討" in 診断 or "全面見直し" in 診断:
-                    color = 'background-color: #f8d7da'
-                else:
-                    color = 'background-color: #fce4ec'
-                return [color] * len(row)
-            
-            st.dataframe(
-                creative_show_df.style.apply(highlight_creative_row, axis=1),
-                use_container_width=True,
-                hide_index=True
-            )
-            
-            # === 12. 新規追加：クリエイティブ診断の推奨アクション ===
-            st.markdown("---")
-            st.subheader("クリエイティブ改善アクション")
-            
-            # 診断結果ごとにバナーを分類
-            excellent_creative = result[result['クリエイティブ診断'] == "優秀"]['key'].tolist()
-            target_improve = result[result['クリエイティブ診断'] == "ターゲット要見直し"]['key'].tolist()
-            lp_improve = result[result['クリエイティブ診断'] == "LP要改善"]['key'].tolist()
-            creative_improve = result[result['クリエイティブ診断'] == "クリエイティブ要改善"]['key'].tolist()
-            lp_target_improve = result[result['クリエイティブ診断'] == "LP+ターゲット要見直し"]['key'].tolist()
-            creative_target_improve = result[result['クリエイティブ診断'] == "クリエイティブ+ターゲット要見直し"]['key'].tolist()
-            creative_lp_improve = result[result['クリエイティブ診断'] == "クリエイティブ+LP要改善"]['key'].tolist()
-            full_review = result[result['クリエイティブ診断'] == "全面見直し"]['key'].tolist()
-            target_miss = result[result['クリエイティブ診断'] == "ターゲット外"]['key'].tolist()
-            monitoring = result[result['クリエイティブ診断'] == "継続監視"]['key'].tolist()
-            stop_consider = result[result['クリエイティブ診断'] == "停止検討"]['key'].tolist()
-            data_shortage = result[result['クリエイティブ診断'] == "データ不足"]['key'].tolist()
-            
-            if excellent_creative:
-                st.success(f"**優秀クリエイティブ** {', '.join(excellent_creative)}\n→ CTR・LP遷移率・法人率すべて基準クリア。このクリエイティブを横展開")
-            
-            if creative_improve:
-                st.warning(f"**デザイン/コピー改善** {', '.join(creative_improve)}\n→ CTRが低い。サムネイル・キャッチコピー・訴求軸を変更してテスト")
-            
-            if lp_improve:
-                st.warning(f"**LP改善** {', '.join(lp_improve)}\n→ クリックは取れているがCVしない。LP構成・フォーム・訴求の整合性を見直し")
-            
-            if target_improve:
-                st.info(f"**ターゲット見直し** {', '.join(target_improve)}\n→ CVするが法人が少ない。ターゲティング・訴求を法人向けに調整")
-            
-            if creative_lp_improve:
-                st.warning(f"**クリエイティブ+LP改善** {', '.join(creative_lp_improve)}\n→ CTRもLP遷移率も低い。訴求軸の再設計が必要")
-            
-            if lp_target_improve:
-                st.warning(f"**LP+ターゲット見直し** {', '.join(lp_target_improve)}\n→ LP遷移率が低く法人率も低い。LPとターゲティングの両方を見直し")
-            
-            if creative_target_improve:
-                st.warning(f"**クリエイティブ+ターゲット見直し** {', '.join(creative_target_improve)}\n→ CTRが低く法人率も低い。クリエイティブ刷新とターゲティング調整を並行")
-            
-            if full_review:
-                st.error(f"**全面見直し** {', '.join(full_review)}\n→ 主要指標が基準未達。このクリエイティブは停止し、新規制作を推奨")
-            
-            if target_miss:
-                st.error(f"**ターゲット外** {', '.join(target_miss)}\n→ CV3件以上あるが法人ゼロ。個人しか来ていない。停止推奨")
-            
-            if monitoring:
-                st.info(f"**継続監視（CV0）** {', '.join(monitoring)}\n→ CTRは基準クリア。CV獲得まで配信継続")
-            
-            if stop_consider:
-                st.error(f"**停止検討（CV0）** {', '.join(stop_consider)}\n→ CTRも基準未達。予算を他バナーに振り替え")
-            
-            if data_shortage:
-                st.info(f"**データ不足** {', '.join(data_shortage)}\n→ IMP不足で判断不能。配信継続してデータ蓄積")
-
-            # === 13. 分布図 ===
-            st.markdown("---")
-            st.subheader("バナー別 パフォーマンス分布")
-
-            chart_data = result[result['リード数'] > 0].copy()
-            if len(chart_data) > 0:
-                chart = alt.Chart(chart_data).mark_circle(size=200).encode(
-                    x=alt.X('CPA:Q', title='CPA (円)', scale=alt.Scale(zero=False)),
-                    y=alt.Y('商談化率:Q', title='商談化率 (%)'),
-                    color=alt.Color('判定:N', legend=alt.Legend(title="判定"), scale=alt.Scale(
-                        domain=['最優秀', '優秀', '要改善', '停止推奨'],
-                        range=['#28a745', '#17a2b8', '#ffc107', '#dc3545']
-                    )),
-                    size=alt.Size('リード数:Q', legend=None),
-                    tooltip=['key', 'CPA', '接続率', '商談化率', '法人率', 'リード数', '判定']
-                ).properties(height=450).interactive()
-                st.altair_chart(chart, use_container_width=True)
-            
-            # === 14. 新規追加：クリエイティブ分布図 ===
-            st.markdown("---")
-            st.subheader("クリエイティブ パフォーマンス分布")
-            
-            creative_chart_data = result[(result['リード数'] > 0) & (result['CTR_calc'] > 0)].copy()
-            if len(creative_chart_data) > 0:
-                creative_chart = alt.Chart(creative_chart_data).mark_circle(size=200).encode(
-                    x=alt.X('CTR_calc:Q', title='CTR (%)', scale=alt.Scale(zero=False)),
-                    y=alt.Y('LP遷移率:Q', title='LP遷移率 (%)'),
-                    color=alt.Color('クリエイティブ診断:N', legend=alt.Legend(title="診断結果"), scale=alt.Scale(
-                        domain=['優秀', 'ターゲット要見直し', 'LP要改善', 'クリエイティブ要改善', 'LP+ターゲット要見直し', 'クリエイティブ+ターゲット要見直し', 'クリエイティブ+LP要改善', '全面見直し', 'ターゲット外'],
-                        range=['#28a745', '#17a2b8', '#ffc107', '#fd7e14', '#e83e8c', '#6f42c1', '#20c997', '#dc3545', '#343a40']
-                    )),
-                    size=alt.Size('リード数:Q', legend=None),
-                    tooltip=['key', 'CTR_calc', 'LP遷移率', '法人率', 'リード数', 'クリエイティブ診断']
-                ).properties(height=450).interactive()
-                st.altair_chart(creative_chart, use_container_width=True)
+            # === 15. 処理時間・メモリの計測結果 ===
+            if profile_stages:
+                profiler.stop()
+                st.markdown("---")
+                with st.expander("⏱ 処理時間・メモリ（今回の再実行）", expanded=True):
+                    profile_df = profiler.to_frame()
+                    st.dataframe(profile_df, use_container_width=True, hide_index=True)
+                    if profiler.memory_traced:
+                        memory_note = (
+                            "ピークメモリ増分はプロセス全体のPython/NumPyの確保量（各ステージ開始時からの増分。"
+                            "同時に処理中のほかのセッションの分も含む）。"
+                        )
+                    else:
+                        memory_note = "ほかのセッションがメモリを計測中のため、今回は時間だけを計測しました。"
+                    st.caption(
+                        f"合計 {profile_df['時間（ms）'].sum():,.1f} ms。{memory_note}"
+                        "集計がキャッシュから返された場合、Meta/HubSpotの内訳は表示されません"
+                    )
+                if dump_profile:
+                    profiler.write_jsonl(
+                        meta_file=', '.join(f.name for f in meta_files), hs_file=', '.join(f.name for f in hs_files),
+                        meta_rows=debug['meta_rows'], hs_rows=debug['hs_rows'], hs_streaming=hs_streaming,
+                        excel_engine=EXCEL_ENGINE
+                    )
+                    st.caption(f"💾 計測結果を {PROFILE_LOG_PATH} に追記しました")
 
         except Exception as e:
             st.error(f"処理エラー: {e}")
             import traceback
             st.code(traceback.format_exc())
+        finally:
+            profiler.stop()
 
 else:
     st.info("Meta広告実績とHubSpotデータをアップロードしてください")
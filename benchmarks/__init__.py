@@ -0,0 +1 @@
+"""集計パイプラインのベンチマーク（python -m benchmarks.run）"""
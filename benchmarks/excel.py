@@ -0,0 +1,97 @@
+"""Excel（.xlsx）の読み込みのエンジン別ベンチマーク
+
+    python -m benchmarks.excel                        # 1k / 10k / 50k 行
+    python -m benchmarks.excel --rows 10000 --out excel.json
+
+合成エクスポート（benchmarks.synthetic）を .xlsx で書き出し、アプリと同じ read_frame で
+Meta・HubSpotそれぞれを使えるエンジンごとに読み込む。各エンジンの結果が openpyxl と同じ表になることも確認する。
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from mago.analysis import (
+    META_CATEGORICAL_COLUMNS, HS_CATEGORICAL_COLUMNS,
+    detect_columns, categorical_dtypes, meta_required_columns, hs_required_columns,
+)
+from mago.loader import available_excel_engines, read_header, read_frame
+
+from .run import DEFAULT_DATA_DIR, environment
+from .synthetic import write_exports
+
+# .xlsx の書き出しは遅いため、run.py より小さい行数を既定にする
+DEFAULT_ROWS = [1_000, 10_000, 50_000]
+
+
+# 必要な列だけを読む（ヘッダーはエンジンによらず openpyxl で先頭行だけを読むため含めない）。(秒, 読んだ表) を返す
+def time_read(data, file_name, usecols, dtypes, engine):
+    clock = time.perf_counter()
+    df = read_frame(data, file_name, None, usecols, dtypes, excel_engine=engine)
+    return time.perf_counter() - clock, df
+
+def benchmark(rows, data_dir, repeat, seed):
+    paths = write_exports(rows, data_dir, seed=seed, fmt='xlsx')
+    datas = {}
+    for side, path in paths.items():
+        with open(path, 'rb') as f:
+            datas[side] = f.read()
+    headers = {side: read_header(data, paths[side])[0] for side, data in datas.items()}
+    cols = detect_columns(headers['meta'], headers['hubspot'])
+    reads = {
+        'meta': (meta_required_columns(cols), categorical_dtypes(cols, META_CATEGORICAL_COLUMNS)),
+        'hubspot': (hs_required_columns(cols), categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS)),
+    }
+
+    engines = {}
+    reference = {}
+    for engine in ['openpyxl'] + [e for e in available_excel_engines() if e != 'openpyxl']:
+        seconds = {}
+        for side, (usecols, dtypes) in reads.items():
+            runs = [time_read(datas[side], paths[side], usecols, dtypes, engine) for _ in range(repeat)]
+            seconds[side] = min(t for t, _ in runs)
+            df = runs[0][1]
+            if side not in reference:
+                reference[side] = df
+            else:
+                pd.testing.assert_frame_equal(df, reference[side])
+        engines[engine] = seconds
+    return {'rows': rows, 'seed': seed, 'repeat': repeat, 'engines': engines}
+
+def print_results(results):
+    for result in results:
+        print(f"\n== {result['rows']:,}行 (xlsx) ==")
+        baseline = result['engines']['openpyxl']
+        for engine, seconds in result['engines'].items():
+            line = "  ".join(f"{side} {s * 1000:>9.1f} ms" for side, s in seconds.items())
+            speedup = sum(baseline.values()) / sum(seconds.values())
+            print(f"  {engine:<10} {line}  (openpyxl比 ×{speedup:.1f})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.excel', description="Excelの読み込みのエンジン別ベンチマーク")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Meta・HubSpotそれぞれの行数")
+    parser.add_argument('--repeat', type=int, default=3, help="各エンジンの実行回数（最小値を記録）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="合成データの保存先")
+    parser.add_argument('--out', help="結果をJSONで保存するパス")
+    args = parser.parse_args(argv)
+
+    engines = available_excel_engines()
+    if engines == ['openpyxl']:
+        print("python-calamine がインストールされていないため、openpyxl のみ計測します")
+
+    results = [benchmark(rows, args.data_dir, args.repeat, args.seed) for rows in args.rows]
+    report = {'environment': environment(), 'results': results}
+
+    print(f"revision {report['environment']['revision']} / pandas {pd.__version__} / engines {', '.join(engines)}")
+    print_results(results)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+"""集計パイプラインのステージ別ベンチマーク
+
+    python -m benchmarks.run                          # 1k / 100k / 1M 行
+    python -m benchmarks.run --rows 1000 100000 --out bench.json
+    python -m benchmarks.run --compare bench.json     # 前回の結果と比べ、遅くなったステージがあれば終了コード1
+
+行数はMeta・HubSpotそれぞれの行数。合成データは --data-dir に1回だけ書き出して再利用する。
+各ステージは --repeat 回実行した最小値（秒）を記録する（最小値は他プロセスの影響を受けにくい）。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from mago.analysis import (
+    DEFAULT_THRESHOLDS, META_CATEGORICAL_COLUMNS, HS_CATEGORICAL_COLUMNS,
+    detect_columns, categorical_dtypes, meta_required_columns, hs_required_columns,
+    normalize_frames, aggregate_meta, prepare_hs_rows, count_hs_rows,
+    finalize_hs_summary, merge_banner_summary, score_banners, period_bounds,
+)
+from mago.display import (
+    EVALUATION_FORMATS, PROGRESS_FORMATS, CREATIVE_FORMATS,
+    display_frame, evaluation_table, progress_table, creative_table, format_table,
+)
+from mago.loader import read_header, read_frame
+from mago.rangeindex import BannerRangeIndex
+from mago.sensitivity import JUDGMENT_SWEEP_AXES, DIAGNOSIS_SWEEP_AXES, default_grids, judgment_sweep, diagnosis_sweep
+
+from .synthetic import write_exports
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+DEFAULT_DATA_DIR = os.path.join("data", "benchmarks")
+
+# range_query で集計する期間（合成データの日付の範囲内の1か月）
+RANGE_QUERY_PERIOD = ('2026-03-01', '2026-03-31')
+
+# 比較時に差を無視する下限（秒）。これより短いステージは計測誤差が大きい
+COMPARE_MIN_SECONDS = 0.005
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# パイプラインを1回実行し、ステージごとの経過時間（秒）を返す
+def run_pipeline(meta_path, hs_path):
+    timings = {}
+    clock = time.perf_counter()
+
+    def lap(stage):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[stage] = now - clock
+        clock = now
+
+    meta_name = os.path.basename(meta_path)
+    hs_name = os.path.basename(hs_path)
+    with open(meta_path, 'rb') as f:
+        meta_data = f.read()
+    with open(hs_path, 'rb') as f:
+        hs_data = f.read()
+    meta_header, meta_csv_format = read_header(meta_data, meta_name)
+    hs_header, hs_csv_format = read_header(hs_data, hs_name)
+    lap('read_header')
+
+    cols = detect_columns(meta_header, hs_header)
+    lap('detect_columns')
+
+    df_meta = read_frame(
+        meta_data, meta_name, meta_csv_format,
+        meta_required_columns(cols), categorical_dtypes(cols, META_CATEGORICAL_COLUMNS)
+    )
+    df_hs = read_frame(
+        hs_data, hs_name, hs_csv_format,
+        hs_required_columns(cols), categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS)
+    )
+    lap('load')
+
+    df_meta, df_hs = normalize_frames(df_meta, df_hs, cols)
+    lap('normalize')
+
+    debug = {}
+    meta_agg = aggregate_meta(df_meta, cols, None, None, debug)
+    lap('meta_aggregate')
+
+    hs_rows = prepare_hs_rows(df_hs, cols, None, None, debug)
+    lap('hs_key_extraction')
+
+    hs_counts = count_hs_rows(hs_rows, cols)
+    lap('hs_counts')
+
+    hs_summary = finalize_hs_summary(hs_counts, cols, debug)
+    aggregated = merge_banner_summary(hs_summary, meta_agg, cols)
+    lap('merge')
+
+    result = score_banners(aggregated, cols['impressions_col'], **DEFAULT_THRESHOLDS)
+    lap('score')
+
+    display_df = display_frame(result, cols['spend_col'])
+    format_table(evaluation_table(display_df), EVALUATION_FORMATS)
+    format_table(progress_table(display_df), PROGRESS_FORMATS)
+    format_table(creative_table(display_df, cols['impressions_col'], cols['clicks_col']), CREATIVE_FORMATS)
+    lap('format')
+
+    timings['total'] = sum(timings.values())
+
+    # 期間を変えたときの集計（累積和の作成は1回、期間ごとの集計は2行の差）。total には含めない
+    clock = time.perf_counter()
+    range_index = BannerRangeIndex(df_meta, df_hs, cols)
+    lap('range_index')
+    range_index.aggregate(*period_bounds(*RANGE_QUERY_PERIOD))
+    lap('range_query')
+
+    # 判定基準の感度分析（既定の格子。判定・クリエイティブ診断の両方）。total には含めない
+    clock = time.perf_counter()
+    judgment_sweep(aggregated, cols['spend_col'], default_grids(JUDGMENT_SWEEP_AXES, DEFAULT_THRESHOLDS))
+    diagnosis_sweep(
+        aggregated, cols['spend_col'], default_grids(DIAGNOSIS_SWEEP_AXES, DEFAULT_THRESHOLDS),
+        DEFAULT_THRESHOLDS['imp_threshold'], cols['impressions_col']
+    )
+    lap('sensitivity')
+    return timings, len(result)
+
+def benchmark(rows, data_dir, repeat, fmt, seed):
+    paths = write_exports(rows, data_dir, seed=seed, fmt=fmt)
+    runs = []
+    for _ in range(repeat):
+        timings, banners = run_pipeline(paths['meta'], paths['hubspot'])
+        runs.append(timings)
+    stages = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+    return {'rows': rows, 'format': fmt, 'seed': seed, 'banners': banners, 'repeat': repeat, 'stages': stages}
+
+def environment():
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+def print_results(results, baseline=None):
+    baseline_by_key = {(r['rows'], r['format']): r for r in (baseline or {}).get('results', [])}
+    for result in results:
+        print(f"\n== {result['rows']:,}行 ({result['format']}, {result['banners']}バナー) ==")
+        previous = baseline_by_key.get((result['rows'], result['format']), {}).get('stages', {})
+        for stage, seconds in result['stages'].items():
+            line = f"  {stage:<18} {seconds * 1000:>10.1f} ms"
+            if previous.get(stage):
+                line += f"  (前回 {previous[stage] * 1000:.1f} ms, ×{seconds / previous[stage]:.2f})"
+            print(line)
+
+# 前回の結果より tolerance 倍以上遅くなったステージ（行数・形式が同じ結果どうしのみ比較）
+def regressions(results, baseline, tolerance):
+    baseline_by_key = {(r['rows'], r['format']): r for r in baseline.get('results', [])}
+    found = []
+    for result in results:
+        previous = baseline_by_key.get((result['rows'], result['format']))
+        if previous is None:
+            continue
+        for stage, seconds in result['stages'].items():
+            before = previous['stages'].get(stage)
+            if before is None or max(seconds, before) < COMPARE_MIN_SECONDS:
+                continue
+            if seconds > before * tolerance:
+                found.append((result['rows'], stage, before, seconds))
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description="集計パイプラインのステージ別ベンチマーク")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Meta・HubSpotそれぞれの行数")
+    parser.add_argument('--repeat', type=int, default=3, help="各行数の実行回数（最小値を記録）")
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv', help="合成データのファイル形式")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="合成データの保存先")
+    parser.add_argument('--out', help="結果をJSONで保存するパス")
+    parser.add_argument('--compare', help="比較する前回の結果（--out で保存したJSON）")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="この倍率以上遅くなったステージを劣化とみなす")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = [benchmark(rows, args.data_dir, args.repeat, args.format, args.seed) for rows in args.rows]
+    report = {'environment': environment(), 'results': results}
+
+    print(f"revision {report['environment']['revision']} / pandas {pd.__version__} / numpy {np.__version__}")
+    print_results(results, baseline)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline is not None:
+        found = regressions(results, baseline, args.tolerance)
+        for rows, stage, before, after in found:
+            print(f"⚠️ {rows:,}行 {stage}: {before * 1000:.1f} ms → {after * 1000:.1f} ms", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
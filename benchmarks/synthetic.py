@@ -0,0 +1,95 @@
+"""ベンチマーク用の合成エクスポート（Meta広告実績・HubSpotデータ）
+
+列名・値の形式は実際のエクスポートに合わせ、乱数のシードを固定して毎回同じデータを作る。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# バナー数・期間（行数に関わらず一定にして、行数だけを変えたときの比較にする）
+BANNER_COUNT = 300
+PERIOD_START = '2026-01-01'
+PERIOD_DAYS = 180
+
+HS_STAGES = [
+    '新規リード', 'FS対応中：社内検討', 'FS対応中：検討', 'FS対応中：見込み', 'FS対応中：申込',
+    '商談予定', 'ナーチャリング', '低温リスト', '完全NG', 'NG対象', '規約完了', 'その他',
+]
+HS_CALL_RESULTS = ['接続あり', '接続なし', '不在']
+HS_ATTRIBUTES = ['法人', '個人', '法人社員', '個人事業主']
+
+
+def banner_ids(banners=BANNER_COUNT):
+    return np.array([f"bn{i:03d}" for i in range(1, banners + 1)], dtype=object)
+
+def random_dates(rng, rows):
+    offsets = rng.integers(0, PERIOD_DAYS, rows)
+    return pd.Timestamp(PERIOD_START) + pd.to_timedelta(offsets, unit='D')
+
+# 値の一部を欠損にする（HubSpotの空欄セル）
+def with_missing(rng, values, rate):
+    values = values.astype(object)
+    values[rng.random(len(values)) < rate] = None
+    return values
+
+# Meta広告実績（広告×日の行。広告名にバナーID bnNNN を含む）
+def make_meta_export(rows, seed=0, banners=BANNER_COUNT):
+    rng = np.random.default_rng(seed)
+    ids = banner_ids(banners)[rng.integers(0, banners, rows)]
+    variants = rng.integers(1, 6, rows).astype(str)
+    names = pd.Series(ids).str.cat(pd.Series(variants), sep='_creative_').to_numpy(dtype=object)
+    # 5%はバナーIDを含まない広告（キー抽出で除外される行）
+    names[rng.random(rows) < 0.05] = 'ブランド認知_動画'
+
+    impressions = rng.integers(0, 20000, rows)
+    clicks = rng.binomial(impressions, 0.012)
+    spend = rng.integers(0, 50000, rows)
+    return pd.DataFrame({
+        'レポート開始日': random_dates(rng, rows).strftime('%Y-%m-%d'),
+        '広告の名前': names,
+        '消化金額 (JPY)': spend,
+        'インプレッション': impressions,
+        'CPM(インプレッション単価) (JPY)': np.round(np.divide(spend, impressions, out=np.zeros(rows), where=impressions > 0) * 1000, 2),
+        'リンクのクリック': clicks,
+        'CTR(リンククリックスルー率)': np.round(np.divide(clicks, impressions, out=np.zeros(rows), where=impressions > 0) * 100, 4),
+    })
+
+# HubSpotデータ（リード1件1行。UTM Contentにバナーのキー）
+def make_hs_export(rows, seed=0, banners=BANNER_COUNT):
+    rng = np.random.default_rng(seed + 1)
+    utm = banner_ids(banners)[rng.integers(0, banners, rows)]
+    created = random_dates(rng, rows) + pd.to_timedelta(rng.integers(0, 24 * 60, rows), unit='min')
+    first_meeting = (created + pd.to_timedelta(rng.integers(1, 30, rows), unit='D')).strftime('%Y-%m-%d')
+    second_meeting = (created + pd.to_timedelta(rng.integers(30, 60, rows), unit='D')).strftime('%Y/%m/%d')
+    return pd.DataFrame({
+        'レコードID': np.arange(1, rows + 1),
+        '作成日': created.strftime('%Y/%m/%d %H:%M'),
+        'UTM Content': with_missing(rng, utm, 0.05),
+        '取引ステージ': with_missing(rng, np.array(HS_STAGES, dtype=object)[rng.integers(0, len(HS_STAGES), rows)], 0.1),
+        'コールの成果': with_missing(rng, np.array(HS_CALL_RESULTS, dtype=object)[rng.integers(0, len(HS_CALL_RESULTS), rows)], 0.2),
+        '属性': with_missing(rng, np.array(HS_ATTRIBUTES, dtype=object)[rng.integers(0, len(HS_ATTRIBUTES), rows)], 0.1),
+        '初回商談日': with_missing(rng, first_meeting.to_numpy(dtype=object), 0.8),
+        '再商談日': with_missing(rng, second_meeting.to_numpy(dtype=object), 0.95),
+    })
+
+# 行数・シードごとに1回だけ書き出し、2回目以降は既存のファイルを使う
+def write_exports(rows, out_dir, seed=0, fmt='csv'):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        'meta': os.path.join(out_dir, f"meta_{rows}_{seed}.{fmt}"),
+        'hubspot': os.path.join(out_dir, f"hubspot_{rows}_{seed}.{fmt}"),
+    }
+    for side, make in [('meta', make_meta_export), ('hubspot', make_hs_export)]:
+        path = paths[side]
+        if os.path.exists(path):
+            continue
+        df = make(rows, seed)
+        tmp_path = f"{path}.tmp.{fmt}"
+        if fmt == 'csv':
+            # Metaの日本語CSVエクスポートと同じBOM付きUTF-8
+            df.to_csv(tmp_path, index=False, encoding='utf-8-sig' if side == 'meta' else 'utf-8')
+        else:
+            df.to_excel(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return paths
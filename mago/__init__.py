@@ -0,0 +1 @@
+"""Meta広告×HubSpotのバナー別分析（ダッシュボードとCLIで共通の集計・判定ロジック）"""
@@ -0,0 +1,513 @@
+"""Meta広告×HubSpotのバナー別集計と判定（Streamlitに依存しない）"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from .dates import DateParser
+from .keys import categorical_keys, parse_banner_id, parse_utm
+from .loader import csv_read_options
+from .profiling import NULL_PROFILER
+
+# HubSpot CSVのストリーミング集計で1回に読み込む行数
+HS_STREAM_CHUNKSIZE = 50000
+
+STATUS_NAMES = ['新規リード', '進捗中', '商談予定', 'ナーチャリング', '保留・NG', '契約']
+
+# 判定基準の初期値（サイドバーの初期値・CLIの既定値）
+DEFAULT_THRESHOLDS = {
+    'cpa_limit': 10000,
+    'connect_target': 50,
+    'meeting_target': 18,
+    'ctr_target': 1.0,
+    'cvr_target': 10.0,
+    'corp_target': 50.0,
+    'imp_threshold': 1000,
+}
+
+# 必ず必要な列（広告名・消化金額・UTM）
+REQUIRED_COLUMNS = ['name_col', 'spend_col', 'utm_col']
+
+def detect_columns(meta_cols, hs_cols):
+    # === Meta側：列の特定（優先順位：広告の名前 > 広告名 > 広告セット名 > キャンペーン名）===
+    name_col = None
+    for pattern in ['広告の名前', '広告名', '広告セット名', 'キャンペーン名', 'Ad name', 'Ad set name', 'Campaign name', '名前', 'Name']:
+        name_col = next((c for c in meta_cols if pattern in str(c)), None)
+        if name_col:
+            break
+
+    spend_col = next((c for c in meta_cols if '消化金額' in str(c)), None)
+    if spend_col is None:
+        spend_col = next((c for c in meta_cols if 'Amount' in str(c) or '費用' in str(c) or 'Spent' in str(c)), None)
+
+    date_col_meta = next((c for c in meta_cols if 'レポート開始日' in str(c) or '開始日' in str(c)), None)
+
+    # === CPM、CTR、クリック数、インプレッション数の列特定 ===
+    impressions_col = next((c for c in meta_cols if c == 'インプレッション'), None)
+    if impressions_col is None:
+        impressions_col = next((c for c in meta_cols if 'インプレッション' in str(c) and 'CPM' not in str(c) and '単価' not in str(c)), None)
+
+    cpm_col = next((c for c in meta_cols if 'CPM' in str(c) and 'インプレッション単価' in str(c)), None)
+    if cpm_col is None:
+        cpm_col = next((c for c in meta_cols if 'CPM' in str(c)), None)
+
+    clicks_col = next((c for c in meta_cols if 'リンクのクリック' in str(c)), None)
+    if clicks_col is None:
+        clicks_col = next((c for c in meta_cols if 'Link clicks' in str(c) or 'リンククリック' in str(c)), None)
+
+    ctr_col = next((c for c in meta_cols if 'CTR(リンククリックスルー率)' in str(c)), None)
+    if ctr_col is None:
+        ctr_col = next((c for c in meta_cols if 'CTR' in str(c) and 'リンク' in str(c)), None)
+
+    # === HubSpot側：列の特定 ===
+    utm_col = next((c for c in hs_cols if 'UTM Content' in str(c)), None)
+    if utm_col is None:
+        utm_col = next((c for c in hs_cols if 'UTM' in str(c) or 'Content' in str(c)), None)
+
+    attr_col = next((c for c in hs_cols if '属性' in str(c)), None)
+    date_col_hs = next((c for c in hs_cols if '作成日' in str(c)), None)
+    record_id_col = next((c for c in hs_cols if c in ('レコードID', 'Record ID')), None)
+    call_result_col = next((c for c in hs_cols if 'コールの成果' in str(c)), None)
+    first_meeting_col = next((c for c in hs_cols if '初回商談日' in str(c)), None)
+    second_meeting_col = next((c for c in hs_cols if '再商談日' in str(c)), None)
+    stage_col = next((c for c in hs_cols if '取引ステージ' in str(c)), None)
+
+    return {
+        'name_col': name_col,
+        'spend_col': spend_col,
+        'date_col_meta': date_col_meta,
+        'impressions_col': impressions_col,
+        'cpm_col': cpm_col,
+        'clicks_col': clicks_col,
+        'ctr_col': ctr_col,
+        'utm_col': utm_col,
+        'attr_col': attr_col,
+        'date_col_hs': date_col_hs,
+        'record_id_col': record_id_col,
+        'call_result_col': call_result_col,
+        'first_meeting_col': first_meeting_col,
+        'second_meeting_col': second_meeting_col,
+        'stage_col': stage_col,
+    }
+
+# 読み込み時にカテゴリ型にする列（同じ値が多くの行で繰り返される文字列の列）
+META_CATEGORICAL_COLUMNS = ['name_col']
+HS_CATEGORICAL_COLUMNS = ['utm_col', 'call_result_col', 'attr_col', 'stage_col']
+
+def categorical_dtypes(cols, keys):
+    return {cols[k]: 'category' for k in keys if cols[k]}
+
+# Meta側で読み込む列（CPM・CTRは検出結果の表示用）
+def meta_required_columns(cols):
+    return [
+        c for c in [
+            cols['name_col'], cols['spend_col'], cols['date_col_meta'], cols['impressions_col'],
+            cols['cpm_col'], cols['clicks_col'], cols['ctr_col'],
+        ] if c
+    ]
+
+# HubSpot側の集計に使う列（見つからなかった列は含めない）
+def hs_required_columns(cols):
+    return [
+        c for c in [
+            cols['utm_col'], cols['date_col_hs'], cols['call_result_col'], cols['attr_col'],
+            cols['stage_col'], cols['first_meeting_col'], cols['second_meeting_col'],
+        ] if c
+    ]
+
+# 期間フィルターの範囲（開始日の0時〜終了日の23:59:59）
+def period_bounds(start_date, end_date):
+    start_datetime = pd.to_datetime(start_date)
+    end_datetime = pd.to_datetime(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    return start_datetime, end_datetime
+
+# 分母が0の行は0とする比率計算（numerator / denominator * scale）
+def safe_rate(numerator, denominator, scale=100):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    rate = np.zeros(len(denominator))
+    np.divide(numerator, denominator, out=rate, where=denominator > 0)
+    return rate * scale
+
+# 列の特定後の型変換（日付列は datetime、インプレッション・クリックは数値）
+# 日付にできなかった値の数は date_parser.coerced に列名ごとに残る
+def normalize_frames(df_meta, df_hs, cols, date_parser=None):
+    date_parser = date_parser or DateParser()
+    for col in [cols['date_col_meta']]:
+        if col:
+            df_meta[col] = date_parser.parse(df_meta[col])
+    for col in [cols['impressions_col'], cols['clicks_col']]:
+        if col:
+            df_meta[col] = pd.to_numeric(df_meta[col], errors='coerce').fillna(0)
+    for col in [cols['date_col_hs'], cols['first_meeting_col'], cols['second_meeting_col']]:
+        if col:
+            df_hs[col] = date_parser.parse(df_hs[col])
+    return df_meta, df_hs
+
+# HubSpotのカウント列ごとの判定ルール（カウント列, 判定する列, 含むキーワード, 除外キーワード）
+HS_COUNT_RULES = [
+    ('接続数', 'call_result_col', 'あり', None),
+    ('商談予約数', 'stage_col', '商談予定', None),
+    ('新規リード', 'stage_col', '新規リード', None),
+    ('進捗中', 'stage_col', 'FS対応中：社内検討|FS対応中：検討|FS対応中：見込み|FS対応中：申込', None),
+    ('商談予定', 'stage_col', '商談予定', None),
+    ('ナーチャリング', 'stage_col', 'ナーチャリング', None),
+    ('保留・NG', 'stage_col', '低温リスト|完全NG|NG対象', None),
+    ('契約', 'stage_col', '規約完了', None),
+    ('法人数', 'attr_col', '法人', '社員'),
+]
+
+# 列の値の種類ごとに1回だけキーワード判定し、カテゴリコード経由で各行に展開する
+def match_categories(categorical, pattern, exclude=None):
+    labels = categorical.cat.categories.to_series().astype(str)
+    hit = labels.str.contains(pattern, case=False, na=False)
+    if exclude:
+        hit &= ~labels.str.contains(exclude, case=False, na=False)
+    # 欠損値（コード -1）は末尾の False を参照する
+    lookup = np.append(hit.to_numpy(dtype=bool), False)
+    return lookup[categorical.cat.codes.to_numpy()]
+
+# HubSpotの各行について、各カウント列に該当するか（0/1）を返す
+# 商談実施数は初回商談日・再商談日それぞれの記入数の合計（内訳は 初回商談 / 再商談 列）
+def classify_hs_rows(df_hs, cols, profiler=NULL_PROFILER):
+    flags = pd.DataFrame(index=df_hs.index)
+
+    categoricals = {}
+    for count_col, source, pattern, exclude in HS_COUNT_RULES:
+        source_col = cols[source]
+        if source_col is None:
+            flags[count_col] = 0
+            continue
+        if source_col not in categoricals:
+            categoricals[source_col] = df_hs[source_col].astype('category')
+        flags[count_col] = match_categories(categoricals[source_col], pattern, exclude).astype(int)
+        profiler.lap(f"HubSpot {count_col}")
+
+    for flag_col, source in [('初回商談', 'first_meeting_col'), ('再商談', 'second_meeting_col')]:
+        source_col = cols[source]
+        if source_col is None:
+            flags[flag_col] = 0
+        else:
+            flags[flag_col] = pd.to_datetime(df_hs[source_col], errors='coerce').notna().astype(int)
+    flags['商談実施数'] = flags['初回商談'] + flags['再商談']
+    profiler.lap("HubSpot 商談実施数")
+
+    return flags[['接続数', '商談実施数', '商談予約数'] + STATUS_NAMES + ['法人数', '初回商談', '再商談']]
+
+# 広告名からバナーID（bnNNN）を取り出す。含まない広告は欠損（全角・大文字の表記ゆれは正規化してから照合）
+def meta_banner_keys(names):
+    return categorical_keys(names, parse_banner_id)
+
+# HubSpotのUTMを結合キーにそろえる（Meta側と同じ正規化。空のUTMは欠損）
+def hs_banner_keys(utms):
+    return categorical_keys(utms, parse_utm)
+
+# === 期間フィルター・キー作成・Meta側の集計 ===
+def aggregate_meta(df_meta, cols, start_datetime, end_datetime, debug, profiler=NULL_PROFILER):
+    name_col = cols['name_col']
+    spend_col = cols['spend_col']
+    date_col_meta = cols['date_col_meta']
+    impressions_col = cols['impressions_col']
+    clicks_col = cols['clicks_col']
+
+    # === 期間フィルター ===
+    if start_datetime is not None and date_col_meta:
+        debug['meta_rows_before_filter'] = len(df_meta)
+        df_meta = df_meta[(df_meta[date_col_meta] >= start_datetime) & (df_meta[date_col_meta] <= end_datetime)]
+
+    # 呼び出し元のDataFrameを書き換えないようにコピー
+    df_meta = df_meta.copy()
+    debug['meta_rows'] = len(df_meta)
+    profiler.lap("Meta 期間フィルター")
+
+    # === 1. データ結合キーの作成 ===
+    df_meta['key'] = meta_banner_keys(df_meta[name_col])
+    df_meta = df_meta[df_meta['key'].notna()]
+
+    debug['meta_rows_keyed'] = len(df_meta)
+    debug['banner_ids'] = sorted(df_meta['key'].unique())
+    profiler.lap("Meta キー抽出")
+
+    # === 2. Meta側の集計（消化金額 + 新規追加指標） ===
+    agg_dict = {spend_col: 'sum'}
+
+    # 新規追加指標の集計設定
+    if impressions_col:
+        df_meta[impressions_col] = pd.to_numeric(df_meta[impressions_col], errors='coerce').fillna(0)
+        agg_dict[impressions_col] = 'sum'
+    if clicks_col:
+        df_meta[clicks_col] = pd.to_numeric(df_meta[clicks_col], errors='coerce').fillna(0)
+        agg_dict[clicks_col] = 'sum'
+
+    # キーはカテゴリ型のまま集計し、集計結果のキーは文字列に戻す（HubSpot側との結合用）
+    meta_agg = df_meta.groupby('key', observed=True).agg(agg_dict).reset_index()
+    meta_agg['key'] = meta_agg['key'].astype(str)
+    meta_agg = finalize_meta_summary(meta_agg, cols)
+
+    debug['meta_agg'] = meta_agg
+    profiler.lap("Meta 集計")
+    return meta_agg
+
+# バナー別に合計した消化金額・インプレッション・クリックからCTRとCPMを計算する
+def finalize_meta_summary(meta_agg, cols):
+    spend_col = cols['spend_col']
+    impressions_col = cols['impressions_col']
+    clicks_col = cols['clicks_col']
+
+    meta_agg[spend_col] = pd.to_numeric(meta_agg[spend_col], errors='coerce').fillna(0)
+
+    # CTRとCPMはバナー別に再計算（加重平均）
+    if impressions_col and clicks_col:
+        meta_agg['CTR_calc'] = safe_rate(meta_agg[clicks_col], meta_agg[impressions_col])
+    else:
+        meta_agg['CTR_calc'] = 0
+
+    if impressions_col:
+        meta_agg['CPM_calc'] = safe_rate(meta_agg[spend_col], meta_agg[impressions_col], scale=1000)
+    else:
+        meta_agg['CPM_calc'] = 0
+    return meta_agg
+
+# === HubSpot側の期間フィルターとキー作成（行数はdebugに加算するためチャンク単位でも使える） ===
+def prepare_hs_rows(df_hs, cols, start_datetime, end_datetime, debug, profiler=NULL_PROFILER):
+    date_col_hs = cols['date_col_hs']
+
+    if start_datetime is not None and date_col_hs:
+        debug['hs_rows_before_filter'] = debug.get('hs_rows_before_filter', 0) + len(df_hs)
+        df_hs = df_hs[(df_hs[date_col_hs] >= start_datetime) & (df_hs[date_col_hs] <= end_datetime)]
+    debug['hs_rows'] = debug.get('hs_rows', 0) + len(df_hs)
+    profiler.lap("HubSpot 期間フィルター")
+
+    df_hs = df_hs.assign(key=hs_banner_keys(df_hs[cols['utm_col']]))
+    df_hs = df_hs[df_hs['key'].notna()]
+    debug['hs_rows_keyed'] = debug.get('hs_rows_keyed', 0) + len(df_hs)
+    profiler.lap("HubSpot キー抽出")
+    return df_hs
+
+# バナー（key）ごとのリード数と各カウント列。行ごとの該当フラグを一度に作り、1回のgroupbyで集計
+def count_hs_rows(df_hs, cols, profiler=NULL_PROFILER):
+    flags = classify_hs_rows(df_hs, cols, profiler)
+    grouped = flags.groupby(df_hs['key'], observed=True)
+    counts = grouped.sum()
+    counts.insert(0, 'リード数', grouped.size())
+    counts.index = counts.index.astype(str)
+    profiler.lap("HubSpot バナー別集計")
+    return counts.rename_axis('key')
+
+# HubSpot CSVをチャンクごとに読み、バナー別カウントを逐次加算する（ファイル全体をDataFrameにしない）
+def stream_hs_counts(data, cols, start_datetime, end_datetime, debug, csv_format, chunksize=HS_STREAM_CHUNKSIZE,
+                     profiler=NULL_PROFILER):
+    date_cols = [c for c in [cols['date_col_hs'], cols['first_meeting_col'], cols['second_meeting_col']] if c]
+    usecols = hs_required_columns(cols)
+
+    # チャンクごとに書式を推定し直さない（最初のチャンクで推定した書式から試す）
+    date_parser = DateParser()
+    counts = None
+    reader = pd.read_csv(
+        io.BytesIO(data), usecols=usecols, dtype=categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS),
+        chunksize=chunksize, **csv_read_options(csv_format, engine='c')
+    )
+    for chunk in reader:
+        for col in date_cols:
+            chunk[col] = date_parser.parse(chunk[col])
+        profiler.lap("HubSpot チャンク読み込み")
+        chunk_counts = count_hs_rows(prepare_hs_rows(chunk, cols, start_datetime, end_datetime, debug, profiler), cols, profiler)
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+        profiler.lap("HubSpot バナー別集計")
+
+    # 日付にできなかった値の数（複数ファイルは合計）
+    coerced = debug.setdefault('date_coerced', {})
+    for col, n in date_parser.coerced.items():
+        coerced[col] = coerced.get(col, 0) + n
+
+    if counts is None:
+        return count_hs_rows(prepare_hs_rows(pd.DataFrame(columns=usecols), cols, None, None, debug), cols)
+    return counts.sort_index().astype(int)
+
+# === 3. HubSpot側のリード数・接続・商談・法人のカウント結果を整形 ===
+def finalize_hs_summary(counts, cols, debug):
+    hs_summary = counts.reset_index()
+
+    debug['hs_leads'] = hs_summary[['key', 'リード数']]
+    if cols['call_result_col']:
+        debug['connect_rows'] = int(hs_summary['接続数'].sum())
+    if cols['first_meeting_col']:
+        debug['first_meeting_rows'] = int(hs_summary['初回商談'].sum())
+    if cols['second_meeting_col']:
+        debug['second_meeting_rows'] = int(hs_summary['再商談'].sum())
+    if hs_summary['商談実施数'].sum() > 0:
+        debug['deal_done_rows'] = int((hs_summary['商談実施数'] > 0).sum())
+    if cols['stage_col']:
+        debug['deal_plan_rows'] = int(hs_summary['商談予約数'].sum())
+    if cols['attr_col']:
+        debug['corp_rows'] = int(hs_summary['法人数'].sum())
+
+    return hs_summary.drop(columns=['初回商談', '再商談'])
+
+# === 4〜5. Meta集計データと結合し、指標を計算 ===
+def merge_banner_summary(hs_summary, meta_agg, cols):
+    spend_col = cols['spend_col']
+    impressions_col = cols['impressions_col']
+    clicks_col = cols['clicks_col']
+
+    result = pd.merge(hs_summary, meta_agg, on='key', how='outer')
+    result[spend_col] = result[spend_col].fillna(0)
+    result['リード数'] = result['リード数'].fillna(0).astype(int)
+
+    # 新規追加指標のNaN処理
+    if impressions_col:
+        result[impressions_col] = result[impressions_col].fillna(0).astype(int)
+    if clicks_col:
+        result[clicks_col] = result[clicks_col].fillna(0).astype(int)
+    result['CTR_calc'] = result['CTR_calc'].fillna(0)
+    result['CPM_calc'] = result['CPM_calc'].fillna(0)
+
+    # 進捗ステータス列もNaNを0で埋める
+    for col in ['接続数', '商談実施数', '商談予約数', '法人数'] + STATUS_NAMES:
+        if col in result.columns:
+            result[col] = result[col].fillna(0).astype(int)
+
+    # === 5. 指標計算 ===
+    # CPAは従来通り小数点以下切り捨て（int()と同じくゼロ方向）
+    result['CPA'] = np.trunc(safe_rate(result[spend_col], result['リード数'], scale=1)).astype(int)
+    result['接続率'] = safe_rate(result['接続数'], result['リード数'])
+    result['商談化率'] = safe_rate(result['商談実施数'] + result['商談予約数'], result['リード数'])
+    result['法人率'] = safe_rate(result['法人数'], result['リード数'])
+
+    # 新規追加：LP遷移率（CVR） = リード数 / クリック数
+    if clicks_col:
+        result['LP遷移率'] = safe_rate(result['リード数'], result[clicks_col])
+    else:
+        result['LP遷移率'] = 0
+
+    return result
+
+# バナー別集計（キー抽出〜Meta/HubSpot結合〜指標計算）。判定基準には依存しない
+# hs_source は HubSpotのDataFrame、またはストリーミング集計する場合は (CSVのバイト列, CSVの形式) のリスト（ファイルごと）
+def aggregate_banners(df_meta, hs_source, cols, start_datetime=None, end_datetime=None, profiler=NULL_PROFILER):
+    debug = {}
+    meta_agg = aggregate_meta(df_meta, cols, start_datetime, end_datetime, debug, profiler)
+
+    if isinstance(hs_source, pd.DataFrame):
+        hs_rows = prepare_hs_rows(hs_source, cols, start_datetime, end_datetime, debug, profiler)
+        hs_counts = count_hs_rows(hs_rows, cols, profiler)
+    else:
+        # ストリーミング集計では (CSVの内容, 形式) のリスト。ファイルごとのカウントを加算する
+        hs_counts = None
+        for data, csv_format in hs_source:
+            counts = stream_hs_counts(data, cols, start_datetime, end_datetime, debug, csv_format, profiler=profiler)
+            hs_counts = counts if hs_counts is None else hs_counts.add(counts, fill_value=0).astype(int)
+
+    hs_summary = finalize_hs_summary(hs_counts, cols, debug)
+    result = merge_banner_summary(hs_summary, meta_agg, cols)
+    profiler.lap("結合・指標計算")
+    return result, debug
+
+# === 6. 判定ロジック ===
+# 判定・クリエイティブ診断のラベル（表示順。判定済みの表ではこの順のカテゴリ型）
+JUDGMENT_LABELS = ["最優秀", "優秀", "要改善", "停止推奨"]
+DIAGNOSIS_LABELS = [
+    "優秀", "ターゲット要見直し", "LP要改善", "クリエイティブ要改善",
+    "LP+ターゲット要見直し", "クリエイティブ+ターゲット要見直し", "クリエイティブ+LP要改善", "全面見直し",
+    "ターゲット外", "継続監視", "停止検討", "データ不足",
+]
+
+# 判定表。添字は CPA達成×4 + 接続率達成×2 + 商談化率達成、値は JUDGMENT_LABELS の位置
+# 3つとも達成は最優秀、2つ達成は商談化率を含めば優秀・含まなければ要改善、商談化率のみ達成は要改善、それ以外は停止推奨
+JUDGMENT_CODE_TABLE = np.array([
+    3,  # ✗ ✗ ✗ 停止推奨
+    2,  # ✗ ✗ ✓ 要改善
+    3,  # ✗ ✓ ✗ 停止推奨
+    1,  # ✗ ✓ ✓ 優秀
+    3,  # ✓ ✗ ✗ 停止推奨
+    1,  # ✓ ✗ ✓ 優秀
+    2,  # ✓ ✓ ✗ 要改善
+    0,  # ✓ ✓ ✓ 最優秀
+], dtype=np.int8)
+
+# 3つの達成フラグ（bool）を 添字 = 1つ目×4 + 2つ目×2 + 3つ目 にまとめる
+# uint8 のシフトで作るため、格子×バナーの大きさになっても int64 の一時配列を作らない
+def flag_index(first, second, third):
+    return (first.view(np.uint8) << 2) | (second.view(np.uint8) << 1) | third.view(np.uint8)
+
+# 判定（JUDGMENT_LABELS の位置）。判定基準は数値のほか、末尾にバナーの軸（長さ1）を持つ配列でもよく、
+# その場合は基準の組み合わせごとの判定をブロードキャストでまとめて返す（感度分析用）
+def judgment_codes(result, cpa_limit, connect_target, meeting_target):
+    cpa = result['CPA'].to_numpy()
+    cpa_ok = (cpa > 0) & (cpa <= cpa_limit)
+    connect_ok = result['接続率'].to_numpy() >= connect_target
+    meeting_ok = result['商談化率'].to_numpy() >= meeting_target
+    return JUDGMENT_CODE_TABLE[flag_index(cpa_ok, connect_ok, meeting_ok)]
+
+# === クリエイティブ診断ロジック ===
+# CV1以上の診断結果テーブル。添字は CTR達成×4 + LP遷移率達成×2 + 法人率達成
+CREATIVE_LABEL_TABLE = np.array([
+    "全面見直し",                          # ✗ ✗ ✗
+    "クリエイティブ+LP要改善",             # ✗ ✗ ✓
+    "クリエイティブ+ターゲット要見直し",   # ✗ ✓ ✗
+    "クリエイティブ要改善",                # ✗ ✓ ✓
+    "LP+ターゲット要見直し",               # ✓ ✗ ✗
+    "LP要改善",                            # ✓ ✗ ✓
+    "ターゲット要見直し",                  # ✓ ✓ ✗
+    "優秀",                                # ✓ ✓ ✓
+])
+CREATIVE_CODE_TABLE = np.array([DIAGNOSIS_LABELS.index(label) for label in CREATIVE_LABEL_TABLE], dtype=np.int8)
+
+# クリエイティブ診断（DIAGNOSIS_LABELS の位置）。判定基準の配列は judgment_codes と同じくブロードキャストする
+def diagnosis_codes(result, ctr_target, cvr_target, corp_target, imp_threshold, impressions_col):
+    ctr_ok = result['CTR_calc'].to_numpy() >= ctr_target
+    cvr_ok = result['LP遷移率'].to_numpy() >= cvr_target
+    corp_ok = result['法人率'].to_numpy() >= corp_target
+    leads = result['リード数'].to_numpy()
+
+    # CV0の場合：IMP + CTRで継続/停止判断
+    no_cv = leads == 0
+    if impressions_col:
+        imp_short = result[impressions_col].to_numpy() < imp_threshold
+    else:
+        imp_short = np.zeros(len(result), dtype=bool)
+
+    # CV3以上で法人0の場合：ターゲット外
+    target_miss = (leads >= 3) & (result['法人数'].to_numpy() == 0)
+
+    # CV1以上の場合：CTR + LP遷移率 + 法人率の3軸で診断
+    codes = CREATIVE_CODE_TABLE[flag_index(ctr_ok, cvr_ok, corp_ok)]
+
+    # CV0・ターゲット外のバナーはその場で上書きする（CV0の診断はCTRの基準の軸だけに依存するため、その大きさで作る）
+    no_cv_codes = np.where(
+        imp_short, DIAGNOSIS_LABELS.index("データ不足"),
+        np.where(ctr_ok, DIAGNOSIS_LABELS.index("継続監視"), DIAGNOSIS_LABELS.index("停止検討"))
+    ).astype(np.int8)
+    codes[..., no_cv] = no_cv_codes[..., no_cv]
+    codes[..., target_miss] = DIAGNOSIS_LABELS.index("ターゲット外")
+    return codes
+
+# 判定済みの表で件数は int32、比率は float32 にそろえる（int32に収まらない件数の列はそのまま）
+COUNT_COLUMNS = ['リード数', '接続数', '商談実施数', '商談予約数'] + STATUS_NAMES + ['法人数', 'CPA']
+RATE_COLUMNS = ['CTR_calc', 'CPM_calc', '接続率', '商談化率', '法人率', 'LP遷移率']
+INT32_MAX = np.iinfo(np.int32).max
+
+def compact_dtypes(result, impressions_col=None):
+    dtypes = {}
+    for col in COUNT_COLUMNS + [impressions_col]:
+        if col in result.columns and pd.api.types.is_integer_dtype(result[col]):
+            if len(result) == 0 or result[col].abs().max() <= INT32_MAX:
+                dtypes[col] = np.int32
+    for col in RATE_COLUMNS:
+        if col in result.columns:
+            dtypes[col] = np.float32
+    return dtypes
+
+# 判定ステージ：集計済みのバナー表に判定列だけを付け直す（判定基準の変更時はここだけ再計算）
+# 判定は集計結果の精度（float64）で行い、返す表は件数・比率を縮めた型とカテゴリ型のラベルにする
+def score_banners(result, impressions_col, cpa_limit, connect_target, meeting_target,
+                  ctr_target, cvr_target, corp_target, imp_threshold):
+    scored = result.astype(compact_dtypes(result, impressions_col))
+    scored['判定'] = pd.Categorical.from_codes(
+        judgment_codes(result, cpa_limit, connect_target, meeting_target), categories=JUDGMENT_LABELS
+    )
+    scored['クリエイティブ診断'] = pd.Categorical.from_codes(
+        diagnosis_codes(result, ctr_target, cvr_target, corp_target, imp_threshold, impressions_col),
+        categories=DIAGNOSIS_LABELS
+    )
+    return scored
@@ -0,0 +1,120 @@
+"""プロセス内で共有する集計結果のキャッシュ（LRU・有効期限・メモリ上限つき。Streamlitに依存しない）"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 既定のメモリ上限・有効期限・件数上限
+RESULT_CACHE_MAX_BYTES = 512 * 1024 ** 2
+RESULT_CACHE_TTL_SECONDS = 6 * 60 * 60
+RESULT_CACHE_MAX_ENTRIES = 64
+
+
+# キャッシュする値のおおよそのメモリ量（DataFrame・配列・それらを含むdict/list/tuple、nbytes を持つオブジェクト）
+def estimate_bytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(estimate_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_bytes(v) for v in value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+# 同じキーの計算は1回だけ行い、ほかのセッションは結果を共有する（返した値は呼び出し側で変更しないこと）
+# 計算中のキーを別のスレッドが要求した場合は、計算が終わるのを待ってその結果を使う
+class ResultCache:
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+                 max_entries=RESULT_CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, nbytes, created_at)
+        self.pending = {}  # 計算中のキー -> threading.Event
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and self.clock() - created_at > self.ttl_seconds
+
+    def _remove(self, key):
+        _, nbytes, _ = self.entries.pop(key)
+        self.total_bytes -= nbytes
+
+    # 古い順に、期限切れ・件数上限・メモリ上限を超えた分を捨てる
+    def _evict(self):
+        for key in [k for k, (_, _, created_at) in self.entries.items() if self._expired(created_at)]:
+            self._remove(key)
+            self.evictions += 1
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and not self._expired(entry[2]):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                waiting = self.pending.get(key)
+                if waiting is None:
+                    if entry is not None:
+                        self._remove(key)
+                        self.evictions += 1
+                    self.misses += 1
+                    done = self.pending[key] = threading.Event()
+                    break
+            # 別のセッションが計算中：終わったら（失敗した場合も）もう一度探す
+            waiting.wait()
+
+        try:
+            value = factory()
+        except BaseException:
+            with self.lock:
+                del self.pending[key]
+            done.set()
+            raise
+
+        nbytes = estimate_bytes(value)
+        with self.lock:
+            del self.pending[key]
+            # 1件でメモリ上限を超える値は保存しない
+            if nbytes <= self.max_bytes:
+                self.entries[key] = (value, nbytes, self.clock())
+                self.total_bytes += nbytes
+                self._evict()
+        done.set()
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            self._evict()
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
@@ -0,0 +1,142 @@
+"""コマンドラインからの分析実行
+
+    python -m mago analyze meta.xlsx hubspot.csv --out result.parquet
+    python -m mago batch accounts.csv --out-dir results --workers 4
+
+batch のマニフェストは meta,hubspot[,name] 列を持つCSV（パスはマニフェストからの相対パスでも可）。
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .analysis import DEFAULT_THRESHOLDS, RATE_COLUMNS
+from .pipeline import analyze_files
+
+OUTPUT_FORMATS = ('.parquet', '.csv')
+
+
+def check_output_path(path):
+    if not path.endswith(OUTPUT_FORMATS):
+        raise ValueError(f"出力形式は {' / '.join(OUTPUT_FORMATS)} のいずれかを指定してください: {path}")
+    return path
+
+# --out の型（出力形式の誤りを、ファイルを読み込んで分析する前に引数の解析で弾く）
+def output_path_argument(path):
+    try:
+        return check_output_path(path)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+# 判定済みの表の比率は float32 のため、float64 にしてから丸めて書く（33.33000183 のような値を書かない。banner_rows と同じ）
+def write_result(result, path):
+    check_output_path(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rate_columns = [col for col in RATE_COLUMNS if col in result.columns]
+    result = result.assign(**{col: result[col].astype(float).round(2) for col in rate_columns})
+    if path.endswith('.parquet'):
+        result.to_parquet(path, index=False)
+    else:
+        # Excelで開けるようにBOM付きUTF-8で書く
+        result.to_csv(path, index=False, encoding='utf-8-sig')
+
+def thresholds_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULT_THRESHOLDS}
+
+# プロセスプールで実行する1組分の処理（トップレベル関数にしてpickle可能にする）
+def run_job(job):
+    result, _, _ = analyze_files(
+        job['meta'], job['hubspot'], job['start'], job['end'], job['thresholds'], job['stream_hs']
+    )
+    write_result(result, job['out'])
+    return len(result)
+
+def read_manifest(path):
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    pairs = []
+    for i, row in enumerate(rows, start=1):
+        if not row.get('meta') or not row.get('hubspot'):
+            raise ValueError(f"{path} の{i}行目: meta / hubspot 列が空です")
+        name = row.get('name') or os.path.splitext(os.path.basename(row['meta']))[0]
+        pairs.append({
+            'name': name,
+            'meta': os.path.join(base_dir, row['meta']),
+            'hubspot': os.path.join(base_dir, row['hubspot']),
+        })
+    return pairs
+
+def cmd_analyze(args):
+    job = {
+        'meta': args.meta, 'hubspot': args.hubspot, 'out': args.out,
+        'start': args.start, 'end': args.end,
+        'thresholds': thresholds_from_args(args), 'stream_hs': args.stream_hs,
+    }
+    rows = run_job(job)
+    print(f"{args.out}: {rows}バナー")
+    return 0
+
+def cmd_batch(args):
+    jobs = []
+    for pair in read_manifest(args.manifest):
+        jobs.append({
+            **pair,
+            'out': os.path.join(args.out_dir, f"{pair['name']}{args.format}"),
+            'start': args.start, 'end': args.end,
+            'thresholds': thresholds_from_args(args), 'stream_hs': args.stream_hs,
+        })
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                print(f"{job['out']}: {future.result()}バナー")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {job['name']}: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+def add_common_arguments(parser):
+    parser.add_argument('--start', help="期間の開始日（YYYY-MM-DD）")
+    parser.add_argument('--end', help="期間の終了日（YYYY-MM-DD）")
+    parser.add_argument('--stream-hs', action='store_true', help="HubSpot CSVをチャンク単位で集計する（大容量向け）")
+    group = parser.add_argument_group("判定基準")
+    group.add_argument('--cpa-limit', type=int, default=DEFAULT_THRESHOLDS['cpa_limit'], help="許容CPA（円）")
+    group.add_argument('--connect-target', type=float, default=DEFAULT_THRESHOLDS['connect_target'], help="目標接続率（%%）")
+    group.add_argument('--meeting-target', type=float, default=DEFAULT_THRESHOLDS['meeting_target'], help="目標商談化率（%%）")
+    group.add_argument('--ctr-target', type=float, default=DEFAULT_THRESHOLDS['ctr_target'], help="目標CTR（%%）")
+    group.add_argument('--cvr-target', type=float, default=DEFAULT_THRESHOLDS['cvr_target'], help="目標LP遷移率（%%）")
+    group.add_argument('--corp-target', type=float, default=DEFAULT_THRESHOLDS['corp_target'], help="目標法人率（%%）")
+    group.add_argument('--imp-threshold', type=int, default=DEFAULT_THRESHOLDS['imp_threshold'], help="IMP閾値（CV0判定用）")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m mago', description="Meta広告×HubSpotのバナー別分析")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', help="1組のファイルを分析する")
+    analyze.add_argument('meta', help="Meta広告実績（.xlsx / .csv）")
+    analyze.add_argument('hubspot', help="HubSpotデータ（.xlsx / .csv）")
+    analyze.add_argument('--out', required=True, type=output_path_argument, help="出力ファイル（.parquet / .csv）")
+    add_common_arguments(analyze)
+    analyze.set_defaults(func=cmd_analyze)
+
+    batch = subparsers.add_parser('batch', help="マニフェストに並べた複数アカウントを並列に分析する")
+    batch.add_argument('manifest', help="meta,hubspot[,name] 列を持つCSV")
+    batch.add_argument('--out-dir', required=True, help="出力先ディレクトリ")
+    batch.add_argument('--format', choices=OUTPUT_FORMATS, default='.parquet', help="出力形式")
+    batch.add_argument('--workers', type=int, default=None, help="並列数（既定はCPU数）")
+    add_common_arguments(batch)
+    batch.set_defaults(func=cmd_batch)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,123 @@
+"""日付列の解析（値の種類ごとに1回だけ、サンプルから推定した書式でまとめて解析する）
+
+pd.to_datetime を書式なしで呼ぶと先頭の値から書式を推定し、それと違う書式の値は errors='coerce' で
+黙って欠損になる（HubSpotの「2026/03/01 10:00」と「2026-03-01」が混在する列など）。
+ここでは書式を推定してまとめて解析し、残った値から次の書式を推定する。どの書式にも合わない値だけを1件ずつ解析する。
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# 書式の推定に使う値の数（値の種類ごと）
+DATE_SAMPLE_SIZE = 20
+
+# 値の種類をまとめて解析するかの判定に使う行数と、種類の割合の上限
+# （分単位の作成日のようにほとんどの値が異なる列は、種類をまとめる手間の分だけ遅くなるため行ごとに解析する）
+DEDUPE_SAMPLE_ROWS = 10000
+DEDUPE_MAX_UNIQUE_RATIO = 0.5
+
+# 1列で試す書式の数の上限（これを超える書式の値は1件ずつ解析する）
+DATE_MAX_FORMATS = 4
+
+
+# 全体から等間隔に取ったサンプルで最も多く推定された書式（推定できなければ None）
+def infer_date_format(texts, sample_size=DATE_SAMPLE_SIZE):
+    sample = texts.iloc[::max(1, len(texts) // sample_size)]
+    guesses = Counter(guess_datetime_format(t) for t in sample)
+    guesses.pop(None, None)
+    return guesses.most_common(1)[0][0] if guesses else None
+
+
+# タイムゾーン付きの値はその時刻のままタイムゾーンを外す（期間の境界はタイムゾーンなしの日時のため）
+def wall_time(value):
+    if isinstance(value, pd.Series):
+        return value.dt.tz_localize(None) if value.dt.tz is not None else value
+    return value.tz_localize(None) if not pd.isna(value) and value.tzinfo is not None else value
+
+
+# 列名ごとに使った書式と、日付にできなかった値の数を記録する
+# 同じパーサーで同じ列を続けて解析する場合（ストリーミング集計のチャンクなど）は、前回の書式から試す
+class DateParser:
+    def __init__(self):
+        self.formats = {}
+        self.coerced = {}
+
+    # 日付にできなかった値を欠損にした datetime の列を返す（空欄は欠損のまま数えない）
+    def parse(self, values):
+        name = values.name
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            self.coerced.setdefault(name, 0)
+            return values
+
+        # 値の種類が少ない列は種類ごとに解析し、codes（各行が参照する uniques の位置。欠損は -1）で行に展開する
+        positions = np.random.default_rng(0).integers(0, max(1, len(values)), min(len(values), DEDUPE_SAMPLE_ROWS))
+        sample = values.iloc[positions].dropna()
+        if sample.nunique() <= DEDUPE_MAX_UNIQUE_RATIO * max(1, len(sample)):
+            codes, uniques = pd.factorize(values)
+            uniques = pd.Series(uniques, dtype=object)
+        else:
+            codes, uniques = None, values.reset_index(drop=True)
+        present = uniques.notna().to_numpy()
+        parsed = np.full(len(uniques), np.datetime64('NaT'), dtype='datetime64[us]')
+
+        # Excelの日付セルなど、文字列でない値はそのまま変換する
+        if isinstance(values.dtype, pd.StringDtype) or pd.api.types.infer_dtype(uniques, skipna=True) == 'string':
+            is_text = present
+        else:
+            is_text = uniques.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+            others = present & ~is_text
+            if others.any():
+                parsed[others] = wall_time(pd.to_datetime(uniques[others], errors='coerce')).to_numpy()
+        remaining = uniques if is_text.all() else uniques[is_text]
+
+        formats = self.formats.setdefault(name, [])
+        for i in range(DATE_MAX_FORMATS):
+            if remaining.empty:
+                break
+            date_format = formats[i] if i < len(formats) else infer_date_format(remaining)
+            if date_format is None:
+                break
+            try:
+                converted = pd.to_datetime(remaining, format=date_format, errors='coerce')
+            except ValueError:
+                # タイムゾーンの異なる値が混在する場合など。残りは1件ずつ解析する
+                break
+            matched = converted.notna().to_numpy()
+            if i >= len(formats):
+                if not matched.any():
+                    break
+                formats.append(date_format)
+            if matched.all():
+                parsed[remaining.index] = wall_time(converted).to_numpy()
+                remaining = remaining.iloc[:0]
+                break
+            parsed[remaining.index[matched]] = wall_time(converted[matched]).to_numpy()
+            remaining = remaining[~matched]
+
+        # どの書式にも合わない値だけを1件ずつ解析する（空白だけの値は空欄とみなす）
+        blank = np.zeros(len(uniques), dtype=bool)
+        for position, text in remaining.items():
+            if not text.strip():
+                blank[position] = True
+                continue
+            value = wall_time(pd.to_datetime(text, errors='coerce'))
+            if not pd.isna(value):
+                parsed[position] = value.to_datetime64()
+
+        # 日付にできなかった値の行数
+        failed = np.isnat(parsed) & present & ~blank
+        if codes is None:
+            coerced = int(failed.sum())
+        elif failed.any():
+            coerced = int(np.bincount(codes[codes >= 0], minlength=len(uniques))[failed].sum())
+        else:
+            coerced = 0
+        self.coerced[name] = self.coerced.get(name, 0) + coerced
+
+        if codes is None:
+            return pd.Series(parsed, index=values.index, name=name)
+        # 欠損値（コード -1）は末尾の NaT を参照する
+        lookup = np.append(parsed, np.datetime64('NaT', 'us'))
+        return pd.Series(lookup[codes], index=values.index, name=name)
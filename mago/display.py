@@ -0,0 +1,150 @@
+"""画面表示用の表の整形（並べ替え・描画直前の書式化。Streamlitに依存しない）
+
+表は数値のまま作り、文字列への書式化は format_table で表示する行だけに行う。
+"""
+import numpy as np
+import pandas as pd
+
+from .analysis import STATUS_NAMES, JUDGMENT_LABELS, DIAGNOSIS_LABELS
+from .keys import banner_sort_keys
+
+# 評価表・診断表の並び順（上から表示）
+JUDGMENT_ORDER = {label: rank for rank, label in enumerate(JUDGMENT_LABELS)}
+DIAGNOSIS_ORDER = {label: rank for rank, label in enumerate(DIAGNOSIS_LABELS)}
+
+# 判定・診断ごとの色（行の背景色、または大きな表ではラベルのバッジの色）
+JUDGMENT_COLORS = {
+    "最優秀": '#d4edda',
+    "優秀": '#d1ecf1',
+    "要改善": '#fff3cd',
+    "停止推奨": '#f8d7da',
+}
+DIAGNOSIS_COLORS = {
+    "優秀": '#d4edda',
+    "ターゲット要見直し": '#d1ecf1',
+    "LP要改善": '#fff3cd',
+    "クリエイティブ要改善": '#ffe0b2',
+    "LP+ターゲット要見直し": '#fce4ec',
+    "クリエイティブ+ターゲット要見直し": '#fce4ec',
+    "クリエイティブ+LP要改善": '#fce4ec',
+    "全面見直し": '#f8d7da',
+    "ターゲット外": '#f8d7da',
+    "継続監視": '#e2e3e5',
+    "停止検討": '#f8d7da',
+    "データ不足": '#f5f5f5',
+}
+
+# ラベル列から行ごとの背景色（Stylerの apply(axis=None) にそのまま渡せる表）を一括で作る
+def row_styles(df, label_col, colors, default=''):
+    css = df[label_col].map({label: f'background-color: {color}' for label, color in colors.items()})
+    # カテゴリ型のラベルでは map の結果もカテゴリ型になるため、object型にしてから欠損を埋める
+    css = css.astype(object).fillna(f'background-color: {default}' if default else '').to_numpy(dtype=object)
+    return pd.DataFrame(np.repeat(css[:, None], len(df.columns), axis=1), index=df.index, columns=df.columns)
+
+# ラベル列をバッジ表示用の1要素リストに変換する（ラベルの種類ごとに1回だけリストを作り、行にはコードで展開）
+def label_badges(labels):
+    categorical = labels.astype('category')
+    badges = np.empty(len(categorical.cat.categories) + 1, dtype=object)
+    for i, label in enumerate(categorical.cat.categories):
+        badges[i] = [label]
+    # 欠損値（コード -1）は末尾の空リストを参照する
+    badges[-1] = []
+    return pd.Series(badges[categorical.cat.codes.to_numpy()], index=labels.index)
+
+# === 描画直前の書式化（値1つを表示用の文字列に） ===
+def thousands(x):
+    return f"{int(x):,}"
+
+def percent1(x):
+    return f"{x:.1f}%"
+
+def percent2(x):
+    return f"{x:.2f}%"
+
+def integer(x):
+    return f"{int(x)}"
+
+def blank_zero(x):
+    return '' if x == 0 else f"{int(x)}"
+
+# 列ごとの書式（評価表・進捗表・診断表）
+EVALUATION_FORMATS = {
+    '消化金額': thousands, 'CPA': thousands, '接続率': percent1, '商談化率': percent1, '法人率': percent1,
+}
+PROGRESS_FORMATS = {col: blank_zero for col in STATUS_NAMES}
+CREATIVE_FORMATS = {
+    'IMP': thousands, 'クリック': thousands, 'CTR': percent2,
+    'LP遷移率': percent1, '法人数': integer, '法人率': percent1,
+}
+
+# 表示する表の列を書式化した文字列にする（欠損は na_rep）。元の表は変更しない
+def format_table(df, formats, na_rep='-'):
+    return df.assign(**{
+        col: df[col].map(fmt, na_action='ignore').astype(object).fillna(na_rep)
+        for col, fmt in formats.items() if col in df.columns
+    })
+
+# 判定済みのバナー表に表示用の列名を付ける（各表の共通の元データ。列のコピーはしない）
+def display_frame(result, spend_col):
+    display_df = result.rename(columns={
+        'key': 'バナーID',
+        spend_col: '消化金額'
+    })
+    # 各表の並べ替えに共通で使うバナーIDの番号
+    display_df['バナーID_num'] = banner_sort_keys(display_df['バナーID'])
+    return display_df
+
+# ラベルの表示順（カテゴリ型でもそうでなくても同じ順位になる）
+def label_ranks(labels, order):
+    return pd.Categorical(labels, categories=list(order)).codes
+
+# === バナー別評価表（消化金額0のバナーを除き、判定順・バナーIDの降順） ===
+def evaluation_table(display_df):
+    # 消化金額0のバナーを除外
+    show_df = display_df.loc[
+        display_df['消化金額'] > 0,
+        ['判定', 'バナーID', '消化金額', 'リード数', 'CPA', '接続率', '商談化率', '法人率', '接続数', '商談実施数', '商談予約数', '法人数', 'バナーID_num']
+    ]
+
+    show_df = show_df.assign(判定_rank=label_ranks(show_df['判定'], JUDGMENT_ORDER))
+    show_df = show_df.sort_values(by=['判定_rank', 'バナーID_num'], ascending=[True, False])
+    return show_df.drop(columns=['判定_rank', 'バナーID_num'])
+
+# === バナー別進捗状況（リード数0のバナーを除く。0の空白表示は PROGRESS_FORMATS で行う） ===
+def progress_table(display_df):
+    # リード数が0のバナーを除外
+    progress_df = display_df.loc[
+        display_df['リード数'] > 0,
+        ['バナーID', '新規リード', '進捗中', '商談予定', 'ナーチャリング', '保留・NG', '契約', 'バナーID_num']
+    ]
+
+    progress_df = progress_df.sort_values(by=['バナーID_num'], ascending=[False])
+    return progress_df.drop(columns=['バナーID_num']).fillna(0)
+
+# === クリエイティブ診断表（IMP0のバナーを除き、診断順・バナーIDの降順） ===
+# CV0のバナーのLP遷移率・法人数・法人率、IMP・クリック列がない場合はその列を欠損（表示は "-"）にする
+def creative_table(display_df, impressions_col, clicks_col):
+    has_leads = display_df['リード数'] > 0
+    missing = pd.Series(np.nan, index=display_df.index)
+
+    creative_show_df = pd.DataFrame({
+        '診断結果': display_df['クリエイティブ診断'],
+        'バナーID': display_df['バナーID'],
+        'IMP': display_df[impressions_col] if impressions_col and impressions_col in display_df.columns else missing,
+        'クリック': display_df[clicks_col] if clicks_col and clicks_col in display_df.columns else missing,
+        'CTR': display_df['CTR_calc'],
+        'リード数': display_df['リード数'],
+        'LP遷移率': display_df['LP遷移率'].where(has_leads),
+        '法人数': display_df['法人数'].where(has_leads),
+        '法人率': display_df['法人率'].where(has_leads),
+        'バナーID_num': display_df['バナーID_num'],
+    })
+
+    # IMP0のみ除外（配信されていないので診断不能）、CV0は含める
+    if impressions_col and impressions_col in display_df.columns:
+        creative_show_df = creative_show_df[display_df[impressions_col] > 0]
+
+    # 診断結果でソート
+    creative_show_df = creative_show_df.assign(診断_rank=label_ranks(creative_show_df['診断結果'], DIAGNOSIS_ORDER))
+    creative_show_df = creative_show_df.sort_values(by=['診断_rank', 'バナーID_num'], ascending=[True, False])
+    return creative_show_df.drop(columns=['診断_rank', 'バナーID_num'])
@@ -0,0 +1,48 @@
+"""結合キー（バナーID）の正規化（広告名・UTMの値の種類ごとに1回だけ解析する）"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# 広告名に含まれるバナーID（正規化後の小文字で照合）
+BANNER_ID_PATTERN = re.compile(r'bn\d+')
+
+# 並べ替えに使うバナーIDの番号部分
+BANNER_NUMBER_PATTERN = re.compile(r'\d+')
+
+
+# 全角英数字・記号を半角に（NFKC）、前後の空白を除き小文字にそろえる
+def normalize_text(value):
+    return unicodedata.normalize('NFKC', str(value)).strip().lower()
+
+# 広告名からバナーIDを取り出す（含まない場合は None）
+def parse_banner_id(value):
+    match = BANNER_ID_PATTERN.search(normalize_text(value))
+    return match.group(0) if match else None
+
+# UTMはそのままキーにする（空文字は None）
+def parse_utm(value):
+    return normalize_text(value) or None
+
+# 列の値の種類ごとに parse を1回だけ呼び、行にはカテゴリコードで展開したカテゴリ型のキーを返す
+# 解析できない値・欠損は欠損。カテゴリはキーの昇順
+def categorical_keys(values, parse):
+    categorical = values.astype('category')
+    parsed = pd.Series([parse(label) for label in categorical.cat.categories], dtype=object)
+    label_codes, keys = pd.factorize(parsed, sort=True)
+
+    # 欠損値（コード -1）は末尾の -1 を参照する
+    label_codes = np.append(label_codes, -1)
+    codes = label_codes[categorical.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=keys.astype(str)), index=values.index)
+
+# バナーIDの番号部分（bn012 → 12、番号がなければ0）。表の並べ替えで共通に使う
+def banner_sort_keys(keys):
+    categorical = keys.astype('category')
+    numbers = np.zeros(len(categorical.cat.categories) + 1, dtype=np.int64)
+    for i, key in enumerate(categorical.cat.categories):
+        match = BANNER_NUMBER_PATTERN.search(str(key))
+        if match:
+            numbers[i] = int(match.group(0))
+    return pd.Series(numbers[categorical.cat.codes.to_numpy()], index=keys.index)
@@ -0,0 +1,202 @@
+"""アップロードされたエクスポートの読み込み（CSVの形式判定・必要な列だけの解析・複数ファイルの結合・スナップショット）"""
+import codecs
+import csv
+import io
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# スナップショット（Arrow IPC）を使えるか
+ARROW_AVAILABLE = feather is not None
+
+# CSVの解析エンジン（pyarrowがあればマルチスレッドのpyarrowエンジン）
+CSV_ENGINE = "pyarrow" if feather is not None else "c"
+
+# Excel（.xlsx）の解析エンジン（python-calamine があればRust実装の calamine、なければ openpyxl）
+# calamine はセルを Python オブジェクトにせずに読むため、openpyxl より1桁ほど速い
+EXCEL_ENGINES = ['calamine', 'openpyxl']
+EXCEL_ENGINE = "calamine" if python_calamine is not None else "openpyxl"
+
+# 使えるExcelの解析エンジン（ベンチマーク・比較用）
+def available_excel_engines():
+    return [engine for engine in EXCEL_ENGINES if engine != 'calamine' or python_calamine is not None]
+
+# CSVの形式判定に使う先頭のバイト数と、区切り文字の候補
+CSV_SNIFF_BYTES = 64 * 1024
+CSV_DELIMITERS = [',', '\t', ';']
+
+# 複数ファイルを並行して解析するときの最大ワーカー数
+PARSE_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# 複数ファイルを結合したときに読み込み元のファイル名を入れる列
+SOURCE_COLUMN = 'ソースファイル'
+
+# 正規化済みデータのスナップショット保存先（Arrow IPC形式、ファイル内容のハッシュ単位）
+SNAPSHOT_DIR = os.path.join("data", "snapshots")
+
+
+# === CSVの形式判定（エンコーディング・区切り文字・ヘッダー行） ===
+# 最初の非ASCIIバイトから先頭数KBをUTF-8として解釈できるか（途中で切れた末尾の文字は許容）
+def looks_like_utf8(data, sample_size=CSV_SNIFF_BYTES):
+    first_non_ascii = re.search(rb'[\x80-\xff]', data)
+    if first_non_ascii is None:
+        return True
+    window = data[first_non_ascii.start():first_non_ascii.start() + sample_size]
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(window, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+# 先頭数KBから encoding / sep / skiprows を判定する（Meta・HubSpotの日本語エクスポートは UTF-8 / UTF-8 BOM / CP932）
+def sniff_csv(data, sample_size=CSV_SNIFF_BYTES):
+    if data.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    elif looks_like_utf8(data, sample_size):
+        encoding = 'utf-8'
+    else:
+        encoding = 'cp932'
+
+    lines = data[:sample_size].decode(encoding, errors='ignore').splitlines()
+    if len(data) > sample_size:
+        # 末尾の行は途中で切れている可能性があるため除く
+        lines = lines[:-1]
+
+    # 列数が最も多くの行でそろう区切り文字を採用し（同数なら列数の多い方）、その列数になる最初の行をヘッダーとみなす
+    best = (',', 0, (0, 0))
+    for delimiter in CSV_DELIMITERS:
+        widths = [len(row) for row in csv.reader(lines, delimiter=delimiter)]
+        counted = [w for w in widths if w > 1]
+        if not counted:
+            continue
+        width = max(set(counted), key=lambda w: (counted.count(w), w))
+        score = (counted.count(width), width)
+        if score > best[2]:
+            best = (delimiter, widths.index(width), score)
+    sep, skiprows, _ = best
+
+    return {'encoding': encoding, 'sep': sep, 'skiprows': skiprows}
+
+# 判定した形式で read_csv に渡す引数（pyarrowエンジンは先頭行のスキップに対応しないため、その場合はCエンジン）
+def csv_read_options(csv_format, engine=CSV_ENGINE):
+    if csv_format['skiprows']:
+        engine = 'c'
+    return {
+        'encoding': csv_format['encoding'],
+        'sep': csv_format['sep'],
+        'skiprows': csv_format['skiprows'] or None,
+        'engine': engine,
+    }
+
+# ヘッダー（列名）のみを読む。CSVは判定した形式（エンコーディング・区切り文字・ヘッダー行）も返す
+# Excelは openpyxl の読み取り専用モードで先頭行だけを読む（calamine はシート全体を読み込んでから返すため使わない）
+def read_header(data, file_name):
+    if file_name.endswith('.csv'):
+        csv_format = sniff_csv(data)
+        header = pd.read_csv(io.BytesIO(data), nrows=0, **csv_read_options(csv_format, engine='c'))
+        return list(header.columns), csv_format
+    else:
+        return list(pd.read_excel(io.BytesIO(data), nrows=0, engine='openpyxl').columns), None
+
+# 必要な列だけを型を指定して読む
+def read_frame(data, file_name, csv_format, usecols, dtypes, excel_engine=EXCEL_ENGINE):
+    if file_name.endswith('.csv'):
+        # 判定済みの形式で1回だけ解析する
+        return pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=dtypes, **csv_read_options(csv_format))
+    else:
+        wanted = set(str(c) for c in usecols)
+        return pd.read_excel(io.BytesIO(data), usecols=lambda c: str(c) in wanted, dtype=dtypes, engine=excel_engine)
+
+# 同じ名前のファイルが複数あるときは「名前 (2)」のように区別する
+def source_labels(file_names):
+    labels = []
+    for name in file_names:
+        label, n = name, 1
+        while label in labels:
+            n += 1
+            label = f"{name} ({n})"
+        labels.append(label)
+    return labels
+
+# ファイルごとのDataFrameを縦に結合し、読み込み元のファイル名を SOURCE_COLUMN に入れる
+# カテゴリ型の列はカテゴリを合併してカテゴリ型のまま結合する（object型に戻さない）
+def concat_frames(frames, file_names):
+    combined = pd.concat(frames, ignore_index=True)
+    for col in combined.columns:
+        if len(frames) > 1 and all(col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            try:
+                combined[col] = union_categoricals([f[col] for f in frames], ignore_order=True)
+            except TypeError:
+                # カテゴリの型が異なる（空の列が数値として読まれた等）場合は結合後の値からカテゴリを作り直す
+                combined[col] = combined[col].astype('category')
+    combined[SOURCE_COLUMN] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(frames)), [len(f) for f in frames]), categories=source_labels(file_names)
+    )
+    return combined
+
+# 複数ファイルを必要な列だけ読んで結合する。files は (data, file_name, csv_format) のリスト
+# Excelの解析（openpyxl・calamine とも）はGILを手放さないためプロセス、CSV（pyarrow・Cエンジン）はスレッドで並行させる
+def read_frames(files, usecols, dtypes, max_workers=PARSE_MAX_WORKERS):
+    datas, names, csv_formats = zip(*files)
+    workers = min(max_workers, len(files))
+    if workers <= 1:
+        frames = [read_frame(data, name, csv_format, usecols, dtypes) for data, name, csv_format in files]
+    else:
+        if all(name.endswith('.csv') for name in names):
+            executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            # Streamlitのサーバーはスレッドを持つため fork ではなく spawn で起動する
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        with executor:
+            frames = list(executor.map(read_frame, datas, names, csv_formats, repeat(usecols), repeat(dtypes)))
+    return concat_frames(frames, names)
+
+def snapshot_path(content_hash):
+    return os.path.join(SNAPSHOT_DIR, f"{content_hash}.arrow")
+
+def snapshot_columns(content_hash):
+    path = snapshot_path(content_hash)
+    if feather is None or not os.path.exists(path):
+        return None
+    return feather.read_table(path, memory_map=True).column_names
+
+# スナップショットはメモリマップで開く（無圧縮で保存しているため再解析なしで読める）
+def read_snapshot(content_hash):
+    path = snapshot_path(content_hash)
+    if feather is None or not os.path.exists(path):
+        return None
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+def write_snapshot(df, content_hash):
+    if feather is None:
+        raise ImportError("スナップショット保存には pyarrow が必要です")
+    if not all(isinstance(c, str) for c in df.columns):
+        raise ValueError("列名が文字列でないためスナップショットを保存できません")
+
+    df = df.reset_index(drop=True)
+    # 数値と文字列が混在する列はArrowに変換できないため文字列にそろえる（欠損はそのまま）
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(content_hash)
+    tmp_path = path + ".tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
@@ -0,0 +1,63 @@
+"""ファイルの読み込みから判定までを1回で実行する（CLI・バッチ処理用）"""
+import os
+
+import pandas as pd
+
+from .analysis import (
+    DEFAULT_THRESHOLDS, REQUIRED_COLUMNS, META_CATEGORICAL_COLUMNS, HS_CATEGORICAL_COLUMNS,
+    detect_columns, categorical_dtypes, meta_required_columns, hs_required_columns,
+    normalize_frames, period_bounds, aggregate_banners, score_banners,
+)
+from .dates import DateParser
+from .loader import read_header, read_frame
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+# Meta・HubSpotのエクスポート1組を集計・判定し、(バナー別の結果, 列の対応, デバッグ情報) を返す
+# 判定基準は指定したものだけ DEFAULT_THRESHOLDS を上書きする。stream_hs=True ならHubSpot CSVをチャンク単位で集計する
+def analyze_files(meta_path, hs_path, start_date=None, end_date=None, thresholds=None, stream_hs=False):
+    meta_name = os.path.basename(meta_path)
+    hs_name = os.path.basename(hs_path)
+    meta_data = read_file(meta_path)
+    hs_data = read_file(hs_path)
+
+    meta_header, meta_csv_format = read_header(meta_data, meta_name)
+    hs_header, hs_csv_format = read_header(hs_data, hs_name)
+
+    cols = detect_columns(meta_header, hs_header)
+    missing = [key for key in REQUIRED_COLUMNS if not cols[key]]
+    if missing:
+        raise ValueError(f"必要な列が見つかりません: {', '.join(missing)}（{meta_name} / {hs_name}）")
+
+    df_meta = read_frame(
+        meta_data, meta_name, meta_csv_format,
+        meta_required_columns(cols), categorical_dtypes(cols, META_CATEGORICAL_COLUMNS)
+    )
+    hs_streaming = stream_hs and hs_name.endswith('.csv')
+    if hs_streaming:
+        # ストリーミング集計ではHubSpotはヘッダーのみ使い、集計時にチャンク単位で読む
+        df_hs = pd.DataFrame(columns=hs_header)
+    else:
+        df_hs = read_frame(
+            hs_data, hs_name, hs_csv_format,
+            hs_required_columns(cols), categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS)
+        )
+    date_parser = DateParser()
+    df_meta, df_hs = normalize_frames(df_meta, df_hs, cols, date_parser)
+
+    start_datetime = end_datetime = None
+    if start_date is not None or end_date is not None:
+        if start_date is None or end_date is None:
+            raise ValueError("期間は開始日と終了日の両方を指定してください")
+        start_datetime, end_datetime = period_bounds(start_date, end_date)
+
+    hs_source = [(hs_data, hs_csv_format)] if hs_streaming else df_hs
+    result, debug = aggregate_banners(df_meta, hs_source, cols, start_datetime, end_datetime)
+    debug['date_coerced'] = {**date_parser.coerced, **debug.get('date_coerced', {})}
+
+    params = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    result = score_banners(result, cols['impressions_col'], **params)
+    return result, cols, debug
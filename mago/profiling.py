@@ -0,0 +1,101 @@
+"""処理ステージごとの経過時間・ピークメモリの計測（計測しないときは NULL_PROFILER を渡す）"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+# 計測結果（JSON Lines）の保存先
+PROFILE_LOG_PATH = os.path.join("data", "profiles", "stages.jsonl")
+
+# tracemalloc とそのピーク（reset_peak）はプロセス全体で1つのため、メモリを計測するプロファイラは同時に1つだけにする
+# ほかのセッションのプロファイラが計測中なら、待たずに時間だけを記録する
+_tracing_lock = threading.Lock()
+
+
+# 前回の区切りからの経過時間とメモリ確保量のピークを、区切りごとに記録する
+# 同じステージ名を複数回記録した場合（チャンク単位の集計など）は時間を合計し、ピークは最大値を残す
+# メモリはプロセス全体の確保量のため、同時に処理中のほかのセッションの確保量も含む
+class StageProfiler:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = {}
+        self.memory_traced = False
+        self.active = False
+        self._tracing = False
+        self._started_tracemalloc = False
+        self._clock = None
+        self._baseline = 0
+
+    def start(self):
+        if self.trace_memory and not self._tracing and _tracing_lock.acquire(blocking=False):
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+            self._tracing = True
+            self.memory_traced = True
+        self.active = True
+        self._reset()
+        return self
+
+    # 計測を終える（以後の lap は呼ばないこと。フラグメントだけの再実行では active を見て NULL_PROFILER に替える）
+    def stop(self):
+        if self._tracing:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            self._tracing = False
+            _tracing_lock.release()
+        self.active = False
+
+    def _reset(self):
+        if self._tracing:
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        self._clock = time.perf_counter()
+
+    # 直前の区切りからここまでを stage として記録する
+    def lap(self, stage):
+        seconds = time.perf_counter() - self._clock
+        peak_bytes = tracemalloc.get_traced_memory()[1] - self._baseline if self._tracing else None
+
+        record = self.records.setdefault(stage, {'stage': stage, 'seconds': 0.0, 'peak_bytes': None, 'calls': 0})
+        record['seconds'] += seconds
+        record['calls'] += 1
+        if peak_bytes is not None:
+            record['peak_bytes'] = max(record['peak_bytes'] or 0, peak_bytes)
+        # 記録自体にかかった時間は次のステージに含めない
+        self._reset()
+
+    def to_frame(self):
+        df = pd.DataFrame(list(self.records.values()), columns=['stage', 'seconds', 'peak_bytes', 'calls'])
+        return pd.DataFrame({
+            'ステージ': df['stage'],
+            '時間（ms）': (df['seconds'] * 1000).round(1),
+            'ピークメモリ増分（MB）': (df['peak_bytes'] / 1024 ** 2).round(2),
+            '回数': df['calls'],
+        })
+
+    # 1ステージ1行で追記する（context は実行ごとの共通情報。ファイル名・行数など）
+    def write_jsonl(self, path=PROFILE_LOG_PATH, **context):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        run = {'run_id': f"{datetime.now():%Y%m%d%H%M%S%f}", 'timestamp': datetime.now().isoformat(timespec='seconds'), **context}
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in self.records.values():
+                f.write(json.dumps({**run, **record}, ensure_ascii=False, default=str) + "\n")
+
+
+# 計測しないときの代わり（区切りを記録しない）
+class NullProfiler:
+    active = False
+
+    def lap(self, stage):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
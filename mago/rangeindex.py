@@ -0,0 +1,143 @@
+"""日×バナーの累積和による期間集計（期間を変えても元の行を読み直さない）
+
+アップロードごとに1回、日付順の日×バナー合計を日付方向に累積しておく。
+任意の期間の合計は累積の2行の差になるため、期間を変えたときの集計はバナー数に比例する時間で済む。
+期間の境界は period_bounds と同じく日単位（開始日の0時〜終了日の終わり）とみなす。
+"""
+import numpy as np
+import pandas as pd
+
+from .analysis import (
+    classify_hs_rows, prepare_hs_rows, meta_banner_keys,
+    finalize_meta_summary, finalize_hs_summary, merge_banner_summary,
+)
+from .profiling import NULL_PROFILER
+
+
+# 日×キーの合計を日付方向に累積したもの。1行目は0（期間の合計は sums[hi] - sums[lo]）
+# 日付が欠損の行は期間を指定しない集計にだけ含める
+class DailyPrefixSums:
+    def __init__(self, values, days, keys, all_days):
+        # values / days / keys はキーの有無を問わない同じ行。all_days はキー抽出前の全行の日付（行数の集計用）
+        self.days = pd.DatetimeIndex(all_days.dropna().unique()).sort_values()
+        self.keys = pd.Index(keys.dropna().unique()).astype(str).sort_values()
+        n_slots, n_keys = len(self.days) + 1, len(self.keys)
+
+        dated = days.notna().to_numpy()
+        codes = self.keys.get_indexer(keys)
+        keyed = codes >= 0
+        slots = self.days.get_indexer(days) + 1
+        in_grid = dated & keyed
+        undated = ~dated & keyed
+        flat = slots[in_grid] * n_keys + codes[in_grid]
+
+        self.sums = {}
+        self.undated = {}
+        for col in values.columns:
+            column = values[col].to_numpy()
+            grid = np.bincount(flat, weights=column[in_grid], minlength=n_slots * n_keys).reshape(n_slots, n_keys)
+            rest = np.bincount(codes[undated], weights=column[undated], minlength=n_keys)
+            # 重み付きbincountは浮動小数で返るため、整数列は整数に戻す
+            if np.issubdtype(column.dtype, np.integer):
+                grid, rest = np.rint(grid).astype(np.int64), np.rint(rest).astype(np.int64)
+            self.sums[col] = grid.cumsum(axis=0)
+            self.undated[col] = rest
+
+        # キー抽出前の行数（デバッグ表示用）
+        all_slots = self.days.get_indexer(all_days) + 1
+        self.day_rows = np.bincount(all_slots[all_slots > 0], minlength=n_slots).cumsum()
+        self.undated_rows = int((all_slots == 0).sum())
+
+    # 保持している配列のメモリ量（共有キャッシュのメモリ上限の計算用）
+    @property
+    def nbytes(self):
+        arrays = [*self.sums.values(), *self.undated.values(), self.day_rows]
+        return sum(a.nbytes for a in arrays) + self.days.nbytes + self.keys.memory_usage(deep=True)
+
+    # 期間内の累積の行位置（開始日以上・終了日以下の日）
+    def _bounds(self, start_datetime, end_datetime):
+        lo = self.days.searchsorted(pd.Timestamp(start_datetime).normalize(), side='left')
+        hi = self.days.searchsorted(pd.Timestamp(end_datetime), side='right')
+        return lo, max(lo, hi)
+
+    # 列ごとのキー別合計。start_datetime が None なら日付が欠損の行も含む全期間
+    def totals(self, start_datetime=None, end_datetime=None):
+        if start_datetime is None:
+            return {col: sums[-1] + self.undated[col] for col, sums in self.sums.items()}
+        lo, hi = self._bounds(start_datetime, end_datetime)
+        return {col: sums[hi] - sums[lo] for col, sums in self.sums.items()}
+
+    def total_rows(self, start_datetime=None, end_datetime=None):
+        if start_datetime is None:
+            return int(self.day_rows[-1]) + self.undated_rows
+        lo, hi = self._bounds(start_datetime, end_datetime)
+        return int(self.day_rows[hi] - self.day_rows[lo])
+
+
+def day_floor(df, date_col):
+    if date_col is None:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    return df[date_col].dt.floor('D')
+
+
+# Meta・HubSpotそれぞれの日×バナーの累積和。aggregate_banners と同じ形の結果を期間ごとに返す
+class BannerRangeIndex:
+    def __init__(self, df_meta, df_hs, cols, profiler=NULL_PROFILER):
+        self.cols = cols
+        spend_col = cols['spend_col']
+
+        meta_values = pd.DataFrame({spend_col: pd.to_numeric(df_meta[spend_col], errors='coerce').fillna(0)})
+        for col in [cols['impressions_col'], cols['clicks_col']]:
+            if col:
+                meta_values[col] = pd.to_numeric(df_meta[col], errors='coerce').fillna(0)
+        meta_values['行数'] = 1
+        meta_days = day_floor(df_meta, cols['date_col_meta'])
+        self.meta = DailyPrefixSums(meta_values, meta_days, meta_banner_keys(df_meta[cols['name_col']]), meta_days)
+
+        hs_rows = prepare_hs_rows(df_hs, cols, None, None, {})
+        hs_values = classify_hs_rows(hs_rows, cols)
+        hs_values.insert(0, 'リード数', 1)
+        self.hs = DailyPrefixSums(
+            hs_values, day_floor(hs_rows, cols['date_col_hs']), hs_rows['key'], day_floor(df_hs, cols['date_col_hs'])
+        )
+        profiler.lap("期間インデックス作成")
+
+    @property
+    def nbytes(self):
+        return self.meta.nbytes + self.hs.nbytes
+
+    def aggregate(self, start_datetime=None, end_datetime=None, profiler=NULL_PROFILER):
+        cols = self.cols
+        debug = {}
+
+        # 日付列がない側は期間で絞り込まない（aggregate_banners と同じ）
+        meta_range = (start_datetime, end_datetime) if cols['date_col_meta'] else (None, None)
+        if meta_range[0] is not None:
+            debug['meta_rows_before_filter'] = self.meta.total_rows()
+        debug['meta_rows'] = self.meta.total_rows(*meta_range)
+        meta_totals = self.meta.totals(*meta_range)
+        keyed_rows = meta_totals.pop('行数')
+        present = keyed_rows > 0
+        meta_agg = pd.DataFrame({'key': self.meta.keys[present], **{col: v[present] for col, v in meta_totals.items()}})
+        debug['meta_rows_keyed'] = int(keyed_rows.sum())
+        debug['banner_ids'] = meta_agg['key'].tolist()
+        meta_agg = finalize_meta_summary(meta_agg, cols)
+        debug['meta_agg'] = meta_agg
+
+        hs_range = (start_datetime, end_datetime) if cols['date_col_hs'] else (None, None)
+        if hs_range[0] is not None:
+            debug['hs_rows_before_filter'] = self.hs.total_rows()
+        debug['hs_rows'] = self.hs.total_rows(*hs_range)
+        hs_totals = self.hs.totals(*hs_range)
+        present = hs_totals['リード数'] > 0
+        hs_counts = pd.DataFrame(
+            {col: v[present] for col, v in hs_totals.items()},
+            index=pd.Index(self.hs.keys[present], name='key')
+        )
+        debug['hs_rows_keyed'] = int(hs_counts['リード数'].sum())
+        profiler.lap("期間集計（累積和）")
+
+        hs_summary = finalize_hs_summary(hs_counts, cols, debug)
+        result = merge_banner_summary(hs_summary, meta_agg, cols)
+        profiler.lap("結合・指標計算")
+        return result, debug
@@ -0,0 +1,106 @@
+"""判定基準の感度分析（判定基準を格子状に動かしたときの判定ごとのバナー数・消化金額。Streamlitに依存しない）
+
+判定（許容CPA × 目標接続率 × 目標商談化率）・クリエイティブ診断（目標CTR × 目標LP遷移率 × 目標法人率）それぞれについて、
+1つ目の軸の値ごとに judgment_codes / diagnosis_codes へ残り2軸の基準の配列を (軸2, 軸3, バナー) の形でブロードキャストして渡し、
+その断面の全点の判定を1回で求める。判定ごとの件数・消化金額は格子点ごとに bincount（重みは消化金額）で数える。
+格子点×バナーの数は計算を始める前に SENSITIVITY_MAX_CELLS と比べる。
+"""
+import numpy as np
+import pandas as pd
+
+from .analysis import JUDGMENT_LABELS, DIAGNOSIS_LABELS, judgment_codes, diagnosis_codes
+
+# 感度分析の軸（判定基準のキー, 表示名, 範囲の下限, 上限）
+JUDGMENT_SWEEP_AXES = [
+    ('cpa_limit', "許容CPA（円）", 0, 100000),
+    ('connect_target', "目標接続率（%）", 0, 100),
+    ('meeting_target', "目標商談化率（%）", 0, 50),
+]
+DIAGNOSIS_SWEEP_AXES = [
+    ('ctr_target', "目標CTR（%）", 0.0, 5.0),
+    ('cvr_target', "目標LP遷移率（%）", 0.0, 50.0),
+    ('corp_target', "目標法人率（%）", 0.0, 100.0),
+]
+
+# 1軸あたりの格子の点の数（既定値と上限）
+SENSITIVITY_STEPS = 11
+SENSITIVITY_MAX_STEPS = 21
+
+# 1回の感度分析で判定する格子点×バナーの数の上限（1コアで約0.5秒。21点×3軸なら約5,000バナーまで）
+SENSITIVITY_MAX_CELLS = 50_000_000
+
+
+# 下限〜上限を steps 点に等分した格子（下限と上限が同じなら1点）
+def threshold_grid(lower, upper, steps=SENSITIVITY_STEPS):
+    if upper <= lower:
+        return np.array([float(lower)])
+    return np.linspace(float(lower), float(upper), steps)
+
+# 現在の基準の 1/2〜3/2 倍（軸の範囲内）を既定の範囲にする。現在の基準が0なら軸の範囲全体
+def default_range(current, lower, upper):
+    if current <= 0:
+        return lower, upper
+    cast = type(lower)
+    return cast(min(max(lower, current / 2), upper)), cast(min(upper, current * 3 / 2))
+
+# 軸ごとの既定の範囲の格子
+def default_grids(axes, thresholds, steps=SENSITIVITY_STEPS):
+    return [threshold_grid(*default_range(thresholds[key], lower, upper), steps) for key, _, lower, upper in axes]
+
+# 格子点×バナーの数
+def sweep_cells(grids, n_banners):
+    return int(np.prod([len(grid) for grid in grids])) * n_banners
+
+# バナー数に対して上限に収まる1軸あたりの点の数（SENSITIVITY_MAX_STEPS 以下の奇数。3点でも超える場合は3）
+def max_sweep_steps(n_banners, n_axes=3):
+    steps = SENSITIVITY_MAX_STEPS
+    while steps > 3 and steps ** n_axes * n_banners > SENSITIVITY_MAX_CELLS:
+        steps -= 2
+    return steps
+
+# 2つ目・3つ目の軸の格子を (軸2, 軸3, バナー) にブロードキャストできる形にする
+def slice_axes(grids):
+    return np.asarray(grids[1]).reshape(-1, 1, 1), np.asarray(grids[2]).reshape(1, -1, 1)
+
+# 格子点ごと・判定ごとのバナー数と消化金額の縦長の表（軸の列, 判定, バナー数, 消化金額）
+# slice_codes(1つ目の軸の値) は (軸2, 軸3, バナー) の判定の番号を返す関数
+def sweep_totals(slice_codes, spend, grids, axis_keys, labels):
+    if sweep_cells(grids, len(spend)) > SENSITIVITY_MAX_CELLS:
+        raise ValueError(
+            f"格子点×バナーの数が上限（{SENSITIVITY_MAX_CELLS:,}）を超えています: {sweep_cells(grids, len(spend)):,}"
+        )
+
+    n_labels, n_slice_points = len(labels), len(grids[1]) * len(grids[2])
+    banners = np.zeros((len(grids[0]), n_slice_points, n_labels), dtype=np.int64)
+    spend_totals = np.zeros((len(grids[0]), n_slice_points, n_labels))
+    for i, value in enumerate(grids[0]):
+        codes = slice_codes(value).reshape(n_slice_points, len(spend))
+        for j, point_codes in enumerate(codes):
+            banners[i, j] = np.bincount(point_codes, minlength=n_labels)
+            spend_totals[i, j] = np.bincount(point_codes, weights=spend, minlength=n_labels)
+
+    index = pd.MultiIndex.from_product([*grids, labels], names=[*axis_keys, '判定'])
+    table = pd.DataFrame({'バナー数': banners.ravel(), '消化金額': spend_totals.ravel()}, index=index).reset_index()
+    table['判定'] = pd.Categorical(table['判定'], categories=labels)
+    return table
+
+def spend_values(result, spend_col):
+    return pd.to_numeric(result[spend_col], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+# 判定の感度分析。grids は JUDGMENT_SWEEP_AXES の順の3軸の格子
+def judgment_sweep(result, spend_col, grids):
+    grids = [np.asarray(grid, dtype=float) for grid in grids]
+    connect_targets, meeting_targets = slice_axes(grids)
+    return sweep_totals(
+        lambda cpa_limit: judgment_codes(result, cpa_limit, connect_targets, meeting_targets),
+        spend_values(result, spend_col), grids, [key for key, _, _, _ in JUDGMENT_SWEEP_AXES], JUDGMENT_LABELS
+    )
+
+# クリエイティブ診断の感度分析。grids は DIAGNOSIS_SWEEP_AXES の順の3軸の格子（IMP閾値は固定）
+def diagnosis_sweep(result, spend_col, grids, imp_threshold, impressions_col):
+    grids = [np.asarray(grid, dtype=float) for grid in grids]
+    cvr_targets, corp_targets = slice_axes(grids)
+    return sweep_totals(
+        lambda ctr_target: diagnosis_codes(result, ctr_target, cvr_targets, corp_targets, imp_threshold, impressions_col),
+        spend_values(result, spend_col), grids, [key for key, _, _, _ in DIAGNOSIS_SWEEP_AXES], DIAGNOSIS_LABELS
+    )
@@ -0,0 +1,207 @@
+"""Googleスプレッドシートへの書き込み（バッチ書き込み・再試行・バックグラウンドのキュー）"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import gspread
+import numpy as np
+
+# クォータ超過・一時的なサーバーエラー時の再試行（待機秒数は 1, 2, 4, 8... 秒）
+SHEETS_RETRY_STATUS = {429, 500, 502, 503, 504}
+SHEETS_MAX_RETRIES = 5
+SHEETS_BACKOFF_SECONDS = 1.0
+
+# 書き込み待ちジョブの保存先（1ジョブ1ファイル。書き込み完了で削除、再起動時に残っていれば再送）
+EXPORT_OUTBOX_DIR = os.path.join("data", "export_outbox")
+
+# 1ジョブを書き込む試行の上限（アプリの起動ごとに1回）。上限に達したジョブと、再試行しても直らないエラー
+# （権限・存在しないシートなど）のジョブは outbox の下の EXPORT_DEAD_LETTER_NAME に移し、再送しない
+EXPORT_MAX_ATTEMPTS = 5
+EXPORT_DEAD_LETTER_NAME = "dead"
+
+# APIエラーのHTTPステータス
+def api_status(error):
+    return getattr(error, 'code', None) or error.response.status_code
+
+# 再送しても成功しないエラー（再試行しないステータスのAPIエラー、スプレッドシートのURL・IDの誤り）
+def is_permanent_error(error):
+    if isinstance(error, (gspread.exceptions.SpreadsheetNotFound, gspread.exceptions.NoValidUrlKeyFound)):
+        return True
+    return isinstance(error, gspread.exceptions.APIError) and api_status(error) not in SHEETS_RETRY_STATUS
+
+# 認証済みクライアントとワークシートを保持し、複数行を1回の append_rows で書き込む
+# client_factory は gspread.Client 互換のオブジェクトを返す関数（テスト時はローカルの代替実装を渡せる）
+class SheetWriter:
+    def __init__(self, client_factory, spreadsheet_url, max_retries=SHEETS_MAX_RETRIES,
+                 backoff_seconds=SHEETS_BACKOFF_SECONDS, sleep=time.sleep):
+        self.client_factory = client_factory
+        self.spreadsheet_url = spreadsheet_url
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+        self._workbook = None
+        self._worksheets = {}
+
+    def _with_retry(self, func, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if api_status(e) not in SHEETS_RETRY_STATUS or attempt == self.max_retries:
+                    raise
+                self.sleep(self.backoff_seconds * (2 ** attempt) + random.uniform(0, self.backoff_seconds))
+
+    def worksheet(self, sheet_index):
+        if sheet_index not in self._worksheets:
+            if self._workbook is None:
+                client = self.client_factory()
+                self._workbook = self._with_retry(client.open_by_url, self.spreadsheet_url)
+            sheet = self._with_retry(self._workbook.get_worksheet, sheet_index)
+            if sheet is None:
+                raise ValueError(f"sheet_index {sheet_index} が存在しません")
+            self._worksheets[sheet_index] = sheet
+        return self._worksheets[sheet_index]
+
+    def append_rows(self, sheet_index, rows):
+        if not rows:
+            return
+        sheet = self.worksheet(sheet_index)
+        self._with_retry(sheet.append_rows, rows)
+
+# スプレッドシートへの書き込みをバックグラウンドで順番に実行するキュー（プロセスで1つ）
+# ジョブは先に EXPORT_OUTBOX_DIR に保存するため、書き込み前にアプリが再起動しても失われない
+# 失敗したジョブは再起動時に再送し、max_attempts 回失敗したら（直らないエラーならすぐに）再送をやめる（状態は 'dead'）
+class ExportQueue:
+    def __init__(self, client_factory, outbox_dir=EXPORT_OUTBOX_DIR, max_attempts=EXPORT_MAX_ATTEMPTS, sleep=time.sleep):
+        self.client_factory = client_factory
+        self.outbox_dir = outbox_dir
+        self.dead_letter_dir = os.path.join(outbox_dir, EXPORT_DEAD_LETTER_NAME)
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheet-export")
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.writers = {}
+
+        # 前回の起動で書き込めなかったジョブを再送
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        for name in sorted(os.listdir(self.outbox_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.outbox_dir, name), encoding="utf-8") as f:
+                    self._submit(json.load(f))
+
+    def _job_path(self, job_id):
+        return os.path.join(self.outbox_dir, f"{job_id}.json")
+
+    # 再送しないジョブを失敗の理由とともに dead_letter_dir に移す
+    def _dead_letter(self, job, error):
+        job['error'] = str(error)
+        self._save(job)
+        os.makedirs(self.dead_letter_dir, exist_ok=True)
+        os.replace(self._job_path(job['id']), os.path.join(self.dead_letter_dir, f"{job['id']}.json"))
+
+    def _save(self, job):
+        path = self._job_path(job['id'])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _set_state(self, job_id, **state):
+        with self.lock:
+            self.jobs[job_id].update(state)
+
+    def _submit(self, job):
+        with self.lock:
+            self.jobs[job['id']] = {'state': 'queued', 'label': job['label'], 'rows': sum(len(b['rows']) for b in job['batches'])}
+        self.executor.submit(self._run, job)
+
+    def _writer(self, spreadsheet_url):
+        if spreadsheet_url not in self.writers:
+            self.writers[spreadsheet_url] = SheetWriter(self.client_factory, spreadsheet_url, sleep=self.sleep)
+        return self.writers[spreadsheet_url]
+
+    def _run(self, job):
+        self._set_state(job['id'], state='running')
+        # 試行回数は書き込む前に保存する（書き込み中にアプリが止まった場合も1回と数える）
+        job['attempts'] = job.get('attempts', 0) + 1
+        self._save(job)
+        try:
+            writer = self._writer(job['spreadsheet_url'])
+            # 書き込み済みのバッチ数を記録し、途中で失敗しても再送時に同じ行を重複して追記しない
+            while job['done_batches'] < len(job['batches']):
+                batch = job['batches'][job['done_batches']]
+                writer.append_rows(batch['sheet_index'], batch['rows'])
+                job['done_batches'] += 1
+                self._save(job)
+            os.remove(self._job_path(job['id']))
+            self._set_state(job['id'], state='done')
+        except Exception as e:
+            if is_permanent_error(e) or job['attempts'] >= self.max_attempts:
+                self._dead_letter(job, e)
+                self._set_state(job['id'], state='dead', error=str(e))
+            else:
+                self._set_state(job['id'], state='failed', error=str(e))
+
+    # batches は (sheet_index, rows) のリスト
+    def enqueue(self, spreadsheet_url, batches, label):
+        job = {
+            'id': f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}",
+            'label': label,
+            'spreadsheet_url': spreadsheet_url,
+            'batches': [{'sheet_index': sheet_index, 'rows': rows} for sheet_index, rows in batches],
+            'done_batches': 0,
+            'attempts': 0,
+        }
+        self._save(job)
+        self._submit(job)
+        return job['id']
+
+    def status(self, job_id):
+        with self.lock:
+            return dict(self.jobs.get(job_id, {}))
+
+    def pending_count(self):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job['state'] in ('queued', 'running', 'failed'))
+
+# numpyの数値をPythonの数値に、それ以外の値を文字列にそろえる
+def to_sheet_value(v):
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, (np.floating,)):
+        return float(v)
+    if isinstance(v, (int, float)):
+        return v
+    return str(v)
+
+def summary_row(analysis_data, now):
+    return [to_sheet_value(v) for v in [
+        now,
+        analysis_data.get("ファイル名", ""),
+        analysis_data.get("総リード数", 0),
+        analysis_data.get("平均CPA", 0),
+        analysis_data.get("総消化金額", 0),
+        round(float(analysis_data.get("商談化率", 0)), 2),
+    ]]
+
+# バナー別評価表の行（1バナー1行）
+def banner_rows(result, spend_col, file_label, now):
+    columns = [
+        'key', '判定', 'クリエイティブ診断', spend_col, 'リード数', 'CPA',
+        '接続率', '商談化率', '法人率', 'CTR_calc', 'LP遷移率',
+        '接続数', '商談実施数', '商談予約数', '法人数',
+    ]
+    rate_columns = ['接続率', '商談化率', '法人率', 'CTR_calc', 'LP遷移率']
+    table = result[columns]
+    # 比率は float32 のため float64 にしてから丸める（シートに 33.33000183 のような値を書かない）
+    table = table.assign(**{col: table[col].astype(float).round(2) for col in rate_columns})
+    return [
+        [now, file_label] + [to_sheet_value(v) for v in row]
+        for row in table.itertuples(index=False, name=None)
+    ]
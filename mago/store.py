@@ -0,0 +1,258 @@
+"""日×バナー別の集計を貯めるローカルストア（SQLite）
+
+毎日アップロードする累積エクスポートのうち、未取り込みの日付・HubSpotレコードだけを追加する。
+期間を指定した集計は元のファイルを読み直さず、ストアの日次集計を合計して返す。
+"""
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from .analysis import (
+    STATUS_NAMES, classify_hs_rows, prepare_hs_rows, meta_banner_keys,
+    finalize_meta_summary, finalize_hs_summary, merge_banner_summary,
+)
+from .profiling import NULL_PROFILER
+
+STORE_DIR = os.path.join("data", "store")
+
+# HubSpot側で日×バナーごとに保存するカウント列（classify_hs_rows の列とリード数）
+HS_STORE_COLUMNS = ['リード数', '接続数', '商談実施数', '商談予約数'] + STATUS_NAMES + ['法人数', '初回商談', '再商談']
+
+# 日付が空の行をまとめる日付（期間を指定した集計には含まれない）
+NO_DATE = ''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta_daily (
+    date TEXT NOT NULL,
+    key TEXT NOT NULL,
+    spend NUMERIC NOT NULL,
+    impressions NUMERIC NOT NULL,
+    clicks NUMERIC NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (date, key)
+);
+CREATE TABLE IF NOT EXISTS hs_daily (
+    date TEXT NOT NULL,
+    key TEXT NOT NULL,
+    {hs_columns},
+    PRIMARY KEY (date, key)
+);
+CREATE TABLE IF NOT EXISTS hs_records (
+    record_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS store_settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    content_hash TEXT PRIMARY KEY,
+    side TEXT NOT NULL,
+    ingested_at TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+""".format(hs_columns=",\n    ".join(f'"{c}" INTEGER NOT NULL DEFAULT 0' for c in HS_STORE_COLUMNS))
+
+
+# HubSpotの重複除外の方式（ストアごとに最初の取り込みで決まり、以後は同じ方式のファイルだけを取り込む）
+HS_DEDUPE_LABELS = {'record_id': "レコードID", 'date': "作成日"}
+
+
+def day_strings(dates):
+    return pd.to_datetime(dates, errors='coerce').dt.strftime('%Y-%m-%d').fillna(NO_DATE)
+
+def numeric_column(df, col):
+    if col is None:
+        return 0
+    return pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+# 取り込む日付：未取り込みの日と、取り込み済みの最終日以降（前回の時点では途中までだった可能性がある日）
+def fresh_dates(dates, stored_dates):
+    latest = max((d for d in stored_dates if d != NO_DATE), default=None)
+    fresh = ~dates.isin(stored_dates)
+    if latest is not None:
+        fresh |= (dates != NO_DATE) & (dates >= latest)
+    return fresh
+
+
+# ストア1つは1アカウント分（Meta・HubSpotの組）。アカウントごとに名前を分ける
+class BannerStore:
+    def __init__(self, name='default', store_dir=STORE_DIR):
+        if not re.fullmatch(r'[\w\-]+', name):
+            raise ValueError(f"ストア名に使えるのは英数字・_・- のみです: {name!r}")
+        os.makedirs(store_dir, exist_ok=True)
+        self.path = os.path.join(store_dir, f"{name}.sqlite")
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _already_ingested(self, conn, content_hash):
+        if content_hash is None:
+            return False
+        return conn.execute("SELECT 1 FROM ingested_files WHERE content_hash = ?", (content_hash,)).fetchone() is not None
+
+    def _mark_ingested(self, conn, content_hash, side, rows):
+        if content_hash is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?)",
+                (content_hash, side, datetime.now().isoformat(timespec='seconds'), int(rows))
+            )
+
+    # Meta：未取り込みの日付だけを日×バナーで集計して保存する。戻り値は {'dates': 追加・更新した日数, 'rows': 行数}
+    # 同じファイル（content_hash）は2回目以降は何もしない（None を返す）
+    def ingest_meta(self, df_meta, cols, content_hash=None):
+        if not cols['date_col_meta']:
+            raise ValueError("日次ストアにはMetaの日付列（レポート開始日）が必要です")
+
+        with self._transaction() as conn:
+            if self._already_ingested(conn, content_hash):
+                return None
+
+            rows = pd.DataFrame({
+                'date': day_strings(df_meta[cols['date_col_meta']]),
+                'key': meta_banner_keys(df_meta[cols['name_col']]),
+                'spend': numeric_column(df_meta, cols['spend_col']),
+                'impressions': numeric_column(df_meta, cols['impressions_col']),
+                'clicks': numeric_column(df_meta, cols['clicks_col']),
+            })
+            rows = rows[rows['key'].notna()]
+
+            stored = {d for (d,) in conn.execute("SELECT DISTINCT date FROM meta_daily")}
+            rows = rows[fresh_dates(rows['date'], stored)]
+            daily = rows.groupby(['date', 'key']).agg(
+                spend=('spend', 'sum'), impressions=('impressions', 'sum'),
+                clicks=('clicks', 'sum'), rows=('key', 'size'),
+            ).reset_index()
+
+            dates = daily['date'].unique().tolist()
+            conn.executemany("DELETE FROM meta_daily WHERE date = ?", [(d,) for d in dates])
+            conn.executemany(
+                "INSERT INTO meta_daily (date, key, spend, impressions, clicks, rows) VALUES (?, ?, ?, ?, ?, ?)",
+                daily[['date', 'key', 'spend', 'impressions', 'clicks', 'rows']].itertuples(index=False, name=None)
+            )
+            self._mark_ingested(conn, content_hash, 'meta', len(rows))
+        return {'dates': len(dates), 'rows': len(rows)}
+
+    # ストアのHubSpotの重複除外の方式。未記録なら保存済みのデータから判断し、データもなければ mode を記録する
+    # 方式が違うファイルは取り込まない（件数は既存の行に加算するため、同じリードを二重に数えてしまう）
+    def _check_hs_dedupe(self, conn, mode):
+        row = conn.execute("SELECT value FROM store_settings WHERE name = 'hs_dedupe'").fetchone()
+        if row is not None:
+            stored = row[0]
+        elif conn.execute("SELECT 1 FROM hs_records LIMIT 1").fetchone() is not None:
+            stored = 'record_id'
+        elif conn.execute("SELECT 1 FROM hs_daily LIMIT 1").fetchone() is not None:
+            stored = 'date'
+        else:
+            stored = mode
+        if stored != mode:
+            raise ValueError(
+                f"このストアのHubSpotは{HS_DEDUPE_LABELS[stored]}で重複を除いて取り込んでいます。"
+                f"{HS_DEDUPE_LABELS[mode]}で重複を除くファイルは取り込めません"
+            )
+        if row is None:
+            conn.execute("INSERT INTO store_settings VALUES ('hs_dedupe', ?)", (stored,))
+
+    # HubSpot：レコードID列があれば未取り込みのレコードだけを、なければ未取り込みの日付だけを保存する
+    # （取り込み済みレコードの取引ステージ等が後から変わっても、ストアの集計には反映されない）
+    # どちらで重複を除くかはストアの最初の取り込みで決まり、違う方式のファイルは ValueError にする
+    def ingest_hs(self, df_hs, cols, content_hash=None):
+        record_id_col = cols['record_id_col']
+        date_col_hs = cols['date_col_hs']
+        if not record_id_col and not date_col_hs:
+            raise ValueError("日次ストアにはHubSpotのレコードID列または作成日列が必要です")
+
+        with self._transaction() as conn:
+            if self._already_ingested(conn, content_hash):
+                return None
+            self._check_hs_dedupe(conn, 'record_id' if record_id_col else 'date')
+
+            hs_rows = prepare_hs_rows(df_hs, cols, None, None, {})
+            dates = day_strings(hs_rows[date_col_hs]) if date_col_hs else pd.Series(NO_DATE, index=hs_rows.index)
+
+            if record_id_col:
+                record_ids = hs_rows[record_id_col].astype(str)
+                stored_ids = pd.read_sql_query("SELECT record_id FROM hs_records", conn)['record_id']
+                fresh = ~record_ids.isin(stored_ids) & ~record_ids.duplicated()
+                conn.executemany("INSERT INTO hs_records VALUES (?)", ((r,) for r in record_ids[fresh]))
+            else:
+                stored = {d for (d,) in conn.execute("SELECT DISTINCT date FROM hs_daily")}
+                fresh = fresh_dates(dates, stored)
+                conn.executemany("DELETE FROM hs_daily WHERE date = ?", [(d,) for d in dates[fresh].unique()])
+
+            hs_rows = hs_rows[fresh]
+            flags = classify_hs_rows(hs_rows, cols)
+            flags.insert(0, 'リード数', 1)
+            daily = flags.groupby([dates[fresh].rename('date'), hs_rows['key']]).sum().reset_index()
+
+            quoted = ", ".join(f'"{c}"' for c in HS_STORE_COLUMNS)
+            updates = ", ".join(f'"{c}" = "{c}" + excluded."{c}"' for c in HS_STORE_COLUMNS)
+            conn.executemany(
+                f"INSERT INTO hs_daily (date, key, {quoted}) VALUES ({', '.join(['?'] * (len(HS_STORE_COLUMNS) + 2))}) "
+                f"ON CONFLICT (date, key) DO UPDATE SET {updates}",
+                daily[['date', 'key'] + HS_STORE_COLUMNS].astype(object).itertuples(index=False, name=None)
+            )
+            self._mark_ingested(conn, content_hash, 'hubspot', len(hs_rows))
+        return {'dates': int(daily['date'].nunique()), 'rows': len(hs_rows)}
+
+    # 保存済みの期間（Meta・HubSpotを通した最初と最後の日付）
+    def coverage(self):
+        with self._transaction() as conn:
+            first, last = conn.execute(
+                "SELECT MIN(date), MAX(date) FROM (SELECT date FROM meta_daily UNION SELECT date FROM hs_daily) WHERE date != ?",
+                (NO_DATE,)
+            ).fetchone()
+        return first, last
+
+    # aggregate_banners と同じ形の (バナー別の結果, デバッグ情報) をストアの日次集計から作る
+    # ストアにはキーのある行だけを保存しているため、デバッグ情報の行数はキー抽出後の行数
+    def aggregate(self, cols, start_datetime=None, end_datetime=None, profiler=NULL_PROFILER):
+        where, params = "", ()
+        if start_datetime is not None:
+            where = "WHERE date >= ? AND date <= ?"
+            params = (start_datetime.strftime('%Y-%m-%d'), end_datetime.strftime('%Y-%m-%d'))
+        hs_sums = ", ".join(f'SUM("{c}") AS "{c}"' for c in HS_STORE_COLUMNS)
+
+        debug = {}
+        with self._transaction() as conn:
+            meta = pd.read_sql_query(
+                f"SELECT key, SUM(spend) AS spend, SUM(impressions) AS impressions, SUM(clicks) AS clicks, SUM(rows) AS rows "
+                f"FROM meta_daily {where} GROUP BY key ORDER BY key", conn, params=params
+            )
+            hs = pd.read_sql_query(
+                f"SELECT key, {hs_sums} FROM hs_daily {where} GROUP BY key ORDER BY key", conn, params=params
+            )
+            if start_datetime is not None:
+                debug['meta_rows_before_filter'] = int(conn.execute("SELECT COALESCE(SUM(rows), 0) FROM meta_daily").fetchone()[0])
+                debug['hs_rows_before_filter'] = int(conn.execute('SELECT COALESCE(SUM("リード数"), 0) FROM hs_daily').fetchone()[0])
+        profiler.lap("ストア集計")
+
+        debug['meta_rows'] = debug['meta_rows_keyed'] = int(meta['rows'].sum())
+        debug['banner_ids'] = meta['key'].tolist()
+        debug['hs_rows'] = debug['hs_rows_keyed'] = int(hs['リード数'].sum())
+
+        renames = {'spend': cols['spend_col']}
+        if cols['impressions_col']:
+            renames['impressions'] = cols['impressions_col']
+        if cols['clicks_col']:
+            renames['clicks'] = cols['clicks_col']
+        meta_agg = meta[['key'] + list(renames)].rename(columns=renames)
+        meta_agg = finalize_meta_summary(meta_agg, cols)
+        debug['meta_agg'] = meta_agg
+
+        hs_counts = hs.set_index('key')[HS_STORE_COLUMNS].astype(int)
+        hs_summary = finalize_hs_summary(hs_counts, cols, debug)
+        result = merge_banner_summary(hs_summary, meta_agg, cols)
+        profiler.lap("結合・指標計算")
+        return result, debug
@@ -0,0 +1,49 @@
+"""テスト用のローカルの gspread 代替実装（SheetWriter の client_factory に渡す）"""
+import gspread
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': "fake error", 'status': "FAKE"}}
+
+
+def api_error(status_code):
+    return gspread.exceptions.APIError(FakeResponse(status_code))
+
+
+# 書き込まれた行を保持するワークシート。failures に入れたステータスの APIError を先頭から順に1回ずつ送出する
+class FakeWorksheet:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+        self.failures = []
+
+    def append_rows(self, rows):
+        self.calls.append(rows)
+        if self.failures:
+            raise api_error(self.failures.pop(0))
+        self.rows.extend(rows)
+
+
+class FakeWorkbook:
+    def __init__(self, n_sheets=2):
+        self.worksheets = [FakeWorksheet() for _ in range(n_sheets)]
+        self.get_worksheet_calls = 0
+
+    def get_worksheet(self, index):
+        self.get_worksheet_calls += 1
+        return self.worksheets[index] if index < len(self.worksheets) else None
+
+
+class FakeClient:
+    def __init__(self, workbook=None):
+        self.workbook = workbook or FakeWorkbook()
+        self.opened = []
+
+    def open_by_url(self, url):
+        self.opened.append(url)
+        return self.workbook
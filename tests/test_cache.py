@@ -0,0 +1,147 @@
+import threading
+
+import numpy as np
+import pytest
+
+from mago.cache import ResultCache, estimate_bytes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def array(kib):
+    return np.zeros(kib * 1024, dtype=np.uint8)
+
+
+# factory の呼び出し回数を数える
+class Factory:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_returns_cached_value_without_recomputing():
+    cache = ResultCache(clock=FakeClock())
+    factory = Factory("a")
+    assert cache.get_or_create('k', factory) == "a"
+    assert cache.get_or_create('k', factory) == "a"
+    assert factory.calls == 1
+
+
+# 件数上限を超えたら最後に使ったのが最も古いキーから捨てる
+def test_lru_eviction_order():
+    cache = ResultCache(max_entries=2, clock=FakeClock())
+    cache.get_or_create('a', lambda: 1)
+    cache.get_or_create('b', lambda: 2)
+    cache.get_or_create('a', lambda: 1)  # a を最近使ったことにする
+    cache.get_or_create('c', lambda: 3)
+
+    assert list(cache.entries) == ['a', 'c']
+    factory = Factory(2)
+    cache.get_or_create('b', factory)
+    assert factory.calls == 1
+    assert list(cache.entries) == ['c', 'b']
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = ResultCache(ttl_seconds=60, clock=clock)
+    factory = Factory("v")
+    cache.get_or_create('k', factory)
+
+    clock.now = 60
+    cache.get_or_create('k', factory)
+    assert factory.calls == 1
+
+    clock.now = 61
+    cache.get_or_create('k', factory)
+    assert factory.calls == 2
+    assert cache.stats()['evictions'] == 1
+
+
+# メモリ上限を超えたら古い順に捨てる
+def test_byte_budget():
+    cache = ResultCache(max_bytes=250 * 1024, clock=FakeClock())
+    cache.get_or_create('a', lambda: array(100))
+    cache.get_or_create('b', lambda: array(100))
+    assert cache.stats()['bytes'] == 200 * 1024
+
+    cache.get_or_create('c', lambda: array(100))
+    assert list(cache.entries) == ['b', 'c']
+    assert cache.stats()['bytes'] == 200 * 1024
+
+
+# 1件でメモリ上限を超える値は返すが保存しない（ほかのエントリも捨てない）
+def test_value_larger_than_budget_is_not_stored():
+    cache = ResultCache(max_bytes=100 * 1024, clock=FakeClock())
+    cache.get_or_create('small', lambda: array(10))
+    factory = Factory(array(200))
+
+    assert len(cache.get_or_create('big', factory)) == 200 * 1024
+    cache.get_or_create('big', factory)
+    assert factory.calls == 2
+    assert list(cache.entries) == ['small']
+
+
+# factory が失敗しても計算中のキーを残さず、次の呼び出しで計算し直せる
+def test_failed_factory_clears_pending():
+    cache = ResultCache(clock=FakeClock())
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_create('k', fail)
+    assert cache.pending == {}
+    assert 'k' not in cache.entries
+    assert cache.get_or_create('k', lambda: "ok") == "ok"
+
+
+def test_stats_counters():
+    cache = ResultCache(max_entries=1, clock=FakeClock())
+    cache.get_or_create('a', lambda: array(1))
+    cache.get_or_create('a', lambda: array(1))
+    cache.get_or_create('b', lambda: array(2))
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['evictions'] == 1
+    assert stats['entries'] == 1 and stats['bytes'] == estimate_bytes(array(2))
+    assert stats['hit_rate'] == pytest.approx(1 / 3)
+
+    cache.clear()
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+
+# 同じキーを同時に要求したスレッドは、最初のスレッドの計算結果を待って使う
+def test_concurrent_requests_compute_once():
+    cache = ResultCache(clock=FakeClock())
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "v"
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get_or_create('k', slow)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(cache.get_or_create('k', slow)))
+    second.start()
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert results == ["v", "v"]
+    assert len(calls) == 1
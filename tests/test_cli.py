@@ -0,0 +1,43 @@
+import os
+import re
+
+import pandas as pd
+import pytest
+
+from mago.cli import main
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+# 比率は小数第2位までに丸めて書く（float32 の誤差の桁を書かない）
+def test_analyze_writes_rounded_rates(tmp_path):
+    out = tmp_path / 'result.csv'
+    assert main(['analyze', fixture('meta.csv'), fixture('hs.csv'), '--out', str(out)]) == 0
+
+    result = pd.read_csv(out, encoding='utf-8-sig')
+    assert result.set_index('key').loc['bn001', '接続率'] == 66.67
+    text = out.read_text(encoding='utf-8-sig')
+    assert not re.search(r'\d\.\d{3,}', text)
+
+
+# 出力形式の誤りは入力ファイルを読み込む前に引数の解析で弾く（入力ファイルが存在しなくても同じエラー）
+def test_analyze_rejects_unsupported_out_before_loading(tmp_path, capsys):
+    out = tmp_path / 'result.txt'
+    with pytest.raises(SystemExit) as excinfo:
+        main(['analyze', str(tmp_path / 'missing_meta.csv'), str(tmp_path / 'missing_hs.csv'), '--out', str(out)])
+
+    assert excinfo.value.code == 2
+    assert "出力形式は .parquet / .csv" in capsys.readouterr().err
+    assert not out.exists()
+
+
+def test_batch_rejects_unsupported_format_before_loading(tmp_path, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(['batch', str(tmp_path / 'missing_manifest.csv'), '--out-dir', str(tmp_path), '--format', '.txt'])
+
+    assert excinfo.value.code == 2
+    assert "--format" in capsys.readouterr().err
@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+from mago import dates
+from mago.dates import DateParser
+
+
+def column(values, name="作成日"):
+    return pd.Series(values, name=name, dtype=object)
+
+
+# 値の種類ごとにまとめて解析する経路と、行ごとに解析する経路を切り替える
+@pytest.fixture(params=['dedupe', 'rowwise'])
+def path(request, monkeypatch):
+    monkeypatch.setattr(dates, 'DEDUPE_MAX_UNIQUE_RATIO', 1.0 if request.param == 'dedupe' else 0.0)
+    return request.param
+
+
+# HubSpotの「2026/03/01 10:00」と「2026-03-05」が混在する列は、どちらの書式の値も日付にする
+def test_mixed_formats_are_all_parsed(path):
+    parser = DateParser()
+    values = column(["2026/03/01 10:00", "2026-03-05", "2026/03/02 11:30", "2026-03-06", "2026-03-05"])
+    parsed = parser.parse(values)
+
+    assert parsed.tolist() == [
+        pd.Timestamp("2026-03-01 10:00"), pd.Timestamp("2026-03-05"), pd.Timestamp("2026-03-02 11:30"),
+        pd.Timestamp("2026-03-06"), pd.Timestamp("2026-03-05"),
+    ]
+    assert set(parser.formats["作成日"]) == {"%Y/%m/%d %H:%M", "%Y-%m-%d"}
+    assert parser.coerced["作成日"] == 0
+
+
+# 空欄（欠損・空文字・空白だけ）は数えず、日付にできない値だけを行数で数える
+def test_coerced_counts_unparseable_rows_but_not_blanks(path):
+    parser = DateParser()
+    values = column(["2026-03-05", None, "", "  ", "不明", "不明", "2026-03-06", "not a date"])
+    parsed = parser.parse(values)
+
+    assert parsed.isna().tolist() == [False, True, True, True, True, True, False, True]
+    assert parser.coerced["作成日"] == 3
+
+
+def test_coerced_is_zero_for_blank_only_column(path):
+    parser = DateParser()
+    parser.parse(column([None, "", " "]))
+    assert parser.coerced["作成日"] == 0
+
+
+# 2つの経路は同じ結果になる（index も元の列のまま）
+def test_dedupe_and_rowwise_paths_agree(monkeypatch):
+    values = column(["2026/03/01 10:00", "2026-03-05", None, "不明", "2026-03-05", "2026/03/01 10:00"])
+    values.index = [10, 11, 12, 13, 14, 15]
+    results = {}
+    for ratio in (1.0, 0.0):
+        monkeypatch.setattr(dates, 'DEDUPE_MAX_UNIQUE_RATIO', ratio)
+        parser = DateParser()
+        results[ratio] = (parser.parse(values), parser.coerced["作成日"])
+
+    pd.testing.assert_series_equal(results[1.0][0], results[0.0][0])
+    assert results[1.0][1] == results[0.0][1] == 1
+    assert results[1.0][0].index.tolist() == [10, 11, 12, 13, 14, 15]
+
+
+# 値の種類が少ない列は種類ごとにまとめて、ほとんどの値が異なる列は行ごとに解析する
+def test_dedupe_is_used_only_for_repetitive_columns(monkeypatch):
+    factorized = []
+    factorize = pd.factorize
+    monkeypatch.setattr(dates.pd, 'factorize', lambda values: factorized.append(values.name) or factorize(values))
+
+    repeated = column(["2026-03-01", "2026-03-02"] * 50, name="日")
+    unique = column([f"2026/03/01 {minute // 60:02d}:{minute % 60:02d}" for minute in range(100)], name="作成日")
+
+    assert DateParser().parse(repeated).tolist() == [pd.Timestamp("2026-03-01"), pd.Timestamp("2026-03-02")] * 50
+    assert DateParser().parse(unique).tolist() == list(pd.date_range("2026-03-01", periods=100, freq="min"))
+    assert factorized == ["日"]
+
+
+# タイムゾーン付きの値はその時刻のままタイムゾーンを外す（異なるタイムゾーンが混在しても）
+def test_timezones_are_stripped_to_wall_time(path):
+    parser = DateParser()
+    parsed = parser.parse(column(["2026-03-01T10:00:00+09:00", "2026-03-02T11:00:00+09:00"]))
+    assert parsed.dt.tz is None
+    assert parsed.tolist() == [pd.Timestamp("2026-03-01 10:00"), pd.Timestamp("2026-03-02 11:00")]
+
+    mixed = DateParser().parse(column(["2026-03-01T10:00:00+09:00", "2026-03-02T11:00:00Z"]))
+    assert mixed.dt.tz is None
+    assert mixed.tolist() == [pd.Timestamp("2026-03-01 10:00"), pd.Timestamp("2026-03-02 11:00")]
+
+
+# Excelの日付セル（タイムゾーン付きの Timestamp）もタイムゾーンを外す
+def test_timestamp_cells_are_stripped_to_wall_time(path):
+    cells = column([pd.Timestamp("2026-03-01 10:00", tz="Asia/Tokyo"), "2026-03-02"])
+    parsed = DateParser().parse(cells)
+    assert parsed.tolist() == [pd.Timestamp("2026-03-01 10:00"), pd.Timestamp("2026-03-02")]
+
+
+# 同じパーサーで続けて解析するチャンクは前回の書式を使い、日付にできなかった値の数を足し合わせる
+def test_formats_and_coerced_carry_across_chunks():
+    parser = DateParser()
+    parser.parse(column(["2026/03/01 10:00", "不明"]))
+    assert parser.formats["作成日"] == ["%Y/%m/%d %H:%M"]
+
+    parsed = parser.parse(column(["2026/03/02 09:00", "2026-03-03", "x"]))
+    assert parsed.tolist()[:2] == [pd.Timestamp("2026-03-02 09:00"), pd.Timestamp("2026-03-03")]
+    assert parser.formats["作成日"] == ["%Y/%m/%d %H:%M", "%Y-%m-%d"]
+    assert parser.coerced["作成日"] == 2
@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+from mago.sheets import SHEETS_MAX_RETRIES, ExportQueue
+
+from fake_gspread import FakeClient
+
+URL = "https://docs.google.com/spreadsheets/d/fake"
+
+# 再試行しても503が続く（SheetWriter の再試行を使い切る）失敗
+UNAVAILABLE = [503] * (SHEETS_MAX_RETRIES + 1)
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+# アプリの起動1回分（outbox に残っているジョブを再送する）。再試行の待ち時間は0にする
+def run_queue(client, outbox_dir, **kwargs):
+    return ExportQueue(lambda: client, str(outbox_dir), sleep=lambda seconds: None, **kwargs)
+
+# キューのジョブがすべて終わるまで待つ
+def finish(queue):
+    queue.executor.shutdown(wait=True)
+    return queue
+
+def outbox_jobs(outbox_dir):
+    return sorted(name for name in os.listdir(outbox_dir) if name.endswith(".json"))
+
+def write_outbox_job(outbox_dir, **fields):
+    job = {
+        'id': "20261001000000-abcd1234", 'label': "a.csv", 'spreadsheet_url': URL,
+        'batches': [{'sheet_index': 0, 'rows': [["summary"]]}, {'sheet_index': 1, 'rows': [["b1"], ["b2"]]}],
+        'done_batches': 0,
+    }
+    job.update(fields)
+    os.makedirs(outbox_dir, exist_ok=True)
+    with open(os.path.join(outbox_dir, f"{job['id']}.json"), "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    return job
+
+
+# 書き込みが終わったジョブは outbox から消える
+def test_enqueue_writes_batches_and_clears_outbox(client, tmp_path):
+    queue = run_queue(client, tmp_path)
+    job_id = queue.enqueue(URL, [(0, [["summary"]]), (1, [["b1"], ["b2"]])], "a.csv")
+    finish(queue)
+
+    assert queue.status(job_id)['state'] == 'done'
+    assert client.workbook.worksheets[0].rows == [["summary"]]
+    assert client.workbook.worksheets[1].rows == [["b1"], ["b2"]]
+    assert outbox_jobs(tmp_path) == []
+    assert queue.pending_count() == 0
+
+
+# 前回の起動で書き込み済みのバッチ（done_batches）は再送しない
+def test_restart_resumes_after_done_batches(client, tmp_path):
+    job = write_outbox_job(tmp_path, done_batches=1)
+    queue = finish(run_queue(client, tmp_path))
+
+    assert queue.status(job['id'])['state'] == 'done'
+    assert client.workbook.worksheets[0].calls == []
+    assert client.workbook.worksheets[1].rows == [["b1"], ["b2"]]
+    assert outbox_jobs(tmp_path) == []
+
+
+# 一時的なエラーで失敗したジョブは書き込めたところまで outbox に残り、次の起動で続きから書き込む
+def test_failed_job_persists_and_resumes_on_restart(client, tmp_path):
+    client.workbook.worksheets[1].failures = list(UNAVAILABLE)
+    queue = run_queue(client, tmp_path)
+    job_id = queue.enqueue(URL, [(0, [["summary"]]), (1, [["b1"], ["b2"]])], "a.csv")
+    finish(queue)
+
+    assert queue.status(job_id)['state'] == 'failed'
+    assert queue.pending_count() == 1
+    with open(tmp_path / f"{job_id}.json", encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved['done_batches'] == 1
+    assert saved['attempts'] == 1
+
+    restarted = finish(run_queue(client, tmp_path))
+    assert restarted.status(job_id)['state'] == 'done'
+    assert client.workbook.worksheets[0].rows == [["summary"]]
+    assert client.workbook.worksheets[1].rows == [["b1"], ["b2"]]
+    assert outbox_jobs(tmp_path) == []
+
+
+# 再試行しても直らないエラー（403など）はすぐに dead に移し、次の起動で再送しない
+def test_permanent_error_moves_job_to_dead_letter(client, tmp_path):
+    client.workbook.worksheets[0].failures = [403]
+    queue = run_queue(client, tmp_path)
+    job_id = queue.enqueue(URL, [(0, [["summary"]])], "a.csv")
+    finish(queue)
+
+    assert queue.status(job_id)['state'] == 'dead'
+    assert queue.pending_count() == 0
+    assert outbox_jobs(tmp_path) == []
+    with open(os.path.join(queue.dead_letter_dir, f"{job_id}.json"), encoding="utf-8") as f:
+        assert "403" in json.load(f)['error']
+
+    restarted = finish(run_queue(client, tmp_path))
+    assert restarted.status(job_id) == {}
+    assert client.workbook.worksheets[0].calls == [[["summary"]]]
+
+
+# 一時的なエラーでも max_attempts 回失敗したら再送をやめる
+def test_job_is_dead_lettered_after_max_attempts(client, tmp_path):
+    job = write_outbox_job(tmp_path)
+    for attempt in range(1, 4):
+        client.workbook.worksheets[0].failures = list(UNAVAILABLE)
+        queue = finish(run_queue(client, tmp_path, max_attempts=3))
+        assert queue.status(job['id'])['state'] == ('dead' if attempt == 3 else 'failed')
+
+    assert outbox_jobs(tmp_path) == []
+    assert os.path.exists(os.path.join(queue.dead_letter_dir, f"{job['id']}.json"))
+    assert client.workbook.worksheets[0].rows == []
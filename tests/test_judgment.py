@@ -0,0 +1,129 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mago.analysis import (
+    DEFAULT_THRESHOLDS, JUDGMENT_LABELS, DIAGNOSIS_LABELS,
+    judgment_codes, diagnosis_codes, score_banners,
+)
+
+T = DEFAULT_THRESHOLDS
+
+
+# 行ごとに判定していた以前の実装（ベクトル化した判定の正解として使う）
+def judge_row(row, cpa_limit, connect_target, meeting_target):
+    cpa_ok = row['CPA'] > 0 and row['CPA'] <= cpa_limit
+    connect_ok = row['接続率'] >= connect_target
+    meeting_ok = row['商談化率'] >= meeting_target
+
+    conditions_met = sum([cpa_ok, connect_ok, meeting_ok])
+
+    if conditions_met == 3:
+        return "最優秀"
+    elif conditions_met == 2 and meeting_ok:
+        return "優秀"
+    elif conditions_met == 2:
+        return "要改善"
+    elif conditions_met == 1 and meeting_ok:
+        return "要改善"
+    else:
+        return "停止推奨"
+
+def creative_diagnosis_row(row, ctr_target, cvr_target, corp_target, imp_threshold, impressions_col):
+    ctr_ok = row['CTR_calc'] >= ctr_target
+    cvr_ok = row['LP遷移率'] >= cvr_target
+
+    if row['リード数'] == 0:
+        if impressions_col and row[impressions_col] < imp_threshold:
+            return "データ不足"
+        elif ctr_ok:
+            return "継続監視"
+        else:
+            return "停止検討"
+
+    if row['リード数'] >= 3 and row['法人数'] == 0:
+        return "ターゲット外"
+
+    corp_ok = row['法人率'] >= corp_target
+
+    if ctr_ok and cvr_ok and corp_ok:
+        return "優秀"
+    elif ctr_ok and cvr_ok and not corp_ok:
+        return "ターゲット要見直し"
+    elif ctr_ok and not cvr_ok and corp_ok:
+        return "LP要改善"
+    elif ctr_ok and not cvr_ok and not corp_ok:
+        return "LP+ターゲット要見直し"
+    elif not ctr_ok and cvr_ok and corp_ok:
+        return "クリエイティブ要改善"
+    elif not ctr_ok and cvr_ok and not corp_ok:
+        return "クリエイティブ+ターゲット要見直し"
+    elif not ctr_ok and not cvr_ok and corp_ok:
+        return "クリエイティブ+LP要改善"
+    else:
+        return "全面見直し"
+
+
+# 各指標を基準ちょうど・前後の値にした組み合わせ（CPA 0 は消化金額0、IMP は欠損・0を含む）
+def edge_cases():
+    def around(value):
+        return [value - 0.01, value, value + 0.01]
+
+    rows = itertools.product(
+        [0.0] + around(T['cpa_limit']),
+        around(T['connect_target']),
+        around(T['meeting_target']),
+        [0.0] + around(T['ctr_target']),
+        around(T['cvr_target']),
+        [0.0] + around(T['corp_target']),
+        [0, 1, 3],
+        [np.nan, 0.0, T['imp_threshold'] - 1, T['imp_threshold']],
+    )
+    result = pd.DataFrame(rows, columns=[
+        'CPA', '接続率', '商談化率', 'CTR_calc', 'LP遷移率', '法人率', 'リード数', 'インプレッション',
+    ])
+    result['法人数'] = np.where(result['法人率'] > 0, result['リード数'], 0)
+    result['消化金額'] = result['CPA'] * result['リード数']
+    return result
+
+
+@pytest.fixture(scope='module')
+def cases():
+    return edge_cases()
+
+
+def test_judgment_codes_match_row_judge(cases):
+    params = [T['cpa_limit'], T['connect_target'], T['meeting_target']]
+    expected = cases.apply(judge_row, axis=1, args=params)
+    labels = np.array(JUDGMENT_LABELS)[judgment_codes(cases, *params)]
+    assert (labels == expected.to_numpy()).all()
+
+
+@pytest.mark.parametrize('impressions_col', ['インプレッション', None])
+def test_diagnosis_codes_match_row_diagnosis(cases, impressions_col):
+    params = [T['ctr_target'], T['cvr_target'], T['corp_target'], T['imp_threshold'], impressions_col]
+    expected = cases.apply(creative_diagnosis_row, axis=1, args=params)
+    labels = np.array(DIAGNOSIS_LABELS)[diagnosis_codes(cases, *params)]
+    assert (labels == expected.to_numpy()).all()
+
+
+def test_score_banners_matches_row_functions(cases):
+    scored = score_banners(cases, 'インプレッション', **T)
+    judge_params = [T['cpa_limit'], T['connect_target'], T['meeting_target']]
+    diagnosis_params = [T['ctr_target'], T['cvr_target'], T['corp_target'], T['imp_threshold'], 'インプレッション']
+    assert (scored['判定'].astype(str) == cases.apply(judge_row, axis=1, args=judge_params)).all()
+    assert (scored['クリエイティブ診断'].astype(str) == cases.apply(creative_diagnosis_row, axis=1, args=diagnosis_params)).all()
+
+
+# 判定基準を配列で渡すと、基準の組み合わせごとの判定が1回で返る
+def test_codes_broadcast_over_threshold_grid(cases):
+    cpa_limits = np.array([5000.0, T['cpa_limit']]).reshape(-1, 1, 1, 1)
+    connect_targets = np.array([T['connect_target'], 80.0]).reshape(1, -1, 1, 1)
+    meeting_targets = np.array([0.0, T['meeting_target']]).reshape(1, 1, -1, 1)
+    grid = judgment_codes(cases, cpa_limits, connect_targets, meeting_targets)
+    assert grid.shape == (2, 2, 2, len(cases))
+    for i, j, k in itertools.product(range(2), repeat=3):
+        expected = judgment_codes(cases, cpa_limits.flat[i], connect_targets.flat[j], meeting_targets.flat[k])
+        assert (grid[i, j, k] == expected).all()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mago.keys import banner_sort_keys, categorical_keys, normalize_text, parse_banner_id, parse_utm
+
+
+# 全角英数字・記号は半角に（NFKC）、大文字は小文字に、前後の空白（全角の空白も）は除く
+@pytest.mark.parametrize('value, expected', [
+    ("ＢＮ０１２", "bn012"),
+    ("BN012", "bn012"),
+    ("  bn012\t", "bn012"),
+    ("　ｂｎ０１２　", "bn012"),
+    ("Spring＿Sale－ＢＮ001", "spring_sale-bn001"),
+    ("ｶﾞｲﾄﾞ", "ガイド"),
+    (12, "12"),
+])
+def test_normalize_text(value, expected):
+    assert normalize_text(value) == expected
+
+
+# 広告名のどこにあってもバナーIDを取り出す（全角・大文字でも同じID）
+@pytest.mark.parametrize('value, expected', [
+    ("【春】ＢＮ０１２_動画", "bn012"),
+    ("Campaign_BN7", "bn7"),
+    ("bn", None),
+    ("バナーなし", None),
+])
+def test_parse_banner_id(value, expected):
+    assert parse_banner_id(value) == expected
+
+
+# 空欄・空白だけのUTMは欠損
+@pytest.mark.parametrize('value, expected', [
+    ("ＢＮ００１", "bn001"),
+    (" Bn001 ", "bn001"),
+    ("", None),
+    ("   ", None),
+    ("　", None),
+])
+def test_parse_utm(value, expected):
+    assert parse_utm(value) == expected
+
+
+# 表記の違う同じキーは同じカテゴリに、欠損・空欄は欠損になる
+def test_categorical_keys_merges_variants_and_drops_blanks():
+    values = pd.Series(["ＢＮ００２", "bn001 ", None, "", "BN002", "　", "bn001"], index=list("abcdefg"))
+    keys = categorical_keys(values, parse_utm)
+
+    assert keys.index.tolist() == list("abcdefg")
+    assert list(keys.cat.categories) == ["bn001", "bn002"]
+    assert keys.astype(object).where(keys.notna(), None).tolist() == [
+        "bn002", "bn001", None, None, "bn002", None, "bn001",
+    ]
+
+
+# 広告名からバナーIDを取り出せない値は欠損
+def test_categorical_keys_with_banner_ids():
+    values = pd.Series(["春_ＢＮ０１０", "秋_bn010", "バナーなし", np.nan, "BN9_動画"])
+    keys = categorical_keys(values, parse_banner_id)
+
+    assert list(keys.cat.categories) == ["bn010", "bn9"]
+    assert keys.isna().tolist() == [False, False, True, True, False]
+    assert keys.iloc[0] == keys.iloc[1] == "bn010"
+
+
+# 並べ替えはバナーIDの番号の数値順（bn9 < bn010）
+def test_banner_sort_keys():
+    keys = pd.Series(["bn010", "bn9", "other"], dtype="category")
+    assert banner_sort_keys(keys).tolist() == [10, 9, 0]
@@ -0,0 +1,80 @@
+import codecs
+
+import pandas as pd
+import pytest
+
+from mago.loader import csv_read_options, read_frame, read_header, sniff_csv
+
+HEADER = "広告名,消化金額,インプレッション\n"
+ROWS = "春_bn001,1000,5000\n秋_bn002,2000,8000\n"
+
+
+def csv_bytes(text, encoding='utf-8', sep=','):
+    return text.replace(',', sep).encode(encoding)
+
+
+# BOM付きUTF-8 / BOMなしUTF-8 / CP932（Shift_JIS）を判別する
+@pytest.mark.parametrize('data, encoding', [
+    (codecs.BOM_UTF8 + csv_bytes(HEADER + ROWS), 'utf-8-sig'),
+    (csv_bytes(HEADER + ROWS), 'utf-8'),
+    (csv_bytes(HEADER + ROWS, 'cp932'), 'cp932'),
+    (b"ad,spend\nbn001,1000\n", 'utf-8'),
+])
+def test_sniff_encoding(data, encoding):
+    assert sniff_csv(data)['encoding'] == encoding
+
+
+# 判定に使う先頭部分の末尾で途切れたUTF-8の文字は、CP932と誤判定しない
+def test_sniff_utf8_cut_in_the_middle_of_a_character():
+    data = csv_bytes(HEADER + ROWS * 20)
+    cut = data.index("秋".encode()) + 1
+    assert sniff_csv(data, sample_size=cut)['encoding'] == 'utf-8'
+
+
+@pytest.mark.parametrize('sep', [',', '\t', ';'])
+def test_sniff_delimiter(sep):
+    csv_format = sniff_csv(csv_bytes(HEADER + ROWS, sep=sep))
+    assert csv_format['sep'] == sep
+    assert csv_format['skiprows'] == 0
+
+
+# 区切り文字を含む値（引用符付き）があっても列数の多い区切り文字を選ぶ
+def test_sniff_semicolon_with_quoted_commas():
+    data = '広告名;消化金額;メモ\n"a,b";1000;"x,y,z"\nc;2000;w\n'.encode()
+    assert sniff_csv(data)['sep'] == ';'
+
+
+# レポート名・期間などの前置き行を飛ばし、列数がそろう最初の行をヘッダーにする
+def test_sniff_preamble_rows():
+    preamble = "Meta広告 レポート\n期間: 2026-03-01 - 2026-03-31\n\n"
+    data = csv_bytes(preamble + HEADER + ROWS, 'cp932')
+    csv_format = sniff_csv(data)
+    assert csv_format == {'encoding': 'cp932', 'sep': ',', 'skiprows': 3}
+
+    columns, _ = read_header(data, 'report.csv')
+    assert columns == ['広告名', '消化金額', 'インプレッション']
+    frame = read_frame(data, 'report.csv', csv_format, ['広告名', '消化金額'], {'広告名': 'string', '消化金額': 'float64'})
+    assert frame['広告名'].tolist() == ['春_bn001', '秋_bn002']
+    assert frame['消化金額'].tolist() == [1000.0, 2000.0]
+
+
+# 判定した形式をそのまま渡し、前置き行を飛ばすときだけCエンジンにする
+def test_csv_read_options():
+    assert csv_read_options({'encoding': 'cp932', 'sep': '\t', 'skiprows': 0}, engine='pyarrow') == {
+        'encoding': 'cp932', 'sep': '\t', 'skiprows': None, 'engine': 'pyarrow',
+    }
+    assert csv_read_options({'encoding': 'utf-8', 'sep': ',', 'skiprows': 2}, engine='pyarrow') == {
+        'encoding': 'utf-8', 'sep': ',', 'skiprows': 2, 'engine': 'c',
+    }
+
+
+# 判別した形式で読むと、どのエンコーディング・区切り文字でも同じ表になる
+@pytest.mark.parametrize('encoding, sep', [('utf-8-sig', ','), ('cp932', '\t'), ('utf-8', ';')])
+def test_sniffed_format_reads_same_frame(encoding, sep):
+    data = csv_bytes(HEADER + ROWS, encoding, sep)
+    columns, csv_format = read_header(data, 'export.csv')
+    assert columns == ['広告名', '消化金額', 'インプレッション']
+
+    frame = read_frame(data, 'export.csv', csv_format, columns, {'広告名': 'string'})
+    expected = pd.DataFrame({'広告名': ['春_bn001', '秋_bn002'], '消化金額': [1000, 2000], 'インプレッション': [5000, 8000]})
+    pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from mago.pipeline import analyze_files
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+# UTM以外の列（作成日・コールの成果・属性・取引ステージ・商談日）がないHubSpotエクスポートも読み込める
+@pytest.mark.parametrize('stream_hs', [False, True])
+def test_hs_without_optional_columns(stream_hs):
+    result, cols, _ = analyze_files(fixture('meta.csv'), fixture('hs_minimal.csv'), stream_hs=stream_hs)
+
+    assert cols['date_col_hs'] is None and cols['call_result_col'] is None
+    leads = result.set_index('key')['リード数']
+    assert leads.to_dict() == {'bn001': 3, 'bn002': 1, 'bn003': 0, 'bn999': 1}
+    assert (result['接続数'] == 0).all()
+
+
+@pytest.mark.parametrize('stream_hs', [False, True])
+def test_hs_with_all_columns(stream_hs):
+    result, _, _ = analyze_files(fixture('meta.csv'), fixture('hs.csv'), stream_hs=stream_hs)
+
+    leads = result.set_index('key')['リード数']
+    assert leads.to_dict() == {'bn001': 3, 'bn002': 1, 'bn003': 0, 'bn999': 1}
+    assert result.set_index('key').loc['bn001', '接続数'] == 2
@@ -0,0 +1,48 @@
+import tracemalloc
+
+from mago.profiling import NULL_PROFILER, StageProfiler
+
+
+def test_records_time_and_memory():
+    profiler = StageProfiler().start()
+    try:
+        data = [0] * 100_000
+        profiler.lap("確保")
+        profiler.lap("確保")
+    finally:
+        profiler.stop()
+    del data
+
+    record = profiler.records["確保"]
+    assert record['calls'] == 2 and record['seconds'] >= 0
+    assert profiler.memory_traced and record['peak_bytes'] > 0
+    assert not profiler.active and not tracemalloc.is_tracing()
+
+
+# tracemalloc はプロセスで1つのため、同時に計測するプロファイラの2つ目は時間だけを記録する
+def test_only_one_profiler_traces_memory_at_a_time():
+    first = StageProfiler().start()
+    second = StageProfiler().start()
+    try:
+        second.lap("集計")
+        assert first.memory_traced and not second.memory_traced
+        assert second.records["集計"]['peak_bytes'] is None
+        # 2つ目を止めても1つ目の計測は続く
+        second.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        first.stop()
+    assert not tracemalloc.is_tracing()
+
+    third = StageProfiler().start()
+    try:
+        assert third.memory_traced
+    finally:
+        third.stop()
+
+
+def test_stopped_profiler_is_inactive():
+    profiler = StageProfiler(trace_memory=False).start()
+    assert profiler.active
+    profiler.stop()
+    assert not profiler.active and not NULL_PROFILER.active
@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+from mago.analysis import (
+    HS_CATEGORICAL_COLUMNS, META_CATEGORICAL_COLUMNS,
+    detect_columns, categorical_dtypes, meta_required_columns, hs_required_columns,
+    normalize_frames, period_bounds, aggregate_banners,
+)
+from mago.loader import read_header, read_frame
+from mago.rangeindex import BannerRangeIndex
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# 期間なし・1日・1か月・データのない期間
+RANGES = [
+    (None, None),
+    period_bounds('2026-09-01', '2026-09-01'),
+    period_bounds('2026-09-01', '2026-09-30'),
+    period_bounds('2027-01-01', '2027-01-31'),
+]
+
+
+# 日付列を読まない場合（drop_dates）は、その列がないエクスポートとして列を特定する
+def load_fixtures(drop_dates=()):
+    frames, headers = {}, {}
+    for side, name in [('meta', 'meta_daily.csv'), ('hubspot', 'hs_daily.csv')]:
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            data = f.read()
+        header, csv_format = read_header(data, name)
+        frames[side] = (data, name, csv_format)
+        headers[side] = [c for c in header if c not in drop_dates]
+    cols = detect_columns(headers['meta'], headers['hubspot'])
+
+    df_meta = read_frame(*frames['meta'], meta_required_columns(cols), categorical_dtypes(cols, META_CATEGORICAL_COLUMNS))
+    df_hs = read_frame(*frames['hubspot'], hs_required_columns(cols), categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS))
+    df_meta, df_hs = normalize_frames(df_meta, df_hs, cols)
+    return df_meta, df_hs, cols
+
+
+# 累積和から求めた期間集計が、行を絞り込んで集計した aggregate_banners と同じ表・デバッグ情報になる
+@pytest.mark.parametrize('drop_dates', [(), ('レポート開始日',), ('作成日',), ('レポート開始日', '作成日')])
+@pytest.mark.parametrize('start_datetime, end_datetime', RANGES)
+def test_range_index_matches_aggregate_banners(drop_dates, start_datetime, end_datetime):
+    df_meta, df_hs, cols = load_fixtures(drop_dates)
+    expected, expected_debug = aggregate_banners(df_meta, df_hs, cols, start_datetime, end_datetime)
+    actual, debug = BannerRangeIndex(df_meta, df_hs, cols).aggregate(start_datetime, end_datetime)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    pd.testing.assert_frame_equal(debug['meta_agg'], expected_debug['meta_agg'])
+    for key in ['meta_rows', 'meta_rows_keyed', 'hs_rows', 'hs_rows_keyed', 'banner_ids', 'meta_rows_before_filter', 'hs_rows_before_filter']:
+        assert debug.get(key) == expected_debug.get(key), key
+
+
+def test_fixture_ranges_differ():
+    df_meta, df_hs, cols = load_fixtures()
+    index = BannerRangeIndex(df_meta, df_hs, cols)
+    leads = [int(index.aggregate(*bounds)[0]['リード数'].sum()) for bounds in RANGES]
+    assert leads == [9, 2, 5, 0]
@@ -0,0 +1,66 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mago import sensitivity
+from mago.analysis import DEFAULT_THRESHOLDS, score_banners
+from mago.sensitivity import (
+    JUDGMENT_SWEEP_AXES, DIAGNOSIS_SWEEP_AXES, SENSITIVITY_MAX_STEPS,
+    default_grids, max_sweep_steps, judgment_sweep, diagnosis_sweep,
+)
+
+
+@pytest.fixture(scope='module')
+def result():
+    rng = np.random.default_rng(0)
+    n = 500
+    return pd.DataFrame({
+        'CPA': rng.choice([0, 5000, 10000, 20000], n) + rng.integers(0, 3000, n),
+        '接続率': rng.uniform(0, 100, n).round(1),
+        '商談化率': rng.uniform(0, 40, n).round(1),
+        'CTR_calc': rng.uniform(0, 3, n),
+        'LP遷移率': rng.uniform(0, 40, n),
+        '法人率': rng.uniform(0, 100, n),
+        'リード数': rng.integers(0, 6, n),
+        '法人数': rng.integers(0, 3, n),
+        'インプレッション': rng.integers(0, 3000, n),
+        '消化金額': rng.uniform(0, 1e5, n),
+    })
+
+
+# 格子の各点のバナー数・消化金額が、その基準で score_banners した結果の判定ごとの集計と一致する
+def test_sweeps_match_score_banners(result):
+    judgment_grids = default_grids(JUDGMENT_SWEEP_AXES, DEFAULT_THRESHOLDS, steps=3)
+    diagnosis_grids = default_grids(DIAGNOSIS_SWEEP_AXES, DEFAULT_THRESHOLDS, steps=3)
+    judgment = judgment_sweep(result, '消化金額', judgment_grids)
+    diagnosis = diagnosis_sweep(result, '消化金額', diagnosis_grids, DEFAULT_THRESHOLDS['imp_threshold'], 'インプレッション')
+
+    for i, j, k in itertools.product(range(3), repeat=3):
+        judgment_point = dict(zip([key for key, _, _, _ in JUDGMENT_SWEEP_AXES], [g[n] for g, n in zip(judgment_grids, (i, j, k))]))
+        diagnosis_point = dict(zip([key for key, _, _, _ in DIAGNOSIS_SWEEP_AXES], [g[n] for g, n in zip(diagnosis_grids, (i, j, k))]))
+        scored = score_banners(result, 'インプレッション', **{**DEFAULT_THRESHOLDS, **judgment_point, **diagnosis_point})
+
+        for table, point, label_col in [(judgment, judgment_point, '判定'), (diagnosis, diagnosis_point, 'クリエイティブ診断')]:
+            rows = table[np.logical_and.reduce([table[key] == value for key, value in point.items()])]
+            expected = scored.groupby(label_col, observed=False)['消化金額'].agg(['size', 'sum'])
+            assert rows['バナー数'].tolist() == expected['size'].tolist()
+            assert np.allclose(rows['消化金額'], expected['sum'])
+
+
+# 上限を超える格子は判定を作る前に ValueError にする
+def test_oversized_sweep_raises_before_building(result, monkeypatch):
+    monkeypatch.setattr(sensitivity, 'SENSITIVITY_MAX_CELLS', 27 * len(result) - 1)
+    monkeypatch.setattr(sensitivity, 'judgment_codes', lambda *args: pytest.fail("判定を作る前に止めること"))
+    grids = default_grids(JUDGMENT_SWEEP_AXES, DEFAULT_THRESHOLDS, steps=3)
+    with pytest.raises(ValueError):
+        judgment_sweep(result, '消化金額', grids)
+
+
+def test_max_sweep_steps_fits_budget():
+    assert max_sweep_steps(100) == SENSITIVITY_MAX_STEPS
+    for n_banners in [5_000, 6_000, 20_000, 100_000]:
+        steps = max_sweep_steps(n_banners)
+        assert steps % 2 == 1 and steps ** 3 * n_banners <= sensitivity.SENSITIVITY_MAX_CELLS
+    assert max_sweep_steps(10 ** 9) == 3
@@ -0,0 +1,98 @@
+import gspread
+import pytest
+
+from mago.sheets import SHEETS_MAX_RETRIES, SheetWriter
+
+from fake_gspread import FakeClient
+
+URL = "https://docs.google.com/spreadsheets/d/fake"
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+def make_writer(client, sleeps, **kwargs):
+    return SheetWriter(lambda: client, URL, sleep=sleeps.append, **kwargs)
+
+
+# 複数行を1回の append_rows で書き込む
+def test_append_rows_writes_batch_in_one_call(client):
+    writer = make_writer(client, [])
+    rows = [["2026-10-01", "a.csv", 1], ["2026-10-01", "a.csv", 2], ["2026-10-01", "a.csv", 3]]
+    writer.append_rows(1, rows)
+
+    sheet = client.workbook.worksheets[1]
+    assert sheet.calls == [rows]
+    assert sheet.rows == rows
+    assert client.workbook.worksheets[0].calls == []
+
+
+def test_append_rows_skips_empty_batch(client):
+    writer = make_writer(client, [])
+    writer.append_rows(0, [])
+    assert client.opened == []
+
+
+# スプレッドシート・ワークシートは最初の書き込みで1回だけ開く
+def test_worksheets_are_cached_across_calls(client):
+    writer = make_writer(client, [])
+    writer.append_rows(0, [[1]])
+    writer.append_rows(0, [[2]])
+    writer.append_rows(1, [[3]])
+    writer.append_rows(1, [[4]])
+
+    assert client.opened == [URL]
+    assert client.workbook.get_worksheet_calls == 2
+    assert client.workbook.worksheets[0].rows == [[1], [2]]
+    assert client.workbook.worksheets[1].rows == [[3], [4]]
+
+
+def test_missing_worksheet_raises(client):
+    writer = make_writer(client, [])
+    with pytest.raises(ValueError):
+        writer.append_rows(5, [[1]])
+
+
+# 429・5xx は待機時間を倍にしながら再試行する（待機は注入した sleep で記録）
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retries_with_backoff(client, status):
+    sleeps = []
+    writer = make_writer(client, sleeps, backoff_seconds=1.0)
+    sheet = client.workbook.worksheets[0]
+    sheet.failures = [status, status, status]
+    writer.append_rows(0, [[1]])
+
+    assert sheet.rows == [[1]]
+    assert len(sheet.calls) == 4
+    assert len(sleeps) == 3
+    for attempt, seconds in enumerate(sleeps):
+        assert 2 ** attempt <= seconds <= 2 ** attempt + 1.0
+
+
+def test_gives_up_after_max_retries(client):
+    sleeps = []
+    writer = make_writer(client, sleeps)
+    sheet = client.workbook.worksheets[0]
+    sheet.failures = [429] * (SHEETS_MAX_RETRIES + 1)
+    with pytest.raises(gspread.exceptions.APIError):
+        writer.append_rows(0, [[1]])
+
+    assert len(sheet.calls) == SHEETS_MAX_RETRIES + 1
+    assert len(sleeps) == SHEETS_MAX_RETRIES
+    assert sheet.rows == []
+
+
+# 再試行しないエラー（権限・不正なリクエストなど）はすぐに送出する
+@pytest.mark.parametrize('status', [400, 403, 404])
+def test_non_retryable_error_raises_immediately(client, status):
+    sleeps = []
+    writer = make_writer(client, sleeps)
+    sheet = client.workbook.worksheets[0]
+    sheet.failures = [status]
+    with pytest.raises(gspread.exceptions.APIError):
+        writer.append_rows(0, [[1]])
+
+    assert len(sheet.calls) == 1
+    assert sleeps == []
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from mago.analysis import (
+    HS_CATEGORICAL_COLUMNS, META_CATEGORICAL_COLUMNS,
+    detect_columns, categorical_dtypes, meta_required_columns, hs_required_columns, normalize_frames,
+)
+from mago.loader import read_header, read_frame
+from mago.store import BannerStore
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+# フィクスチャのMeta・HubSpotを読み込み、(df_meta, df_hs, cols) を返す。with_record_id=False ならレコードID列を読まない
+def load_fixtures(with_record_id=True):
+    frames, headers = {}, {}
+    for side, name in [('meta', 'meta.csv'), ('hubspot', 'hs.csv')]:
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            data = f.read()
+        header, csv_format = read_header(data, name)
+        frames[side] = (data, name, csv_format)
+        headers[side] = header
+    if not with_record_id:
+        headers['hubspot'] = [c for c in headers['hubspot'] if c != 'レコードID']
+    cols = detect_columns(headers['meta'], headers['hubspot'])
+
+    hs_usecols = hs_required_columns(cols) + ([cols['record_id_col']] if cols['record_id_col'] else [])
+    df_meta = read_frame(*frames['meta'], meta_required_columns(cols), categorical_dtypes(cols, META_CATEGORICAL_COLUMNS))
+    df_hs = read_frame(*frames['hubspot'], hs_usecols, categorical_dtypes(cols, HS_CATEGORICAL_COLUMNS))
+    df_meta, df_hs = normalize_frames(df_meta, df_hs, cols)
+    return df_meta, df_hs, cols
+
+
+def total_leads(store, cols):
+    result, _ = store.aggregate(cols)
+    return int(result['リード数'].sum())
+
+
+# 同じデータをレコードID・作成日の両方の方式で取り込んでも、リードを二重に数えない
+@pytest.mark.parametrize('first_with_record_id', [True, False])
+def test_ingest_hs_rejects_other_dedupe_mode(tmp_path, first_with_record_id):
+    store = BannerStore('test', store_dir=str(tmp_path))
+    df_meta, df_hs, cols = load_fixtures(with_record_id=first_with_record_id)
+    store.ingest_meta(df_meta, cols, 'meta')
+    store.ingest_hs(df_hs, cols, 'hs-1')
+    assert total_leads(store, cols) == 5
+
+    _, other_hs, other_cols = load_fixtures(with_record_id=not first_with_record_id)
+    with pytest.raises(ValueError):
+        store.ingest_hs(other_hs, other_cols, 'hs-2')
+    assert total_leads(store, cols) == 5
+
+    # 同じ方式なら取り込み済みのリードは追加しない
+    store.ingest_hs(df_hs, cols, 'hs-3')
+    assert total_leads(store, cols) == 5
+
+
+# 方式を記録する前に作ったストアは、保存済みのデータから方式を判断する
+def test_ingest_hs_infers_mode_of_existing_store(tmp_path):
+    store = BannerStore('test', store_dir=str(tmp_path))
+    df_meta, df_hs, cols = load_fixtures(with_record_id=True)
+    store.ingest_hs(df_hs, cols, 'hs-1')
+    with store._transaction() as conn:
+        conn.execute("DELETE FROM store_settings")
+
+    _, other_hs, other_cols = load_fixtures(with_record_id=False)
+    with pytest.raises(ValueError):
+        store.ingest_hs(other_hs, other_cols, 'hs-2')